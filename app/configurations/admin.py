@@ -25,7 +25,8 @@ class XDSUIConfigurationAdmin(admin.ModelAdmin):
     list_display = ('search_results_per_page', 'xds_configuration',
                     'created', 'modified',)
     fields = [('search_results_per_page', 'xds_configuration',
-               'course_img_fallback', 'ui_logo')]
+               'course_img_fallback', 'ui_logo'),
+              ('more_like_this_size', 'similar_courses_size')]
 
 
 @admin.register(CourseInformationMapping)
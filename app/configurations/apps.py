@@ -3,3 +3,8 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     name = 'configurations'
+
+    def ready(self):
+        super(CoreConfig, self).ready()
+        import configurations.signals
+        configurations.signals.config_snapshot_invalidate
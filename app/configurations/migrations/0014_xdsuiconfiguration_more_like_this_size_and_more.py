@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-17 10:49
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('configurations', '0013_xdsconfiguration_lrs_endpoint_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='xdsuiconfiguration',
+            name='more_like_this_size',
+            field=models.IntegerField(default=6, help_text='Enter the number of courses shown in the more like this section of a course', validators=[django.core.validators.MinValueValidator(1, 'more like this courses should be at least 1')]),
+        ),
+        migrations.AddField(
+            model_name='xdsuiconfiguration',
+            name='similar_courses_size',
+            field=models.IntegerField(default=4, help_text='Enter the number of courses shown in the similar courses section of a course', validators=[django.core.validators.MinValueValidator(1, 'similar courses should be at least 1')]),
+        ),
+    ]
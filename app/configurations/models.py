@@ -114,6 +114,24 @@ class XDSUIConfiguration(TimeStampedModel):
     ui_logo = models.ImageField(upload_to='images/',
                                 null=True,
                                 blank=True)
+    more_like_this_size = \
+        models.IntegerField(default=6,
+                            validators=[MinValueValidator(1,
+                                                          "more like this "
+                                                          "courses should be "
+                                                          "at least 1")],
+                            help_text="Enter the number of courses shown in "
+                                      "the more like this section of a "
+                                      "course")
+    similar_courses_size = \
+        models.IntegerField(default=4,
+                            validators=[MinValueValidator(1,
+                                                          "similar courses "
+                                                          "should be at least "
+                                                          "1")],
+                            help_text="Enter the number of courses shown in "
+                                      "the similar courses section of a "
+                                      "course")
 
     def get_absolute_url(self):
         """ URL for displaying individual model records."""
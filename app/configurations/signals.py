@@ -0,0 +1,30 @@
+from django.core.signals import request_finished, request_started
+from django.db.models.signals import post_delete, post_save
+
+from core.models import (CourseDetailHighlight, SearchField, SearchFilter,
+                         SearchSortOption)
+
+from .models import (CourseInformationMapping, XDSConfiguration,
+                     XDSUIConfiguration)
+from .utils.config_snapshot import (finish_request,
+                                    invalidate_config_snapshot, start_request)
+
+# models read into the configuration snapshot
+SNAPSHOT_MODELS = [XDSConfiguration, XDSUIConfiguration,
+                   CourseInformationMapping, SearchField, SearchFilter,
+                   SearchSortOption, CourseDetailHighlight]
+
+
+def config_snapshot_invalidate(sender, **kwargs):
+    """Invalidates the configuration snapshot of every worker when one of
+        the models it is built from changes"""
+    invalidate_config_snapshot()
+
+
+for snapshot_model in SNAPSHOT_MODELS:
+    post_save.connect(config_snapshot_invalidate, sender=snapshot_model)
+    post_delete.connect(config_snapshot_invalidate, sender=snapshot_model)
+
+# the shared configuration version is read once per request
+request_started.connect(start_request)
+request_finished.connect(finish_request)
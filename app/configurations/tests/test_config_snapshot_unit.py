@@ -0,0 +1,98 @@
+from configurations.models import XDSConfiguration, XDSUIConfiguration
+from configurations.utils.config_snapshot import (get_config_snapshot,
+                                                  get_config_version,
+                                                  invalidate_config_snapshot)
+from core.models import (CourseDetailHighlight, SearchField, SearchFilter,
+                         SearchSortOption)
+from django.test import tag
+
+from .test_setup import TestSetUp
+
+
+@tag('unit')
+class ConfigSnapshotTests(TestSetUp):
+
+    def setUp(self):
+        super().setUp()
+        self.ui_config = XDSUIConfiguration(search_results_per_page=15,
+                                            xds_configuration=self.config)
+        self.ui_config.save()
+
+    def test_get_config_snapshot(self):
+        """Test that get_config_snapshot returns the stored configuration
+            with only the active search fields, filters and sort options"""
+        SearchField(display_name='Subject', field_name='Course.Subject',
+                    xds_ui_configuration=self.ui_config).save()
+        SearchFilter(display_name='Provider', field_name='Course.Provider',
+                     xds_ui_configuration=self.ui_config, size=20,
+                     shard_size=100).save()
+        SearchFilter(display_name='Type', field_name='Course.Type',
+                     xds_ui_configuration=self.ui_config,
+                     active=False).save()
+        SearchSortOption(display_name='Title', field_name='Course.Title',
+                         xds_ui_configuration=self.ui_config).save()
+
+        snapshot = get_config_snapshot()
+
+        self.assertEqual(snapshot.target_xis_metadata_api, "test")
+        self.assertEqual(snapshot.search_results_per_page, 15)
+        self.assertEqual(snapshot.more_like_this_size, 6)
+        self.assertEqual(snapshot.similar_courses_size, 4)
+        self.assertEqual(snapshot.course_mapping.course_title,
+                         "Course.CourseTitle")
+        self.assertEqual(snapshot.search_fields, ('Course.Subject',))
+        self.assertEqual(len(snapshot.search_filters), 1)
+        self.assertEqual(snapshot.search_filters[0].field_name,
+                         'Course.Provider')
+        self.assertEqual(snapshot.search_filters[0].size, 20)
+        self.assertEqual(snapshot.search_filters[0].shard_size, 100)
+        self.assertIn('Course.Title', snapshot.sort_options)
+
+    def test_get_config_snapshot_source_fields(self):
+        """Test that the snapshot source fields are the mapped course fields
+            followed by the active course highlights"""
+        CourseDetailHighlight(display_name='Duration',
+                              field_name='Course.Duration',
+                              xds_ui_configuration=self.ui_config).save()
+        CourseDetailHighlight(display_name='Level',
+                              field_name='Course.Level',
+                              xds_ui_configuration=self.ui_config,
+                              active=False).save()
+
+        snapshot = get_config_snapshot()
+
+        self.assertIn(snapshot.course_mapping.course_title,
+                      snapshot.source_fields)
+        self.assertEqual(snapshot.source_fields[-1], 'Course.Duration')
+        self.assertNotIn('Course.Level', snapshot.source_fields)
+        self.assertNotIn('', snapshot.source_fields)
+        self.assertEqual(len(snapshot.source_fields),
+                         len(set(snapshot.source_fields)))
+
+    def test_get_config_snapshot_reused(self):
+        """Test that get_config_snapshot returns the same snapshot while the
+            configuration is unchanged"""
+        snapshot = get_config_snapshot()
+
+        self.assertIs(snapshot, get_config_snapshot())
+
+    def test_get_config_snapshot_invalidated(self):
+        """Test that saving a configuration model bumps the version and
+            rebuilds the snapshot"""
+        snapshot = get_config_snapshot()
+        version = get_config_version()
+
+        self.ui_config.search_results_per_page = 25
+        self.ui_config.save()
+
+        self.assertNotEqual(version, get_config_version())
+        self.assertIsNot(snapshot, get_config_snapshot())
+        self.assertEqual(get_config_snapshot().search_results_per_page, 25)
+
+    def test_get_config_snapshot_no_config(self):
+        """Test that get_config_snapshot raises an error when no XDS
+            configuration exists"""
+        XDSConfiguration.objects.all().delete()
+        invalidate_config_snapshot()
+
+        self.assertRaises(XDSConfiguration.DoesNotExist, get_config_snapshot)
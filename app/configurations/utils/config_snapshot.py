@@ -0,0 +1,191 @@
+import logging
+import threading
+import time
+from collections import namedtuple
+from contextvars import ContextVar
+
+from django.core.cache import cache
+
+from configurations.models import (CourseInformationMapping, XDSConfiguration,
+                                   XDSUIConfiguration)
+from core.models import (CourseDetailHighlight, SearchField, SearchFilter,
+                         SearchSortOption)
+
+logger = logging.getLogger('dict_config_logger')
+
+CONFIG_VERSION_KEY = 'xds_config_snapshot_version'
+
+# mapping of the UI fields to the Elasticsearch fields, one attribute per
+# course_* field of CourseInformationMapping
+CourseMapping = namedtuple('CourseMapping', [
+    field.name for field in CourseInformationMapping._meta.fields
+    if field.name.startswith('course_')])
+
+SearchFilterOption = namedtuple('SearchFilterOption',
+                                ['display_name', 'field_name', 'filter_type',
+                                 'size', 'shard_size'])
+
+
+class ConfigSnapshot(namedtuple('ConfigSnapshot', [
+        'version', 'target_xis_metadata_api', 'target_xse_host',
+        'target_xse_index', 'search_results_per_page', 'course_mapping',
+        'search_fields', 'search_filters', 'sort_options',
+        'source_fields', 'more_like_this_size', 'similar_courses_size'])):
+    """Immutable copy of the XDS configuration models used to build
+        searches"""
+
+    @classmethod
+    def from_models(cls, config, ui_config=None, course_mapping=None,
+                    search_fields=(), search_filters=(), sort_options=(),
+                    course_highlights=(), version=None):
+        """This method converts the configuration model instances into a
+            snapshot, falling back to the model defaults for the optional
+            ones"""
+        if ui_config is None:
+            ui_config = XDSUIConfiguration()
+        if course_mapping is None:
+            course_mapping = CourseInformationMapping()
+
+        mapping = CourseMapping(**{name: getattr(course_mapping, name)
+                                   for name in CourseMapping._fields})
+
+        # the hit fields rendered by the UI, used as the _source includes
+        source_fields = tuple(dict.fromkeys(
+            field_name for field_name in [
+                *mapping,
+                *(highlight.field_name for highlight in course_highlights)]
+            if field_name))
+
+        return cls(
+            version=version,
+            target_xis_metadata_api=config.target_xis_metadata_api,
+            target_xse_host=config.target_xse_host,
+            target_xse_index=config.target_xse_index,
+            search_results_per_page=ui_config.search_results_per_page,
+            course_mapping=mapping,
+            search_fields=tuple(field.field_name for field in search_fields),
+            search_filters=tuple(
+                SearchFilterOption(search_filter.display_name,
+                                   search_filter.field_name,
+                                   search_filter.filter_type,
+                                   search_filter.size,
+                                   search_filter.shard_size)
+                for search_filter in search_filters),
+            sort_options=frozenset(option.field_name
+                                   for option in sort_options),
+            source_fields=source_fields,
+            more_like_this_size=ui_config.more_like_this_size,
+            similar_courses_size=ui_config.similar_courses_size,
+        )
+
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+# version read by the current request, a dict shared by the threads the
+# request runs code in, None outside of requests
+_request_version = ContextVar('xds_config_request_version', default=None)
+
+
+def start_request(**kwargs):
+    """This method starts memoizing the configuration version for the
+        request, connected to request_started"""
+    _request_version.set({})
+
+
+def finish_request(**kwargs):
+    """This method stops memoizing the configuration version, connected to
+        request_finished"""
+    _request_version.set(None)
+
+
+def get_config_version():
+    """This method returns the configuration version shared by every worker
+        through the cache, read once per request"""
+    memo = _request_version.get()
+
+    if memo is not None and 'version' in memo:
+        return memo['version']
+
+    version = cache.get(CONFIG_VERSION_KEY)
+
+    if version is None:
+        # seeded from the clock so a version evicted from the cache is never
+        # reissued to a worker still holding an older snapshot
+        cache.add(CONFIG_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(CONFIG_VERSION_KEY)
+
+    if memo is not None:
+        memo['version'] = version
+
+    return version
+
+
+def build_config_snapshot(version=None):
+    """This method reads the configuration models from the database and
+        returns them as a ConfigSnapshot"""
+    config = XDSConfiguration.objects.select_related(
+        'xdsuiconfiguration',
+        'xdsuiconfiguration__course_information').first()
+
+    if config is None:
+        raise XDSConfiguration.DoesNotExist("No XDS configuration found")
+
+    ui_config = getattr(config, 'xdsuiconfiguration', None)
+    course_mapping = None
+    search_filters = []
+    sort_options = []
+    course_highlights = []
+
+    if ui_config is not None:
+        course_mapping = getattr(ui_config, 'course_information', None)
+        search_filters = SearchFilter.objects.filter(
+            xds_ui_configuration=ui_config, active=True)
+        sort_options = SearchSortOption.objects.filter(
+            xds_ui_configuration=ui_config, active=True)
+        course_highlights = CourseDetailHighlight.objects.filter(
+            xds_ui_configuration=ui_config, active=True)
+
+    return ConfigSnapshot.from_models(
+        config, ui_config, course_mapping,
+        search_fields=SearchField.objects.filter(active=True),
+        search_filters=search_filters,
+        sort_options=sort_options,
+        course_highlights=course_highlights,
+        version=version)
+
+
+def get_config_snapshot():
+    """This method returns the configuration snapshot of this worker,
+        rebuilding it when the shared configuration version has changed"""
+    global _snapshot
+
+    version = get_config_version()
+    snapshot = _snapshot
+
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+
+    with _snapshot_lock:
+        if _snapshot is None or _snapshot.version != version:
+            _snapshot = build_config_snapshot(version)
+            logger.info("Built XDS configuration snapshot %s", version)
+
+        return _snapshot
+
+
+def invalidate_config_snapshot():
+    """This method drops the snapshot of this worker and bumps the shared
+        version so the other workers rebuild theirs"""
+    global _snapshot
+
+    _snapshot = None
+    memo = _request_version.get()
+
+    if memo is not None:
+        memo.pop('version', None)
+
+    try:
+        cache.incr(CONFIG_VERSION_KEY)
+    except ValueError:
+        cache.add(CONFIG_VERSION_KEY, time.time_ns(), timeout=None)
@@ -1,15 +1,17 @@
 from core.models import (CourseDetailHighlight, CourseSpotlight, Experience,
-                         InterestList, SavedFilter, SearchFilter,
-                         SearchSortOption, SearchField)
+                         ExperienceSync, InterestList, SavedFilter,
+                         SearchFilter, SearchSortOption, SearchField)
 from django.contrib import admin
 
 
 @admin.register(SearchFilter)
 class SearchFilterAdmin(admin.ModelAdmin):
     list_display = ('display_name', 'field_name', 'xds_ui_configuration',
-                    'filter_type', 'active', 'created', 'modified',)
+                    'filter_type', 'size', 'shard_size', 'active', 'created',
+                    'modified',)
     fields = [('display_name', 'field_name', 'xds_ui_configuration',
-               'filter_type', 'active',)]
+               'filter_type', 'active',),
+              ('size', 'shard_size',)]
 
 
 @admin.register(SearchField)
@@ -43,7 +45,18 @@ class CourseSpotlightAdmin(admin.ModelAdmin):
 
 @admin.register(Experience)
 class ExperienceAdmin(admin.ModelAdmin):
-    list_display = ('metadata_key_hash',)
+    list_display = ('metadata_key_hash', 'metadata_fetched_at',
+                    'metadata_version',)
+    readonly_fields = ('metadata_fetched_at', 'metadata_etag',
+                       'metadata_version',)
+
+
+@admin.register(ExperienceSync)
+class ExperienceSyncAdmin(admin.ModelAdmin):
+    list_display = ('name', 'last_synced_hash', 'last_pass_completed_at',
+                    'last_run_at', 'last_run_records',)
+    readonly_fields = ('pass_started_at', 'last_pass_completed_at',
+                       'last_run_at', 'last_run_records', 'last_run_seconds',)
 
 
 @admin.register(InterestList)
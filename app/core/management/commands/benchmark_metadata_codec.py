@@ -0,0 +1,154 @@
+import random
+import time
+
+from core.management.utils.metadata_codec import (MetadataCodec, dumps,
+                                                  train_dictionary, zstandard)
+from django.core.management.base import BaseCommand, CommandError
+from xds_api.utils.xds_utils import format_metadata
+
+PROVIDERS = ['DAU', 'JKO', 'Navy eLearning', 'AETC', 'Army Learning']
+WORDS = ['acquisition', 'leadership', 'logistics', 'contracting', 'safety',
+         'cyber', 'security', 'management', 'fundamentals', 'advanced',
+         'program', 'financial', 'operations', 'planning', 'maintenance']
+
+
+def sample_record(rng, index):
+    """This helper method returns an XIS record shaped like the course
+        records of XIS, with random values"""
+    def words(count):
+        return ' '.join(rng.choice(WORDS) for _ in range(count))
+
+    provider = rng.choice(PROVIDERS)
+    code = f"{provider[:3].upper()}-{rng.randint(100, 999)}"
+
+    return {
+        "unique_record_identifier": f"{index:08x}-0000-4000-8000-000000000000",
+        "metadata_key_hash": f"{rng.getrandbits(128):032x}",
+        "metadata": {
+            "Metadata_Ledger": {
+                "Course": {
+                    "CourseCode": code,
+                    "CourseTitle": words(4).title(),
+                    "CourseShortDescription": words(20).capitalize(),
+                    "CourseFullDescription": words(80).capitalize(),
+                    "CourseProviderName": provider,
+                    "DepartmentName": "DoD",
+                    "EducationalContext": rng.choice(["Mandatory",
+                                                      "Non-mandatory"]),
+                    "CourseType": rng.choice(["Online", "Classroom"]),
+                    "CourseURL": f"https://example.com/courses/{code}",
+                    "EstimatedCompletionTime": f"{rng.randint(1, 40)} hours",
+                },
+                "CourseInstance": {
+                    "CourseCode": code,
+                    "CourseTitle": words(4).title(),
+                    "StartDate": "2024-01-15T00:00:00Z",
+                    "EndDate": "2024-03-15T00:00:00Z",
+                    "DeliveryMode": rng.choice(["Online", "Residential"]),
+                    "Instructor": words(2).title(),
+                },
+                "General_Information": {
+                    "StartDate": "2024-01-15T00:00:00Z",
+                    "EndDate": "2024-03-15T00:00:00Z",
+                },
+                "Lifecycle": {
+                    "Provider": provider,
+                    "Maintainer": provider,
+                    "OtherRole": "Course Manager",
+                },
+                "Technical_Information": {
+                    "Thumbnail": f"https://example.com/thumbnails/{code}.png",
+                },
+            },
+            "Supplemental_Ledger": {
+                "Instance": rng.randint(1, 10),
+                "Keywords": [rng.choice(WORDS) for _ in range(6)],
+                "Competencies": [words(3) for _ in range(3)],
+                "Prerequisites": words(10),
+                "Credits": rng.randint(0, 5),
+            },
+        },
+    }
+
+
+def sample_metadata(count, seed=0):
+    """This method returns the format_metadata output of count random XIS
+        records"""
+    rng = random.Random(seed)
+
+    return [format_metadata(sample_record(rng, index))
+            for index in range(count)]
+
+
+class Command(BaseCommand):
+    """This command compares the size of the experience metadata encoded by
+        each metadata codec, and the time taken to encode and decode it"""
+
+    help = 'Benchmarks the metadata codecs on sample course metadata'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=500,
+                            help='Number of sample experiences')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Seed of the sample experiences')
+        parser.add_argument('--dictionary',
+                            help='Dictionary to measure the zlib codec with, '
+                                 'instead of one trained on the sample')
+
+    def measure(self, codec, documents):
+        """This helper method returns the total encoded bytes and the
+            microseconds taken to encode and to decode a document"""
+        start = time.perf_counter()
+        blobs = [codec.encode(document) for document in documents]
+        encoded = time.perf_counter()
+
+        for blob in blobs:
+            codec.decode(blob)
+
+        decoded = time.perf_counter()
+
+        return (sum(len(blob) for blob in blobs),
+                (encoded - start) * 1e6 / len(documents),
+                (decoded - encoded) * 1e6 / len(documents))
+
+    def handle(self, *args, **options):
+        if options['count'] < 2:
+            raise CommandError("--count must be at least 2")
+
+        # dictionaries are trained on the first half and measured on the
+        # second half, as they are on experiences they were not trained on
+        documents = sample_metadata(options['count'], options['seed'])
+        training = documents[:len(documents) // 2]
+        documents = documents[len(documents) // 2:]
+
+        if options['dictionary']:
+            with open(options['dictionary'], 'rb') as file:
+                zlib_dictionary = file.read()
+        else:
+            zlib_dictionary = train_dictionary(training)
+
+        codecs = [('json', MetadataCodec('json')),
+                  ('zlib', MetadataCodec('zlib')),
+                  ('zlib+dictionary', MetadataCodec('zlib', zlib_dictionary))]
+
+        if zstandard is not None:
+            codecs += [('zstd', MetadataCodec('zstd')),
+                       ('zstd+dictionary', MetadataCodec(
+                           'zstd', train_dictionary(training, 'zstd',
+                                                    16 * 1024)))]
+        else:
+            self.stdout.write(self.style.WARNING(
+                "zstandard is not installed, skipping the zstd codec"))
+
+        raw = sum(len(dumps(document)) for document in documents)
+        self.stdout.write(f"{len(documents)} experiences, "
+                          f"{raw / len(documents):.0f} bytes of JSON each")
+
+        for name, codec in codecs:
+            size, encode, decode = self.measure(codec, documents)
+            self.stdout.write(
+                f"{name}: {size / len(documents):.0f} bytes, "
+                f"{100 * (1 - size / raw):.1f}% saved, "
+                f"encode {encode:.1f}us, decode {decode:.1f}us")
+
+        self.stdout.write(self.style.SUCCESS("Benchmark finished"))
@@ -0,0 +1,41 @@
+from core.management.utils.metadata_codec import train_dictionary
+from core.models import Experience
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    """This command trains a dictionary for the metadata codec on the
+        metadata stored on experiences"""
+
+    help = 'Trains a metadata codec dictionary on the stored metadata'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to write the dictionary to')
+        parser.add_argument('--codec', choices=['zlib', 'zstd'],
+                            default='zlib')
+        parser.add_argument('--limit', type=int, default=1000,
+                            help='Number of experiences to train on')
+        parser.add_argument('--size', type=int,
+                            help='Largest size of the dictionary in bytes')
+
+    def handle(self, *args, **options):
+        samples = [metadata for metadata in Experience.objects
+                   .filter(metadata__isnull=False)
+                   .order_by('-metadata_fetched_at')
+                   .values_list('metadata', flat=True)[:options['limit']]
+                   if metadata is not None]
+
+        if len(samples) < 2:
+            raise CommandError("Not enough experience metadata stored to "
+                               "train a dictionary, run sync_experiences "
+                               "first")
+
+        dictionary = train_dictionary(samples, options['codec'],
+                                      options['size'])
+
+        with open(options['path'], 'wb') as file:
+            file.write(dictionary)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote a {len(dictionary)} byte {options['codec']} dictionary "
+            f"trained on {len(samples)} experiences"))
@@ -0,0 +1,232 @@
+import json
+import logging
+import re
+import struct
+import threading
+import zlib
+from collections import Counter
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger('dict_config_logger')
+
+# blobs start with the format version, the codec and the id of the
+# dictionary they were compressed with, 0 when none
+FORMAT_VERSION = 1
+HEADER = struct.Struct('>BBI')
+
+CODEC_JSON = 0
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+CODECS = {'json': CODEC_JSON, 'zlib': CODEC_ZLIB, 'zstd': CODEC_ZSTD}
+
+# largest dictionary zlib can use, its window size
+ZLIB_DICTIONARY_SIZE = 32 * 1024
+
+# JSON strings, with the colon following keys, the strings a dictionary
+# is built from
+JSON_STRING = re.compile(rb'"(?:[^"\\]|\\.)*"(?::)?')
+
+
+class MetadataCodecError(ValueError):
+    """Raised when a blob cannot be decoded"""
+
+
+def dumps(value):
+    """This helper method returns the compact JSON bytes of value"""
+    return json.dumps(value, separators=(',', ':'),
+                      ensure_ascii=False).encode('utf-8')
+
+
+def get_dictionary_id(dictionary):
+    """This method returns the id a dictionary is recorded under in the
+        blobs compressed with it, never 0"""
+    return zlib.crc32(dictionary) or 1
+
+
+def train_zlib_dictionary(samples, size=ZLIB_DICTIONARY_SIZE):
+    """This method returns a preset dictionary for zlib made of the JSON
+        strings shared by the most samples, the most shared ones last where
+        zlib reaches them with the shortest distances"""
+    counts = Counter()
+
+    for sample in samples:
+        counts.update(set(JSON_STRING.findall(dumps(sample))))
+
+    strings = []
+    total = 0
+
+    for string, count in counts.most_common():
+        if count < 2:
+            break
+        if total + len(string) > size:
+            continue
+        strings.append(string)
+        total += len(string)
+
+    return b''.join(reversed(strings))
+
+
+def train_dictionary(samples, codec='zlib', size=None):
+    """This method returns a dictionary for the codec trained on the sample
+        values"""
+    if codec == 'zstd':
+        if zstandard is None:
+            raise ImproperlyConfigured("The zstd codec requires the "
+                                       "zstandard package")
+        return zstandard.train_dictionary(
+            size or 110 * 1024, [dumps(sample) for sample in samples]) \
+            .as_bytes()
+
+    return train_zlib_dictionary(samples, size or ZLIB_DICTIONARY_SIZE)
+
+
+class MetadataCodec():
+    """Encodes JSON values as compressed blobs led by a versioned header, so
+        blobs written by another codec, dictionary or format version are
+        recognized when read back"""
+
+    def __init__(self, codec='zlib', dictionary=None, level=None):
+        if codec not in CODECS:
+            raise ImproperlyConfigured(f"Unknown metadata codec '{codec}'")
+        if codec == 'zstd' and zstandard is None:
+            raise ImproperlyConfigured("The zstd codec requires the "
+                                       "zstandard package")
+
+        self.codec = CODECS[codec]
+        self.dictionary = dictionary or None
+        self.dictionary_id = get_dictionary_id(dictionary) \
+            if dictionary else 0
+        self.level = level
+        self.local = threading.local()
+
+        if self.codec == CODEC_ZSTD and self.dictionary:
+            self.zstd_dictionary = zstandard.ZstdCompressionDict(dictionary)
+        else:
+            self.zstd_dictionary = None
+
+    def zstd_compressor(self):
+        """This helper method returns the zstd compressor of the thread,
+            which are not shared across threads"""
+        if not hasattr(self.local, 'compressor'):
+            options = {'dict_data': self.zstd_dictionary} \
+                if self.zstd_dictionary else {}
+            self.local.compressor = zstandard.ZstdCompressor(
+                level=self.level or 3, **options)
+            self.local.decompressor = zstandard.ZstdDecompressor(**options)
+
+        return self.local.compressor, self.local.decompressor
+
+    def compress(self, data):
+        if self.codec == CODEC_ZLIB:
+            options = {'zdict': self.dictionary} if self.dictionary else {}
+            compressor = zlib.compressobj(
+                self.level if self.level is not None else 6, zlib.DEFLATED,
+                -zlib.MAX_WBITS, **options)
+            return compressor.compress(data) + compressor.flush()
+
+        return self.zstd_compressor()[0].compress(data)
+
+    def decompress(self, codec, payload):
+        if codec == CODEC_ZLIB:
+            options = {'zdict': self.dictionary} if self.dictionary else {}
+            decompressor = zlib.decompressobj(-zlib.MAX_WBITS, **options)
+            return decompressor.decompress(payload) + decompressor.flush()
+
+        return self.zstd_compressor()[1].decompress(payload)
+
+    def encode(self, value):
+        """This method returns the blob of the JSON value, left uncompressed
+            when compressing does not make it smaller"""
+        data = dumps(value)
+
+        if self.codec != CODEC_JSON:
+            compressed = self.compress(data)
+
+            if len(compressed) < len(data):
+                return HEADER.pack(FORMAT_VERSION, self.codec,
+                                   self.dictionary_id) + compressed
+
+        return HEADER.pack(FORMAT_VERSION, CODEC_JSON, 0) + data
+
+    def decode(self, blob):
+        """This method returns the JSON value of a blob made by encode, or of
+            plain JSON stored before blobs had a header. Raises
+            MetadataCodecError when the blob uses a format version, codec or
+            dictionary this codec cannot read"""
+        # JSON columns migrated to blobs may be read back as text
+        blob = blob.encode('utf-8') if isinstance(blob, str) else bytes(blob)
+
+        if blob[:1] != bytes([FORMAT_VERSION]):
+            # plain JSON starts with a printable character, never with a
+            # format version
+            try:
+                return json.loads(blob)
+            except ValueError as err:
+                raise MetadataCodecError("Unknown metadata format") from err
+
+        if len(blob) < HEADER.size:
+            raise MetadataCodecError("Truncated metadata blob")
+
+        version, codec, dictionary_id = HEADER.unpack_from(blob)
+        payload = blob[HEADER.size:]
+
+        if codec == CODEC_JSON:
+            return json.loads(payload)
+        if codec not in (CODEC_ZLIB, CODEC_ZSTD):
+            raise MetadataCodecError(f"Unknown metadata codec {codec}")
+        if codec == CODEC_ZSTD and zstandard is None:
+            raise MetadataCodecError("The zstandard package is not "
+                                     "installed")
+        if dictionary_id != self.dictionary_id:
+            raise MetadataCodecError(
+                f"Metadata compressed with dictionary {dictionary_id}")
+        if codec == CODEC_ZSTD and self.codec != CODEC_ZSTD:
+            # the dictionary of this codec is a zlib one
+            raise MetadataCodecError("Metadata compressed with zstd")
+
+        try:
+            return json.loads(self.decompress(codec, payload))
+        except (zlib.error, ValueError) as err:
+            raise MetadataCodecError("Corrupt metadata blob") from err
+
+
+_codec = None
+_codec_lock = threading.Lock()
+
+
+def get_metadata_codec():
+    """This method returns the codec configured by XIS_METADATA_CODEC and
+        XIS_METADATA_DICTIONARY"""
+    global _codec
+
+    if _codec is None:
+        with _codec_lock:
+            if _codec is None:
+                dictionary = None
+
+                if settings.XIS_METADATA_DICTIONARY:
+                    with open(settings.XIS_METADATA_DICTIONARY, 'rb') as file:
+                        dictionary = file.read()
+
+                _codec = MetadataCodec(settings.XIS_METADATA_CODEC,
+                                       dictionary)
+                logger.info("Using the %s metadata codec",
+                            settings.XIS_METADATA_CODEC)
+
+    return _codec
+
+
+def reset_metadata_codec():
+    """This method drops the configured codec so the next call to
+        get_metadata_codec reads the settings again"""
+    global _codec
+
+    with _codec_lock:
+        _codec = None
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-17 10:42
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_searchfield'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='searchfilter',
+            name='shard_size',
+            field=models.PositiveIntegerField(blank=True, help_text='Enter the number of values each shard returns for the filter, leave blank for the Elasticsearch default. Raising it makes counts of high-cardinality fields more accurate at the cost of shard memory', null=True, validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+        migrations.AddField(
+            model_name='searchfilter',
+            name='size',
+            field=models.PositiveIntegerField(default=10, help_text='Enter the number of values shown for the filter, more can be loaded from the facet buckets API', validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-17 11:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_searchfilter_shard_size_searchfilter_size'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='experience',
+            name='metadata',
+            field=models.JSONField(blank=True, help_text='XIS metadata of the experience in the search engine format', null=True),
+        ),
+        migrations.AddField(
+            model_name='experience',
+            name='metadata_etag',
+            field=models.CharField(blank=True, default='', help_text='ETag XIS sent along with the metadata', max_length=200),
+        ),
+        migrations.AddField(
+            model_name='experience',
+            name='metadata_fetched_at',
+            field=models.DateTimeField(blank=True, help_text='When the metadata was last fetched from XIS', null=True),
+        ),
+        migrations.AddField(
+            model_name='experience',
+            name='metadata_version',
+            field=models.PositiveIntegerField(default=0, help_text='Number of times the metadata changed in XIS'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-17 11:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_experience_metadata'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExperienceSync',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='Name of the mirror', max_length=200, unique=True)),
+                ('cursor', models.CharField(blank=True, default='', help_text='Metadata key hash of the last experience synced by the current pass, empty when a new pass starts', max_length=200)),
+                ('pass_started_at', models.DateTimeField(blank=True, help_text='When the current pass over the experiences started', null=True)),
+                ('last_pass_completed_at', models.DateTimeField(blank=True, help_text='When the last complete pass over the experiences ended', null=True)),
+                ('last_run_at', models.DateTimeField(blank=True, null=True)),
+                ('last_run_records', models.PositiveIntegerField(default=0)),
+                ('last_run_seconds', models.FloatField(default=0)),
+            ],
+        ),
+    ]
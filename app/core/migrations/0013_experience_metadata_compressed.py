@@ -0,0 +1,19 @@
+# Generated by Django 4.2.30 on 2026-10-17 11:19
+
+import core.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_experiencesync'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='experience',
+            name='metadata',
+            field=core.models.CompressedJSONField(blank=True, help_text='XIS metadata of the experience in the search engine format, compressed by the metadata codec', null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 12:58
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_experience_metadata_compressed'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='experiencesync',
+            old_name='cursor',
+            new_name='last_synced_hash',
+        ),
+    ]
@@ -1,11 +1,19 @@
+import json
+import logging
+
 from configurations.models import XDSUIConfiguration
+from core.management.utils.metadata_codec import (MetadataCodecError,
+                                                  get_metadata_codec)
 from django.conf import settings
 from django.core.validators import MinValueValidator
 from django.db import models
 from django.forms import ValidationError
 from django.urls import reverse
+from django.utils import timezone
 from model_utils.models import TimeStampedModel
 
+logger = logging.getLogger('dict_config_logger')
+
 
 class SearchFilter(TimeStampedModel):
     """Model to contain fields used for filtering search results"""
@@ -27,6 +35,19 @@ class SearchFilter(TimeStampedModel):
         choices=FILTER_TYPE_CHOICES,
         default='terms',
     )
+    size = models.PositiveIntegerField(
+        default=10,
+        validators=[MinValueValidator(1)],
+        help_text='Enter the number of values shown for the filter, more can '
+                  'be loaded from the facet buckets API')
+    shard_size = models.PositiveIntegerField(
+        blank=True,
+        null=True,
+        validators=[MinValueValidator(1)],
+        help_text='Enter the number of values each shard returns for the '
+                  'filter, leave blank for the Elasticsearch default. Raising '
+                  'it makes counts of high-cardinality fields more accurate '
+                  'at the cost of shard memory')
 
     active = models.BooleanField(default=True)
 
@@ -163,11 +184,88 @@ class CourseSpotlight(TimeStampedModel):
         return f'{self.id}'
 
 
+class CompressedJSONField(models.BinaryField):
+    """Field storing a JSON value as a blob encoded by the metadata codec"""
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        try:
+            return get_metadata_codec().decode(value)
+        except MetadataCodecError as err:
+            # read as never fetched, so it is fetched again
+            logger.error("Could not decode %s: %s", self.name, err)
+            return None
+
+    def get_prep_value(self, value):
+        if value is None:
+            return value
+        return get_metadata_codec().encode(value)
+
+    def to_python(self, value):
+        # serialized as JSON by value_to_string
+        if isinstance(value, str):
+            return json.loads(value)
+        return value
+
+    def value_to_string(self, obj):
+        return json.dumps(self.value_from_object(obj))
+
+
 class Experience(models.Model):
-    """Model to store experience instances for interest lists"""
+    """Model to store experience instances for interest lists, along with
+    their XIS metadata in the search engine format once fetched"""
 
     metadata_key_hash = models.CharField(max_length=200,
                                          primary_key=True)
+    metadata = CompressedJSONField(
+        blank=True, null=True,
+        help_text='XIS metadata of the experience in the search engine '
+                  'format, compressed by the metadata codec')
+    metadata_fetched_at = models.DateTimeField(
+        blank=True, null=True,
+        help_text='When the metadata was last fetched from XIS')
+    metadata_etag = models.CharField(
+        max_length=200, blank=True, default='',
+        help_text='ETag XIS sent along with the metadata')
+    metadata_version = models.PositiveIntegerField(
+        default=0,
+        help_text='Number of times the metadata changed in XIS')
+
+    def set_metadata(self, metadata, etag='', fetched_at=None):
+        """This method stores the metadata fetched from XIS, counting a new
+            version when it differs from the stored one"""
+        if metadata != self.metadata:
+            self.metadata_version += 1
+
+        self.metadata = metadata
+        self.metadata_etag = etag
+        self.metadata_fetched_at = fetched_at or timezone.now()
+
+
+class ExperienceSync(models.Model):
+    """Model to store the progress of the mirror of the XIS metadata of the
+    experiences referenced by interest lists and course spotlights"""
+
+    name = models.CharField(max_length=200, unique=True,
+                            help_text='Name of the mirror')
+    last_synced_hash = models.CharField(
+        max_length=200, blank=True, default='',
+        help_text='Metadata key hash of the last experience synced by the '
+                  'current pass, empty when a new pass starts')
+    pass_started_at = models.DateTimeField(
+        blank=True, null=True,
+        help_text='When the current pass over the experiences started')
+    last_pass_completed_at = models.DateTimeField(
+        blank=True, null=True,
+        help_text='When the last complete pass over the experiences ended')
+    last_run_at = models.DateTimeField(blank=True, null=True)
+    last_run_records = models.PositiveIntegerField(default=0)
+    last_run_seconds = models.FloatField(default=0)
+
+    def __str__(self):
+        """String for representing the Model object."""
+        return f'{self.name}'
 
 
 class InterestList(TimeStampedModel):
@@ -1,6 +1,10 @@
+import os
+import tempfile
+from io import StringIO
+
 from core.models import Experience, InterestList
 from django.conf import settings
-from django.core.management import call_command
+from django.core.management import CommandError, call_command
 from django.test import tag
 from users.models import XDSUser
 
@@ -70,3 +74,33 @@ class CommandTests(TestSetUp):
 
         call_command('clear_read_notifications')
         self.assertEqual(user.notifications.count(), 1)
+
+    def test_train_metadata_dictionary(self):
+        """Test that a dictionary is trained on the stored metadata"""
+        for index in range(3):
+            Experience.objects.create(
+                metadata_key_hash=str(index),
+                metadata={"Course": {"CourseTitle": f"Title {index}",
+                                     "CourseProviderName": "DAU"}})
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'metadata.dict')
+            call_command('train_metadata_dictionary', path, stdout=StringIO())
+
+            with open(path, 'rb') as file:
+                self.assertIn(b'"CourseProviderName":', file.read())
+
+    def test_train_metadata_dictionary_empty(self):
+        """Test that training without stored metadata fails"""
+        with self.assertRaises(CommandError):
+            call_command('train_metadata_dictionary', 'metadata.dict')
+
+    def test_benchmark_metadata_codec(self):
+        """Test that the benchmark reports the size and time of every
+            codec"""
+        out = StringIO()
+        call_command('benchmark_metadata_codec', count=20, stdout=out)
+
+        self.assertIn("json: ", out.getvalue())
+        self.assertIn("zlib+dictionary: ", out.getvalue())
+        self.assertIn("% saved", out.getvalue())
@@ -0,0 +1,82 @@
+import zlib
+
+from core.management.utils.metadata_codec import (HEADER, MetadataCodec,
+                                                  MetadataCodecError,
+                                                  train_dictionary)
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, tag
+
+METADATA = {
+    "Course": {"CourseTitle": "Acquisition Fundamentals",
+               "CourseProviderName": "DAU"},
+    "Supplemental_Ledger": {"Keywords": ["acquisition", "contracting"]},
+    "meta": {"id": "1", "metadata_key_hash": "abc"}
+}
+
+
+@tag('unit')
+class MetadataCodecTests(SimpleTestCase):
+
+    def test_round_trip(self):
+        """Test that every codec decodes the values it encodes"""
+        for codec in ('json', 'zlib'):
+            blob = MetadataCodec(codec).encode(METADATA)
+
+            self.assertEqual(MetadataCodec(codec).decode(blob), METADATA)
+
+    def test_compresses(self):
+        """Test that zlib blobs are smaller than the JSON, and a trained
+            dictionary makes them smaller still"""
+        samples = [dict(METADATA, meta={"id": str(index)})
+                   for index in range(10)]
+        dictionary = train_dictionary(samples)
+        value = {"items": [METADATA] * 5}
+
+        json_size = len(MetadataCodec('json').encode(value))
+        zlib_size = len(MetadataCodec('zlib').encode(METADATA))
+        dict_size = len(MetadataCodec('zlib', dictionary).encode(METADATA))
+
+        self.assertLess(len(MetadataCodec('zlib').encode(value)), json_size)
+        self.assertLess(dict_size, zlib_size)
+        self.assertEqual(MetadataCodec('zlib', dictionary).decode(
+            MetadataCodec('zlib', dictionary).encode(METADATA)), METADATA)
+
+    def test_small_values_stay_json(self):
+        """Test that values compression does not shrink are stored as
+            JSON, which any codec reads"""
+        blob = MetadataCodec('zlib').encode({"a": 1})
+
+        self.assertEqual(blob[1], 0)
+        self.assertEqual(MetadataCodec('json').decode(blob), {"a": 1})
+
+    def test_legacy_json(self):
+        """Test that JSON stored before blobs had a header is decoded"""
+        codec = MetadataCodec('zlib')
+
+        self.assertEqual(codec.decode(b'{"a": 1}'), {"a": 1})
+        self.assertEqual(codec.decode('[1, 2]'), [1, 2])
+
+    def test_dictionary_mismatch(self):
+        """Test that blobs compressed with another dictionary are refused
+            instead of decoded as garbage"""
+        blob = MetadataCodec('zlib', b'"Course":"CourseTitle":').encode(
+            {"Course": {"CourseTitle": "a" * 100}})
+
+        with self.assertRaises(MetadataCodecError):
+            MetadataCodec('zlib').decode(blob)
+
+    def test_unknown_format(self):
+        """Test that unknown codecs and corrupt blobs are refused"""
+        codec = MetadataCodec('zlib')
+
+        with self.assertRaises(MetadataCodecError):
+            codec.decode(HEADER.pack(1, 9, 0) + b'x')
+        with self.assertRaises(MetadataCodecError):
+            codec.decode(HEADER.pack(1, 1, 0) + zlib.compress(b'x')[:3])
+        with self.assertRaises(MetadataCodecError):
+            codec.decode(b'\x02garbage')
+
+    def test_unknown_codec(self):
+        """Test that configuring an unknown codec fails"""
+        with self.assertRaises(ImproperlyConfigured):
+            MetadataCodec('lz4')
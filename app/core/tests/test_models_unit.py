@@ -1,7 +1,11 @@
+import json
+
 from configurations.models import XDSConfiguration
+from core.management.utils.metadata_codec import MetadataCodec
 from core.models import (CourseDetailHighlight, CourseSpotlight, Experience,
                          InterestList, SearchFilter, SearchSortOption,
                          XDSUIConfiguration, SearchField)
+from django.db import connection
 from django.test import tag
 from users.models import XDSUser
 
@@ -82,6 +86,36 @@ class ModelTests(TestSetUp):
         self.assertEqual(course.metadata_key_hash,
                          savedCourse.metadata_key_hash)
 
+    def test_experience_metadata_compressed(self):
+        """Tests that the metadata of experiences is stored compressed and
+            read back"""
+        metadata = {"Course": {"CourseTitle": "Title " * 50}}
+        Experience(metadata_key_hash='12345', metadata=metadata).save()
+
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT metadata FROM core_experience '
+                           'WHERE metadata_key_hash = %s', ['12345'])
+            stored = cursor.fetchone()[0]
+
+        self.assertLess(len(stored), len(json.dumps(metadata)))
+        self.assertEqual(Experience.objects.get(pk='12345').metadata,
+                         metadata)
+        self.assertIsNone(Experience.objects.create(
+            metadata_key_hash='54321').metadata)
+
+    def test_experience_metadata_undecodable(self):
+        """Tests that metadata compressed with another dictionary is read as
+            never fetched"""
+        Experience.objects.create(metadata_key_hash='12345')
+        blob = MetadataCodec('zlib', b'"CourseTitle":').encode(
+            {"CourseTitle": "a" * 100})
+
+        with connection.cursor() as cursor:
+            cursor.execute('UPDATE core_experience SET metadata = %s '
+                           'WHERE metadata_key_hash = %s', [blob, '12345'])
+
+        self.assertIsNone(Experience.objects.get(pk='12345').metadata)
+
     def test_create_interest_list_existing_course(self):
         """Tests that creating an interest list with existing courses works"""
         id = '12345'
@@ -3,3 +3,8 @@ from django.apps import AppConfig
 
 class EsApiConfig(AppConfig):
     name = 'es_api'
+
+    def ready(self):
+        super(EsApiConfig, self).ready()
+        import es_api.signals
+        es_api.signals.organization_changed
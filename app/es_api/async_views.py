@@ -0,0 +1,388 @@
+import json
+import logging
+
+from django.conf import settings
+from django.http import (HttpResponse, HttpResponseBadRequest,
+                         HttpResponseServerError, JsonResponse)
+from django.views import View
+
+from configurations.utils.config_snapshot import get_config_snapshot
+from es_api import views
+from es_api.utils.async_queries import AsyncXSEQueries
+from es_api.utils.queries import InvalidCursorError
+from es_api.utils.threads import in_request_thread
+
+logger = logging.getLogger('dict_config_logger')
+
+# Async versions of the search views in es_api.views, used in place of them
+# when XSE_ASYNC_VIEWS is set.
+
+
+def query_error_response(message="error executing ElasticSearch query; " +
+                         views.CONTACT_ADMIN):
+    """This helper method returns the server error sent when a query
+        fails"""
+    errorMsgJSON = json.dumps({"message": message})
+
+    return HttpResponseServerError(errorMsgJSON,
+                                   content_type="application/json")
+
+
+def check_access(view_class, request, *args, **kwargs):
+    """This helper method runs the authentication and permission checks of
+        the REST framework view on the request, returning the response
+        refusing it or None when it is allowed"""
+    view = view_class()
+    view.args = args
+    view.kwargs = kwargs
+    drf_request = view.initialize_request(request, *args, **kwargs)
+    view.request = drf_request
+    view.headers = view.default_response_headers
+
+    try:
+        view.initial(drf_request, *args, **kwargs)
+    except Exception as exc:
+        response = view.finalize_response(
+            drf_request, view.handle_exception(exc), *args, **kwargs)
+        return response.render()
+
+    return None
+
+
+class AsyncSearchView(View):
+    """Base of the async search views, checking each request as the sync
+        view they replace does before handling it"""
+
+    # the view of es_api.views whose checks are run
+    sync_view = None
+
+    async def dispatch(self, request, *args, **kwargs):
+        refused = await in_request_thread(check_access)(
+            self.sync_view, request, *args, **kwargs)
+
+        if refused is not None:
+            return refused
+
+        return await super().dispatch(request, *args, **kwargs)
+
+
+async def get_queries(request, raw=False):
+    """This helper method returns the async queries for the configured
+        index, scoped to the user of the request"""
+    config = await in_request_thread(get_config_snapshot)()
+
+    return AsyncXSEQueries(config.target_xse_host, config.target_xse_index,
+                           user=request.user, raw=raw)
+
+
+class SearchIndexView(AsyncSearchView):
+    """This method defines an async API for sending keyword queries to
+            ElasticSearch"""
+
+    sync_view = views.SearchIndexView
+
+    get_request_attributes = views.SearchIndexView.get_request_attributes
+
+    async def get(self, request):
+        keyword, filters = self.get_request_attributes(request)
+
+        if keyword == '':
+            error = {
+                "message": "Request is missing 'keyword' query paramater"
+            }
+            return HttpResponseBadRequest(json.dumps(error),
+                                          content_type="application/json")
+
+        try:
+            config = await in_request_thread(get_config_snapshot)()
+
+            # only add the filters that are defined in the configuration,
+            # the rest is ignored
+            for curr_filter in config.search_filters:
+                if request.GET.get(curr_filter.field_name):
+                    filters[curr_filter.field_name] = \
+                        request.GET.getlist(curr_filter.field_name)
+
+            queries = await get_queries(
+                request, raw=settings.XSE_RAW_RESULTS)
+
+            if await in_request_thread(views.wants_explain)(request):
+                # a cursor would open a point in time
+                filters.pop('cursor', None)
+                await queries.abuild(queries.build_search_by_keyword,
+                                     keyword=keyword, filters=filters)
+                results = json.dumps(queries.explain())
+            else:
+                results = await queries.asearch_by_keyword_results(
+                    keyword=keyword, filters=filters)
+        except InvalidCursorError as cursor_err:
+            return views.invalid_cursor_response(cursor_err)
+        except Exception as err:
+            logger.error(err)
+            return query_error_response()
+
+        logger.info(results)
+        return HttpResponse(results, content_type="application/json")
+
+
+class SearchFacetsView(AsyncSearchView):
+    """This method defines an async API for the aggregations of a keyword
+            search"""
+
+    sync_view = views.SearchFacetsView
+
+    async def get(self, request):
+        keyword = request.GET.get('keyword', '')
+
+        if keyword == '':
+            error = {
+                "message": "Request is missing 'keyword' query paramater"
+            }
+            return HttpResponseBadRequest(json.dumps(error),
+                                          content_type="application/json")
+
+        try:
+            config = await in_request_thread(get_config_snapshot)()
+            filters = {}
+
+            # only add the filters that are defined in the configuration,
+            # the rest is ignored
+            for curr_filter in config.search_filters:
+                if request.GET.get(curr_filter.field_name):
+                    filters[curr_filter.field_name] = \
+                        request.GET.getlist(curr_filter.field_name)
+
+            queries = await get_queries(request)
+            results = await queries.asearch_facets_results(keyword=keyword,
+                                                           filters=filters)
+        except Exception as err:
+            logger.error(err)
+            return query_error_response()
+
+        logger.info(results)
+        return HttpResponse(results, content_type="application/json")
+
+
+class SearchFacetBucketsView(AsyncSearchView):
+    """This method defines an async API for loading the values of one filter
+            of a keyword search a page at a time"""
+
+    sync_view = views.SearchFacetBucketsView
+
+    get_request_attributes = \
+        views.SearchFacetBucketsView.get_request_attributes
+
+    async def get(self, request):
+        keyword = request.GET.get('keyword', '')
+
+        if keyword == '' or not request.GET.get('field'):
+            error = {
+                "message": "Request is missing 'keyword' or 'field' query "
+                           "parameter"
+            }
+            return HttpResponseBadRequest(json.dumps(error),
+                                          content_type="application/json")
+
+        try:
+            config = await in_request_thread(get_config_snapshot)()
+            search_filter, filters = self.get_request_attributes(request,
+                                                                 config)
+
+            if search_filter is None:
+                error = {
+                    "message": "Requested 'field' is not a search filter"
+                }
+                return HttpResponseBadRequest(json.dumps(error),
+                                              content_type="application/json")
+
+            queries = await get_queries(request)
+            results = await queries.afacet_buckets_results(
+                search_filter, keyword=keyword, filters=filters,
+                after=request.GET.get('after'))
+        except Exception as err:
+            logger.error(err)
+            return query_error_response()
+
+        logger.info(results)
+        return HttpResponse(results, content_type="application/json")
+
+
+class SearchDerivedView(AsyncSearchView):
+    """This method defines an async API for querying to ElasticSearch
+            for derived experiences"""
+
+    sync_view = views.SearchDerivedView
+
+    get_request_attributes = views.SearchDerivedView.get_request_attributes
+
+    async def get(self, request):
+        reference, filters = self.get_request_attributes(request)
+
+        if reference == '':
+            error = {
+                "message": "Request is missing 'reference' query parameter"
+            }
+            return HttpResponseBadRequest(json.dumps(error),
+                                          content_type="application/json")
+
+        try:
+            queries = await get_queries(
+                request, raw=settings.XSE_RAW_RESULTS)
+            response = await queries.asearch_for_derived(
+                reference=reference, filters=filters)
+            results = await queries.aget_results(response)
+        except InvalidCursorError as cursor_err:
+            return views.invalid_cursor_response(cursor_err)
+        except Exception as err:
+            logger.error(err)
+            return query_error_response()
+
+        logger.info(results)
+        return HttpResponse(results, content_type="application/json")
+
+
+class SearchCompetencyView(AsyncSearchView):
+    """This method defines an async API for querying to ElasticSearch
+            for competencies"""
+
+    sync_view = views.SearchCompetencyView
+
+    get_request_attributes = views.SearchCompetencyView.get_request_attributes
+
+    async def get(self, request):
+        reference, filters = self.get_request_attributes(request)
+
+        if reference == '':
+            error = {
+                "message": "Request is missing 'reference' query parameter"
+            }
+            return HttpResponseBadRequest(json.dumps(error),
+                                          content_type="application/json")
+
+        try:
+            queries = await get_queries(
+                request, raw=settings.XSE_RAW_RESULTS)
+            response = await queries.asearch_by_competency(
+                comp_uuid=reference, filters=filters)
+            results = await queries.aget_results(response)
+        except InvalidCursorError as cursor_err:
+            return views.invalid_cursor_response(cursor_err)
+        except Exception as err:
+            logger.error(err)
+            return query_error_response()
+
+        logger.info(results)
+        return HttpResponse(results, content_type="application/json")
+
+
+class GetMoreLikeThisView(AsyncSearchView):
+    """This method defines an async API for fetching results using the
+            more_like_this feature from elasticsearch"""
+
+    sync_view = views.GetMoreLikeThisView
+
+    async def get(self, request, doc_id):
+        try:
+            queries = await get_queries(
+                request, raw=settings.XSE_RAW_RESULTS)
+            results = await queries.amore_like_this_results(doc_id=doc_id)
+        except Exception as err:
+            logger.error(err)
+            return query_error_response("error executing ElasticSearch "
+                                        "query; please check the logs")
+
+        logger.info(results)
+        return HttpResponse(results, content_type="application/json")
+
+
+class GetSimilarCoursesView(AsyncSearchView):
+    """This method defines an async API for fetching results by sending key
+            words to elasticsearch and looking for similar courses"""
+
+    sync_view = views.GetSimilarCoursesView
+
+    async def get(self, request, key):
+        try:
+            queries = await get_queries(
+                request, raw=settings.XSE_RAW_RESULTS)
+            results = await queries.asimilar_courses_results(keyword=key)
+        except Exception as err:
+            logger.error(err)
+            return query_error_response()
+
+        logger.info(results)
+        return HttpResponse(results, content_type="application/json")
+
+
+class FiltersView(AsyncSearchView):
+    """This method defines an async API for performing a filter search"""
+
+    sync_view = views.FiltersView
+
+    async def get(self, request):
+        filters = {}
+        page_num = 1
+        cursor = request.GET.get('cursor')
+
+        try:
+            if request.GET.get('p'):
+                page_num = int(request.GET['p'])
+
+            config = await in_request_thread(get_config_snapshot)()
+            course_mapping = config.course_mapping
+
+            for field_name in [course_mapping.course_title,
+                               course_mapping.course_provider,
+                               'CourseInstance.CourseLevel']:
+                if request.GET.get(field_name):
+                    filters[field_name] = request.GET[field_name]
+
+            queries = await get_queries(
+                request, raw=settings.XSE_RAW_RESULTS)
+
+            if await in_request_thread(views.wants_explain)(request):
+                await queries.abuild(
+                    queries.build_search_by_filters, page_num,
+                    filters=filters,
+                    fields=views.get_requested_fields(request))
+                results = json.dumps(queries.explain())
+            else:
+                response = await queries.asearch_by_filters(
+                    page_num=page_num, filters=filters, cursor=cursor,
+                    fields=views.get_requested_fields(request))
+                results = await queries.aget_results(response)
+        except InvalidCursorError as cursor_err:
+            return views.invalid_cursor_response(cursor_err)
+        except Exception as err:
+            logger.error(err)
+            return query_error_response()
+
+        logger.info(results)
+        return HttpResponse(results, content_type="application/json")
+
+
+class SuggestionsView(AsyncSearchView):
+    """
+    This method defines an async API for retrieving suggested items from
+    Elastic
+    """
+
+    sync_view = views.SuggestionsView
+
+    async def get(self, request):
+        # if partial not passed in or empty, return failstate
+        if not request.GET.get('partial'):
+            return JsonResponse({"message": "No partial data sent"},
+                                status=400)
+
+        try:
+            config = await in_request_thread(get_config_snapshot)()
+            queries = AsyncXSEQueries(config.target_xse_host,
+                                      config.target_xse_index)
+            results = await queries.asuggest_results(
+                partial=request.GET['partial'])
+
+            return JsonResponse(results, safe=False)
+        except Exception as err:
+            logger.error(err)
+            return JsonResponse({"message": err.args[0]}, status=500)
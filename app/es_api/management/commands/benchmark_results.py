@@ -0,0 +1,103 @@
+import json
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from elasticsearch_dsl.response import Response
+
+from es_api.utils.queries import XSEQueries
+from es_api.utils.raw_response import RawResponse
+
+BENCHMARK_INDEX = 'benchmark'
+
+
+def search_response_body(hit_count, field_count, field_size):
+    """This helper method returns the text of a search response with
+        hit_count documents of field_count fields of field_size
+        characters"""
+    return json.dumps({
+        "took": 5,
+        "timed_out": False,
+        "_shards": {"total": 1, "successful": 1, "skipped": 0, "failed": 0},
+        "hits": {
+            "total": {"value": hit_count, "relation": "eq"},
+            "max_score": 1.0,
+            "hits": [{
+                "_index": BENCHMARK_INDEX,
+                "_type": "_doc",
+                "_id": str(num),
+                "_score": 1.0,
+                "_source": {
+                    "Course": {f"Field{field}": "x" * field_size
+                               for field in range(field_count)},
+                    "Supplemental_Ledger": {"Tags": ["a", "b", "c"],
+                                            "Rating": 4.5}
+                }
+            } for num in range(hit_count)]
+        }
+    })
+
+
+def format_parsed(queries, body):
+    """This helper method formats the body the way the default client and
+        elasticsearch_dsl do"""
+    return queries.get_results(Response(queries.search, json.loads(body)))
+
+
+def format_raw(queries, body):
+    """This helper method formats the body in raw mode"""
+    return queries.get_results(RawResponse(body))
+
+
+def measure(format_body, queries, body, repeat):
+    """This method returns the CPU milliseconds per call and the peak memory
+        in KiB of a call of format_body"""
+    start = time.process_time()
+    for _ in range(repeat):
+        format_body(queries, body)
+    cpu = (time.process_time() - start) / repeat * 1000
+
+    tracemalloc.start()
+    format_body(queries, body)
+    peak = tracemalloc.get_traced_memory()[1] / 1024
+    tracemalloc.stop()
+
+    return cpu, peak
+
+
+class Command(BaseCommand):
+    """This command compares the CPU time and memory of formatting search
+        results from a parsed and a raw Elasticsearch response"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', default='10,50,100',
+                            help='comma separated numbers of hits per page')
+        parser.add_argument('--fields', type=int, default=50,
+                            help='fields per document')
+        parser.add_argument('--field-size', type=int, default=200,
+                            help='characters per field')
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='calls to average the CPU time over')
+
+    def handle(self, *args, **options):
+        queries = XSEQueries(BENCHMARK_INDEX, BENCHMARK_INDEX)
+
+        for page in [int(size) for size in options['pages'].split(',')]:
+            body = search_response_body(page, options['fields'],
+                                        options['field_size'])
+
+            if json.loads(format_parsed(queries, body)) != \
+                    json.loads(format_raw(queries, body)):
+                self.stderr.write(self.style.ERROR(
+                    f"{page} hits: raw results differ from parsed results"))
+                continue
+
+            parsed_cpu, parsed_peak = measure(format_parsed, queries, body,
+                                              options['repeat'])
+            raw_cpu, raw_peak = measure(format_raw, queries, body,
+                                        options['repeat'])
+
+            self.stdout.write(
+                f"{page} hits ({len(body) / 1024:.0f} KiB): "
+                f"parsed {parsed_cpu:.2f} ms {parsed_peak:.0f} KiB peak, "
+                f"raw {raw_cpu:.2f} ms {raw_peak:.0f} KiB peak")
@@ -0,0 +1,107 @@
+import asyncio
+import time
+
+from django.core.management.base import BaseCommand
+
+from es_api.utils.async_queries import AsyncXSEQueries
+from es_api.utils.clients import close_async_clients, reset_clients
+from es_api.utils.queries import XSEQueries
+from es_api.utils.stub_server import stub_elasticsearch
+
+BENCHMARK_INDEX = 'benchmark'
+
+
+def build_search(queries, number):
+    """This helper method returns a keyword search of the benchmark, each
+        number gets a different search so none is collapsed with another"""
+    return queries.search.query('multi_match', query=f'python {number}',
+                                fields=['Course.CourseTitle'])[0:10]
+
+
+def stub_response(hit_count):
+    """This helper method returns the search response of the stub
+        Elasticsearch"""
+    return {
+        "took": 1,
+        "timed_out": False,
+        "hits": {
+            "total": {"value": hit_count, "relation": "eq"},
+            "hits": [{
+                "_index": BENCHMARK_INDEX,
+                "_id": str(num),
+                "_score": 1.0,
+                "_source": {"Course": {"CourseTitle": f"Course {num}"}}
+            } for num in range(hit_count)]
+        }
+    }
+
+
+def run_sync(host, count):
+    """This method sends the searches one after the other like a sync
+        worker and returns the seconds taken"""
+    start = time.perf_counter()
+
+    for number in range(count):
+        queries = XSEQueries(host, BENCHMARK_INDEX)
+        queries.search = build_search(queries, number)
+        queries.get_results(queries.execute())
+
+    return time.perf_counter() - start
+
+
+async def run_async(host, count, concurrency):
+    """This method sends the searches from one event loop with up to
+        concurrency in flight and returns the seconds taken"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def search(number):
+        async with semaphore:
+            queries = AsyncXSEQueries(host, BENCHMARK_INDEX)
+            queries.search = build_search(queries, number)
+            queries.get_results(await queries.aexecute())
+
+    try:
+        start = time.perf_counter()
+        await asyncio.gather(*(search(number) for number in range(count)))
+
+        return time.perf_counter() - start
+    finally:
+        await close_async_clients()
+
+
+class Command(BaseCommand):
+    """This command compares the search throughput of a sync and an async
+        worker against a stub Elasticsearch"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200,
+                            help='number of searches to send per mode')
+        parser.add_argument('--concurrency', type=int, default=100,
+                            help='searches in flight in async mode')
+        parser.add_argument('--latency', type=float, default=50,
+                            help='milliseconds the stub takes per search')
+        parser.add_argument('--hits', type=int, default=10,
+                            help='hits returned by each search')
+
+    def report(self, mode, count, elapsed):
+        self.stdout.write(f"{mode}: {count} searches in {elapsed:.2f}s "
+                          f"({count / elapsed:.1f} searches/s)")
+
+    def handle(self, *args, **options):
+        count = options['requests']
+
+        with stub_elasticsearch(stub_response(options['hits']),
+                                latency=options['latency'] / 1000) as host:
+            try:
+                sync_elapsed = run_sync(host, count)
+                async_elapsed = asyncio.run(
+                    run_async(host, count, options['concurrency']))
+            finally:
+                # the default client now points at the stub
+                reset_clients()
+
+        self.report('sync', count, sync_elapsed)
+        self.report(f"async (concurrency {options['concurrency']})", count,
+                    async_elapsed)
+        self.stdout.write(self.style.SUCCESS(
+            f"async speedup: {sync_elapsed / async_elapsed:.1f}x"))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from configurations.utils.config_snapshot import get_config_snapshot
+from es_api.utils.suggestion_index import (build_suggestion_entries,
+                                           publish_suggestion_entries)
+
+
+class Command(BaseCommand):
+    """This command rebuilds the suggestion index served by the workers from
+        the completion inputs of the configured Elasticsearch index, meant to
+        be run periodically"""
+
+    def handle(self, *args, **options):
+        config = get_config_snapshot()
+        # the suggestions carry the fields the UI renders, like the ones
+        # of the completion suggester
+        entries, sources = build_suggestion_entries(
+            config.target_xse_host, config.target_xse_index,
+            config.source_fields)
+        version = publish_suggestion_entries(config.target_xse_index,
+                                             entries, sources)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Published {len(entries)} suggestion entries of "
+            f"{config.target_xse_index} as version {version}"))
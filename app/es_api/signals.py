@@ -0,0 +1,32 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from users.models import Organization, XDSUser
+
+from .utils.organization_filters import (invalidate_organization_filters,
+                                         invalidate_user_organization_filters)
+
+
+@receiver(m2m_changed, sender=XDSUser.organizations.through)
+def organization_membership_changed(sender, instance, action, reverse,
+                                    pk_set, **kwargs):
+    """Drops the cached organization filters of the users whose
+        organizations changed"""
+    if not action.startswith('post_'):
+        return
+
+    if not reverse:
+        invalidate_user_organization_filters([instance.pk])
+    elif pk_set:
+        invalidate_user_organization_filters(pk_set)
+    else:
+        # an organization was cleared from every user
+        invalidate_organization_filters()
+
+
+@receiver(post_save, sender=Organization)
+@receiver(post_delete, sender=Organization)
+def organization_changed(sender, **kwargs):
+    """Drops every cached organization filter list when an organization is
+        added, changed or removed"""
+    invalidate_organization_filters()
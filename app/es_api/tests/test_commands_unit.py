@@ -0,0 +1,64 @@
+from io import StringIO
+from unittest.mock import patch
+
+from configurations.models import XDSConfiguration
+from configurations.utils.config_snapshot import get_config_snapshot
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, tag
+from es_api.utils.suggestion_index import (SUGGESTION_VERSION_KEY,
+                                           read_suggestion_entries)
+
+
+@tag('unit')
+class CommandTests(TestCase):
+
+    def test_benchmark_search(self):
+        """Test that the benchmark sends the searches to the stub
+            Elasticsearch in both modes"""
+        out = StringIO()
+
+        call_command('benchmark_search', requests=4, concurrency=2,
+                     latency=0, hits=2, stdout=out)
+
+        output = out.getvalue()
+        self.assertIn('sync: 4 searches', output)
+        self.assertIn('async (concurrency 2): 4 searches', output)
+        self.assertIn('async speedup', output)
+
+    def test_benchmark_results(self):
+        """Test that the benchmark formats every page size both ways with
+            the same results"""
+        out, err = StringIO(), StringIO()
+
+        call_command('benchmark_results', pages='1,3', fields=2,
+                     field_size=10, repeat=1, stdout=out, stderr=err)
+
+        output = out.getvalue()
+        self.assertEqual(err.getvalue(), '')
+        self.assertIn('1 hits', output)
+        self.assertIn('3 hits', output)
+        self.assertIn('raw', output)
+
+    def test_refresh_suggestions(self):
+        """Test that the command publishes the suggestion entries of the
+            configured index to the workers"""
+        XDSConfiguration(target_xse_host='host',
+                         target_xse_index='courses').save()
+        out = StringIO()
+
+        with patch('es_api.management.commands.refresh_suggestions.'
+                   'build_suggestion_entries') as build:
+            build.return_value = ([('Python', '1', ('orgA',), 1)],
+                                  {'1': {'Course': {'CourseTitle': 'a'}}})
+            call_command('refresh_suggestions', stdout=out)
+
+            build.assert_called_once_with(
+                'host', 'courses', get_config_snapshot().source_fields)
+
+        publication = cache.get(SUGGESTION_VERSION_KEY)
+        self.assertEqual(publication['index'], 'courses')
+        self.assertEqual(read_suggestion_entries(publication), (
+            [('Python', '1', ('orgA',), 1)],
+            {'1': {'Course': {'CourseTitle': 'a'}}}))
+        self.assertIn('Published 1 suggestion entries', out.getvalue())
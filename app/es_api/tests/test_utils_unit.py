@@ -1,12 +1,39 @@
+import asyncio
 import json
-from unittest.mock import Mock, patch
+import threading
+import time
+from unittest.mock import AsyncMock, Mock, patch
 
+from asgiref.sync import sync_to_async
 from configurations.models import XDSConfiguration, XDSUIConfiguration
+from configurations.utils.config_snapshot import (ConfigSnapshot,
+                                                  get_config_snapshot)
 from core.models import CourseSpotlight, SearchFilter, SearchSortOption
-from django.test import TestCase, tag
+from django.core.cache import cache, caches
+from django.db import connection
+from django.test import TestCase, override_settings, tag
+from django.test.utils import CaptureQueriesContext
 from elasticsearch_dsl import Q, Search
-from es_api.utils.queries import XSEQueries
+from elasticsearch_dsl.response import Response
+from es_api.utils.async_queries import AsyncXSEQueries
+from es_api.utils.bundle import (SECTION_ERROR, SearchBundle, format_hits,
+                                 format_spotlight, format_suggestions)
+from es_api.utils.clients import (close_async_clients, get_async_client,
+                                  get_client, get_pool_stats, reset_clients)
+from es_api.utils.queries import (XSEQueries, decode_cursor, encode_cursor,
+                                  explain_search)
 from es_api.utils.queries_base import BaseQueries
+from es_api.utils.raw_response import RAW_SERIALIZER, RawResponse
+from es_api.utils.result_cache import (RESULT_CACHE, make_cache_key,
+                                       normalize_filters, normalize_keyword)
+from es_api.utils.single_flight import SingleFlight
+from es_api.utils.stub_server import stub_elasticsearch
+from es_api.utils.suggestion_index import (SUGGESTION_INDEX_KEY,
+                                           SuggestionIndex,
+                                           build_suggestion_entries,
+                                           completion_inputs,
+                                           publish_suggestion_entries)
+from es_api.utils.threads import in_request_thread, in_thread
 from users.models import Organization, XDSUser
 
 
@@ -16,39 +43,29 @@ class UtilTests(TestCase):
     def test_get_results(self):
         """Test that calling get results on a Response Object returns a \
             dictionary with hits and a total"""
-        with patch('elasticsearch_dsl.response') as response_obj:
-            response_obj.return_value = {
-                "hits": {
-                    "total": {
-                        "value": 1
-                    }
-                }
-            }
-            response_obj.hits.total.value = 1
-            with patch('elasticsearch_dsl.response.hit.to_dict') as to_dict, \
-                    patch(
-                        'es_api.utils.queries.'
-                        'SearchFilter.objects') as sfObj, \
-                    patch('elasticsearch_dsl.response.aggregations.'
-                          'to_dict') as agg:
-                agg.return_value = {}
-                sfObj.return_value = []
-                to_dict.return_value = {
-                    "key": "value"
-                }
-                query = XSEQueries('test', 'test')
-                result_json = query.get_results(response_obj)
-                result_dict = json.loads(result_json)
-                self.assertEqual(result_dict.get("total"), 1)
-                self.assertEqual(len(result_dict.get("hits")), 0)
-                self.assertEqual(len(result_dict.get("aggregations")), 0)
+        query = XSEQueries('test', 'test')
+        response_obj = Response(query.search, {
+            "hits": {
+                "total": {
+                    "value": 1
+                },
+                "hits": []
+            },
+            "aggregations": {}
+        })
+
+        result_json = query.get_results(response_obj)
+        result_dict = json.loads(result_json)
+        self.assertEqual(result_dict.get("total"), 1)
+        self.assertEqual(len(result_dict.get("hits")), 0)
+        self.assertEqual(len(result_dict.get("aggregations")), 0)
 
     def test_more_like_this(self):
         """"Test that calling more_like_this returns whatever response elastic\
               search returns"""
         with patch('elasticsearch_dsl.Search.execute') as es_execute, \
-                patch('es_api.utils.queries.'
-                      'CourseInformationMapping.objects'):
+                patch('es_api.utils.queries.get_config_snapshot') as snapshot:
+            snapshot.return_value.more_like_this_size = 6
             resultVal = {
                 "test": "test"
             }
@@ -64,8 +81,8 @@ class UtilTests(TestCase):
         """"Test that calling similar_courses returns whatever response
               elastic search returns"""
         with patch('elasticsearch_dsl.Search.execute') as es_execute, \
-                patch('es_api.utils.queries.'
-                      'CourseInformationMapping.objects'):
+                patch('es_api.utils.queries.get_config_snapshot') as snapshot:
+            snapshot.return_value.similar_courses_size = 4
             resultVal = {
                 "test": "test"
             }
@@ -80,19 +97,13 @@ class UtilTests(TestCase):
     def test_search_by_keyword_error(self):
         """Test that calling search_by_keyword with a invalid page # \
              (e.g. string) value will throw an error"""
-        with patch('es_api.utils.queries.'
-                   'XDSConfiguration.objects') as xdsCfg, \
-                patch('elasticsearch_dsl.Search.execute') as es_execute, \
-                patch('es_api.utils.queries.SearchFilter.objects') as sfObj, \
-                patch('es_api.utils.queries.'
-                      'CourseInformationMapping.objects'):
+        with patch('es_api.utils.queries.get_config_snapshot') as snapshot, \
+                patch('elasticsearch_dsl.Search.execute') as es_execute:
             configObj = XDSConfiguration(target_xis_metadata_api="dsds")
             uiConfigObj = XDSUIConfiguration(search_results_per_page=10,
                                              xds_configuration=configObj)
-            xdsCfg.xdsuiconfiguration = uiConfigObj
-            xdsCfg.first.return_value = configObj
-            sfObj.return_value = []
-            sfObj.filter.return_value = []
+            snapshot.return_value = ConfigSnapshot.from_models(configObj,
+                                                               uiConfigObj)
             es_execute.return_value = {
                 "test": "test"
             }
@@ -237,9 +248,9 @@ class UtilTests(TestCase):
         query = XSEQueries('test', 'test')
         query.search = query.search.query(q)
 
-        with patch('es_api.utils.queries.SearchSortOption.objects') as \
-                sortOpts:
-            sortOpts.filter.return_value = []
+        with patch('es_api.utils.queries.get_config_snapshot') as \
+                snapshot:
+            snapshot.return_value.sort_options = frozenset()
             filters = {"test": "Test"}
             hasSort = False
 
@@ -260,13 +271,14 @@ class UtilTests(TestCase):
         query = XSEQueries('test', 'test')
         query.search = query.search.query(q)
 
-        with patch('es_api.utils.queries.SearchSortOption.objects') as \
-                sortOpts:
+        with patch('es_api.utils.queries.get_config_snapshot') as \
+                snapshot:
             sortOption = SearchSortOption(display_name="test",
                                           field_name="test-field",
                                           xds_ui_configuration=None,
                                           active=True)
-            sortOpts.filter.return_value = [sortOption]
+            snapshot.return_value = ConfigSnapshot.from_models(
+                XDSConfiguration(), sort_options=[sortOption])
             filters = {"sort": "test-field"}
             hasSort = False
 
@@ -326,16 +338,35 @@ class UtilTests(TestCase):
 
             self.assertEqual(len(result), 0)
 
+    def test_spotlight_courses_snapshot(self):
+        """Test that spotlight_courses serves the spotlight snapshot of the
+            index until a course spotlight changes"""
+        CourseSpotlight(course_id='1').save()
+
+        with patch('elasticsearch_dsl.Document.mget') as mget:
+            doc = mget.return_value
+            mget.return_value = [doc]
+            doc.to_dict.return_value = {"_source": {"test": "val"},
+                                        "_id": "1", "_index": "test"}
+
+            result = XSEQueries('test', 'test').spotlight_courses()
+            cached_result = XSEQueries('test', 'test').spotlight_courses()
+            CourseSpotlight(course_id='2').save()
+            XSEQueries('test', 'test').spotlight_courses()
+
+            self.assertEqual(cached_result, result)
+            self.assertEqual(result[0]["meta"], {"id": "1", "index": "test"})
+            self.assertEqual(mget.call_count, 2)
+
     def test_search_by_filters(self):
         """Test that calling search_by_filters returns an JSON object"""
-        with patch('es_api.utils.queries.'
-                   'XDSConfiguration.objects') as xdsCfg, \
+        with patch('es_api.utils.queries.get_config_snapshot') as snapshot, \
                 patch('elasticsearch_dsl.Search.execute') as es_execute:
             configObj = XDSConfiguration(target_xis_metadata_api="dsds")
             uiConfigObj = XDSUIConfiguration(search_results_per_page=10,
                                              xds_configuration=configObj)
-            xdsCfg.xdsuiconfiguration = uiConfigObj
-            xdsCfg.first.return_value = configObj
+            snapshot.return_value = ConfigSnapshot.from_models(configObj,
+                                                               uiConfigObj)
             expected_result = {
                 "test": "test"
             }
@@ -348,20 +379,13 @@ class UtilTests(TestCase):
     def test_search_for_derived(self):
         """Test that calling search_for_derived with a invalid page # \
         (e.g. string) value will throw an error"""
-        with patch('es_api.utils.queries.'
-                   'XDSConfiguration.objects') as xdsCfg, \
-                patch('elasticsearch_dsl.Search.execute') as es_execute, \
-                patch('es_api.utils.queries.SearchFilter.objects') as sfObj, \
-                patch('es_api.utils.queries.'
-                      'CourseInformationMapping.objects') as cimobj:
+        with patch('es_api.utils.queries.get_config_snapshot') as snapshot, \
+                patch('elasticsearch_dsl.Search.execute') as es_execute:
             configObj = XDSConfiguration(target_xis_metadata_api="dsds")
             uiConfigObj = XDSUIConfiguration(search_results_per_page=10,
                                              xds_configuration=configObj)
-            cimobj.first().course_derived_from = "test"
-            xdsCfg.xdsuiconfiguration = uiConfigObj
-            xdsCfg.first.return_value = configObj
-            sfObj.return_value = []
-            sfObj.filter.return_value = []
+            snapshot.return_value = ConfigSnapshot.from_models(configObj,
+                                                               uiConfigObj)
             es_execute.return_value = {
                 "test": "test"
             }
@@ -373,20 +397,13 @@ class UtilTests(TestCase):
     def test_search_by_competency(self):
         """Test that calling search_for_derived with a invalid page # \
         (e.g. string) value will throw an error"""
-        with patch('es_api.utils.queries.'
-                   'XDSConfiguration.objects') as xdsCfg, \
-                patch('elasticsearch_dsl.Search.execute') as es_execute, \
-                patch('es_api.utils.queries.SearchFilter.objects') as sfObj, \
-                patch('es_api.utils.queries.'
-                      'CourseInformationMapping.objects') as cimobj:
+        with patch('es_api.utils.queries.get_config_snapshot') as snapshot, \
+                patch('elasticsearch_dsl.Search.execute') as es_execute:
             configObj = XDSConfiguration(target_xis_metadata_api="dsds")
             uiConfigObj = XDSUIConfiguration(search_results_per_page=10,
                                              xds_configuration=configObj)
-            cimobj.first().course_competency = "test"
-            xdsCfg.xdsuiconfiguration = uiConfigObj
-            xdsCfg.first.return_value = configObj
-            sfObj.return_value = []
-            sfObj.filter.return_value = []
+            snapshot.return_value = ConfigSnapshot.from_models(configObj,
+                                                               uiConfigObj)
             es_execute.return_value = {
                 "test": "test"
             }
@@ -443,15 +460,11 @@ class XDSUserTests(TestCase):
 
         expected_search = Search(using='default',
                                  index='test'). \
-            query(Q("match", filter=org0.filter) |
-                  Q("match", filter=org1.filter))
+            filter('terms', filter=[org1.filter, org0.filter])
         query.user_organization_filtering()
         result = query.search
 
-        self.assertIn(expected_search.to_dict()['query']['bool']['should'][0],
-                      result.to_dict()['query']['bool']['should'])
-        self.assertIn(expected_search.to_dict()['query']['bool']['should'][1],
-                      result.to_dict()['query']['bool']['should'])
+        self.assertEqual(result.to_dict(), expected_search.to_dict())
 
     def test_filter_options_blank(self):
         """
@@ -559,3 +572,1328 @@ class XDSUserTests(TestCase):
         self.assertEqual(
             len(es.suggest.call_args[1]['completion']['contexts']['filter']),
             1)
+
+
+@tag('unit')
+class ClientRegistryTests(TestCase):
+
+    def setUp(self):
+        reset_clients()
+        self.addCleanup(reset_clients)
+
+    def test_get_client_reused(self):
+        """Test that calling get_client twice with the same host returns the
+            same pooled client"""
+        client = get_client('http://test:9200')
+
+        self.assertIs(client, get_client('http://test:9200'))
+        self.assertIs(client, XSEQueries('http://test:9200', 'test').client)
+
+    def test_get_client_rebuilt(self):
+        """Test that calling get_client with a different host builds a new
+            client"""
+        client = get_client('http://test:9200')
+        other_client = get_client('http://other:9200')
+
+        self.assertIsNot(client, other_client)
+        self.assertIs(other_client, get_client('http://other:9200'))
+
+    def test_get_pool_stats(self):
+        """Test that get_pool_stats reports a pool for each client host"""
+        get_client('http://test:9200')
+
+        stats = get_pool_stats()
+
+        self.assertEqual(len(stats['default']), 1)
+        self.assertEqual(stats['default'][0]['host'], 'http://test:9200')
+        self.assertEqual(stats['default'][0]['requests'], 0)
+
+
+@tag('unit')
+class ResultCacheTests(TestCase):
+
+    def test_make_cache_key_canonical(self):
+        """Test that equivalent keywords and filters in a different order
+            produce the same cache key"""
+        key = make_cache_key(
+            'keyword', keyword=normalize_keyword('Data  Science'),
+            filters=normalize_filters({'page': '1', 'type': ['b', 'a']}))
+        other_key = make_cache_key(
+            'keyword', keyword=normalize_keyword(' data science'),
+            filters=normalize_filters({'type': ['a', 'b'], 'page': '1'}))
+
+        self.assertEqual(key, other_key)
+
+    def test_search_by_keyword_results_cached(self):
+        """Test that repeating a keyword search is served from the result
+            cache instead of Elasticsearch"""
+        with patch('es_api.utils.queries.get_config_snapshot') as snapshot, \
+                patch('es_api.utils.queries.XSEQueries.search_by_keyword') \
+                as search_by_keyword, \
+                patch('es_api.utils.queries.XSEQueries.get_results') \
+                as get_results:
+            snapshot.return_value.version = 1
+            get_results.return_value = '{"hits": []}'
+
+            result = XSEQueries('test', 'test').search_by_keyword_results(
+                'Python', {'page': '1', 'type': ['b', 'a']})
+            cached_result = XSEQueries('test', 'test') \
+                .search_by_keyword_results(
+                    'python ', {'page': '1', 'type': ['a', 'b']})
+
+            self.assertEqual(result, '{"hits": []}')
+            self.assertEqual(cached_result, result)
+            self.assertEqual(search_by_keyword.call_count, 1)
+
+    def test_search_by_keyword_results_org_scope(self):
+        """Test that keyword searches scoped to different organizations are
+            cached separately"""
+        with patch('es_api.utils.queries.get_config_snapshot') as snapshot, \
+                patch('es_api.utils.queries.XSEQueries.search_by_keyword') \
+                as search_by_keyword, \
+                patch('es_api.utils.queries.XSEQueries.get_results') \
+                as get_results:
+            snapshot.return_value.version = 1
+            get_results.return_value = '{"hits": []}'
+
+            XSEQueries('test', 'test').search_by_keyword_results(
+                'python', {'page': '1'})
+            Organization(name='testOrg', filter='testOrgFilter').save()
+            XSEQueries('test', 'test').search_by_keyword_results(
+                'python', {'page': '1'})
+
+            self.assertEqual(search_by_keyword.call_count, 2)
+
+
+@tag('unit')
+class GetResultsQueryTests(TestCase):
+
+    def setUp(self):
+        self.config = XDSConfiguration(target_xse_host='test',
+                                       target_xse_index='test')
+        self.config.save()
+        self.ui_config = XDSUIConfiguration(xds_configuration=self.config)
+        self.ui_config.save()
+
+    def count_search_queries(self):
+        """Runs a keyword search against a stubbed Elasticsearch response
+            with a bucket for every filter and returns the number of
+            database queries it made"""
+        query = XSEQueries('test', 'test')
+
+        def execute(search):
+            return Response(search, {
+                "hits": {"total": {"value": 0}, "hits": []},
+                "aggregations": {
+                    name: {"buckets": [{"key": "value", "doc_count": 1}]}
+                    for name in search.to_dict().get('aggs', {})}
+            })
+
+        with patch('elasticsearch_dsl.Search.execute', autospec=True) \
+                as es_execute, CaptureQueriesContext(connection) as queries:
+            es_execute.side_effect = execute
+            result = json.loads(query.get_results(
+                query.search_by_keyword('python', {'page': '1'})))
+
+        for name, field_name in query.aggregation_fields.items():
+            self.assertEqual(result['aggregations'][name]['field_name'],
+                             field_name)
+
+        return len(queries)
+
+    def add_filters(self, count):
+        for num in range(count):
+            SearchFilter(display_name=f'Filter {num}',
+                         field_name=f'Course.Field{num}',
+                         xds_ui_configuration=self.ui_config).save()
+
+    def test_get_results_constant_queries(self):
+        """Test that get_results does not query the database per
+            aggregation bucket"""
+        # warms the cached organization filters
+        self.count_search_queries()
+
+        self.add_filters(1)
+        single_filter_queries = self.count_search_queries()
+
+        self.add_filters(5)
+        many_filter_queries = self.count_search_queries()
+
+        self.assertEqual(single_filter_queries, many_filter_queries)
+
+    def test_get_results_configured_filter(self):
+        """Test that get_results names the field of aggregations the search
+            did not add itself using the configured filters"""
+        self.add_filters(1)
+        query = XSEQueries('test', 'test')
+        response_obj = Response(query.search, {
+            "hits": {"total": {"value": 0}, "hits": []},
+            "aggregations": {"Filter 0": {"buckets": []}}
+        })
+
+        result = json.loads(query.get_results(response_obj))
+
+        self.assertEqual(result['aggregations']['Filter 0']['field_name'],
+                         'Course.Field0')
+
+
+@tag('unit')
+class OrganizationFiltersTests(TestCase):
+
+    def setUp(self):
+        self.org = Organization(name='orgName', filter='orgFilter')
+        self.org.save()
+        self.user = XDSUser.objects.create_user('orgs@test.com',
+                                                'test1234',
+                                                first_name='Jane',
+                                                last_name='doe')
+
+    def test_organization_filters_cached(self):
+        """Test that the organization filters of a user are read from the
+            cache in one query, and once per query instance"""
+        self.user.organizations.add(self.org)
+        XSEQueries('test', 'test', user=self.user).get_organization_filters()
+        query = XSEQueries('test', 'test', user=self.user)
+
+        with CaptureQueriesContext(connection) as queries:
+            org_filters = query.get_organization_filters()
+            query.get_organization_filters()
+
+        self.assertEqual(org_filters, ['orgFilter'])
+        self.assertEqual(len(queries), 1, [captured['sql']
+                                           for captured in queries])
+
+    def test_organization_filters_membership_change(self):
+        """Test that changing the organizations of a user invalidates their
+            cached organization filters"""
+        def get_organization_filters():
+            return XSEQueries('test', 'test',
+                              user=self.user).get_organization_filters()
+
+        self.assertEqual(get_organization_filters(), [])
+
+        self.user.organizations.add(self.org)
+        self.assertEqual(get_organization_filters(), ['orgFilter'])
+
+        self.user.organizations.remove(self.org)
+        self.assertEqual(get_organization_filters(), [])
+
+    def test_organization_filters_anonymous(self):
+        """Test that anonymous users are scoped to every organization and
+            that adding one invalidates the cached filters"""
+        self.assertEqual(XSEQueries('test', 'test')
+                         .get_organization_filters(), ['orgFilter'])
+
+        Organization(name='otherOrgName', filter='otherOrgFilter').save()
+        self.assertEqual(XSEQueries('test', 'test')
+                         .get_organization_filters(),
+                         ['orgFilter', 'otherOrgFilter'])
+
+
+@tag('unit')
+class CursorPaginationTests(TestCase):
+
+    def test_cursor_round_trip(self):
+        """Test that a cursor decodes back to its point in time and sort
+            values and that malformed cursors are rejected"""
+        cursor = encode_cursor('pitId', [1.5, 'title', 42])
+
+        self.assertEqual(decode_cursor(cursor), ('pitId', [1.5, 'title', 42]))
+
+        for bad_cursor in ['not a cursor', encode_cursor(None, [1]),
+                           'eyJwaXQiOiAiYSJ9']:
+            self.assertRaises(ValueError, decode_cursor, bad_cursor)
+
+    def test_add_search_pagination_page(self):
+        """Test that without a cursor the page number is turned into a
+            from/size slice"""
+        query = XSEQueries('test', 'test')
+        query.add_search_pagination(3, 10)
+
+        search_dict = query.search.to_dict()
+
+        self.assertEqual(search_dict['from'], 20)
+        self.assertEqual(search_dict['size'], 10)
+        self.assertNotIn('pit', search_dict)
+
+    def test_add_search_pagination_new_cursor(self):
+        """Test that an empty cursor opens a point in time and sorts with a
+            tiebreaker on the configured sort"""
+        query = XSEQueries('test', 'test')
+        query.search = query.search.sort('Course.CourseTitle.keyword')
+
+        with patch.object(query.client, 'open_point_in_time') as open_pit:
+            open_pit.return_value = {'id': 'pitId'}
+            query.add_search_pagination(1, 10, cursor='')
+
+            open_pit.assert_called_once_with(index='test', keep_alive='1m')
+
+        search_dict = query.search.to_dict()
+
+        self.assertIsNone(query.search._index)
+        self.assertEqual(search_dict['pit'], {'id': 'pitId',
+                                              'keep_alive': '1m'})
+        self.assertEqual(search_dict['sort'], ['Course.CourseTitle.keyword',
+                                               {'_shard_doc': 'asc'}])
+        self.assertEqual(search_dict['size'], 10)
+        self.assertNotIn('from', search_dict)
+        self.assertNotIn('search_after', search_dict)
+
+    def test_add_search_pagination_cursor(self):
+        """Test that a cursor continues its point in time after the last
+            hit of the previous page"""
+        query = XSEQueries('test', 'test')
+
+        with patch.object(query.client, 'open_point_in_time') as open_pit:
+            query.add_search_pagination(
+                5, 10, cursor=encode_cursor('pitId', [2.0, 7]))
+
+            open_pit.assert_not_called()
+
+        search_dict = query.search.to_dict()
+
+        self.assertEqual(search_dict['pit']['id'], 'pitId')
+        self.assertEqual(search_dict['search_after'], [2.0, 7])
+        self.assertEqual(search_dict['sort'], ['_score',
+                                               {'_shard_doc': 'asc'}])
+        self.assertNotIn('from', search_dict)
+
+    def test_get_results_next_cursor(self):
+        """Test that cursor searches return the cursor of the next page
+            until a page comes back short"""
+        query = XSEQueries('test', 'test')
+        query.add_search_pagination(
+            1, 2, cursor=encode_cursor('pitId', [3.0, 1]))
+
+        def response(hit_count):
+            hits = [{"_index": "test", "_id": str(num), "_source": {},
+                     "sort": [1.0, num]} for num in range(hit_count)]
+            return Response(query.search, {
+                "pit_id": "newPitId",
+                "hits": {"total": {"value": 3}, "hits": hits}
+            })
+
+        result = json.loads(query.get_results(response(2)))
+        self.assertEqual(decode_cursor(result['cursor']),
+                         ('newPitId', [1.0, 1]))
+
+        result = json.loads(query.get_results(response(1)))
+        self.assertIsNone(result['cursor'])
+
+    def test_search_by_keyword_results_cursor_not_cached(self):
+        """Test that cursor searches skip the result cache"""
+        with patch('es_api.utils.queries.XSEQueries.search_by_keyword'), \
+                patch('es_api.utils.queries.XSEQueries.get_results') \
+                as get_results, \
+                patch('es_api.utils.queries.get_or_set_results') \
+                as get_or_set_results:
+            get_results.return_value = '{}'
+
+            XSEQueries('test', 'test').search_by_keyword_results(
+                'python', {'page': '1', 'cursor': ''})
+
+            get_or_set_results.assert_not_called()
+
+
+@tag('unit')
+class SourceFilteringTests(TestCase):
+
+    def test_add_source_filtering_configured(self):
+        """Test that hits are limited to the configured source fields when
+            no fields are requested"""
+        query = XSEQueries('test', 'test')
+
+        with patch('es_api.utils.queries.get_config_snapshot') as snapshot:
+            snapshot.return_value.source_fields = ('Course.CourseTitle',
+                                                   'Course.Duration')
+            query.add_source_filtering()
+
+        self.assertEqual(query.search.to_dict()['_source'],
+                         {'includes': ['Course.CourseTitle',
+                                       'Course.Duration']})
+
+    def test_add_source_filtering_requested(self):
+        """Test that requested fields replace the configured source
+            fields"""
+        query = XSEQueries('test', 'test')
+
+        with patch('es_api.utils.queries.get_config_snapshot') as snapshot:
+            snapshot.return_value.source_fields = ('Course.CourseTitle',)
+            query.add_source_filtering(['Course.CourseCode'])
+
+        self.assertEqual(query.search.to_dict()['_source'],
+                         {'includes': ['Course.CourseCode']})
+
+    def test_add_source_filtering_unconfigured(self):
+        """Test that the whole source is returned when nothing is
+            configured"""
+        query = XSEQueries('test', 'test')
+
+        with patch('es_api.utils.queries.get_config_snapshot') as snapshot:
+            snapshot.return_value.source_fields = ()
+            query.add_source_filtering()
+
+        self.assertNotIn('_source', query.search.to_dict())
+
+    def test_search_by_keyword_fields_not_filtered(self):
+        """Test that the requested fields are not added as a filter"""
+        query = XSEQueries('test', 'test')
+        query.add_search_filters({'page': '1', 'fields': ['Course.Title'],
+                                  'Course.Provider': ['DAU']})
+
+        self.assertEqual(query.search.to_dict()['query'], {
+            'bool': {'filter': [
+                {'terms': {'Course.Provider.keyword': ['DAU']}}]}})
+
+
+@tag('unit')
+class AsyncQueriesTests(TestCase):
+
+    def setUp(self):
+        self.config = XDSConfiguration(target_xse_host='test',
+                                       target_xse_index='test')
+        self.config.save()
+
+    async def asyncTearDown(self):
+        await close_async_clients()
+
+    async def test_in_thread(self):
+        """Test that in_thread runs functions outside of the thread the sync
+            views run in"""
+        sync_thread = await sync_to_async(threading.get_ident)()
+
+        self.assertNotEqual(await in_thread(threading.get_ident)(),
+                            sync_thread)
+
+    async def test_in_request_thread(self):
+        """Test that in_request_thread runs functions in the thread of the
+            request, which sees the rows of the test transaction"""
+        sync_thread = await sync_to_async(threading.get_ident)()
+
+        self.assertEqual(await in_request_thread(threading.get_ident)(),
+                         sync_thread)
+        self.assertEqual(await in_request_thread(
+            XDSConfiguration.objects.count)(), 1)
+
+    async def test_get_async_client_reused(self):
+        """Test that the async client is only rebuilt when the host
+            changes"""
+        client = get_async_client('http://es:9200')
+
+        self.assertIs(client, get_async_client('http://es:9200'))
+        self.assertIsNot(client, get_async_client('http://other:9200'))
+
+    async def test_aexecute(self):
+        """Test that aexecute sends the built search through the async
+            client and wraps the raw response"""
+        query = AsyncXSEQueries('test', 'test')
+        query.search = query.search.query('match', title='python')[0:5]
+
+        with patch.object(query.async_client, 'search',
+                          new_callable=AsyncMock) as es_search:
+            es_search.return_value = {
+                "hits": {"total": {"value": 1}, "hits": [
+                    {"_index": "test", "_id": "1", "_source": {"a": 1}}]}}
+            response = await query.aexecute()
+
+            es_search.assert_awaited_once_with(
+                index=['test'], body=query.search.to_dict())
+
+        self.assertEqual(response.hits.total.value, 1)
+        self.assertEqual(response[0].a, 1)
+
+    async def test_asearch_by_keyword_new_cursor(self):
+        """Test that a new cursor search opens its point in time on the
+            async client"""
+        query = AsyncXSEQueries('test', 'test')
+
+        with patch.object(query.async_client, 'open_point_in_time',
+                          new_callable=AsyncMock) as open_pit, \
+                patch.object(query.client, 'open_point_in_time') \
+                as sync_open_pit, \
+                patch.object(AsyncXSEQueries, 'aexecute') as aexecute:
+            open_pit.return_value = {'id': 'pitId'}
+            await query.asearch_by_keyword('python', {'page': '1',
+                                                      'cursor': ''})
+
+            sync_open_pit.assert_not_called()
+            aexecute.assert_awaited_once()
+
+        self.assertEqual(query.search.to_dict()['pit']['id'], 'pitId')
+
+    async def test_asearch_by_keyword_results_cached(self):
+        """Test that identical async keyword searches share the result
+            cache"""
+        with patch.object(AsyncXSEQueries, 'asearch_by_keyword') \
+                as asearch_by_keyword, \
+                patch.object(AsyncXSEQueries, 'aget_results') \
+                as aget_results:
+            aget_results.return_value = '{"hits": []}'
+
+            for _ in range(2):
+                results = await AsyncXSEQueries(
+                    'test', 'test').asearch_by_keyword_results(
+                        'Python', {'page': '1'})
+
+            self.assertEqual(results, '{"hits": []}')
+            self.assertEqual(asearch_by_keyword.await_count, 1)
+
+    @override_settings(XSE_SINGLE_FLIGHT_SHARED=True)
+    async def test_aexecute_raw_shared(self):
+        """Test that aexecute sends raw searches through the raw async
+            client and shares their text with the other workers"""
+        body = json.dumps({"hits": {"total": {"value": 0}, "hits": []}})
+        raw_client = Mock(search=AsyncMock(return_value=RawResponse(body)))
+
+        with patch('es_api.utils.async_queries.get_async_client') \
+                as get_client:
+            get_client.return_value = raw_client
+            query = AsyncXSEQueries('test', 'test', raw=True)
+            query.search = query.search.query('match', title='python')
+            response = await query.aexecute()
+
+        get_client.assert_called_with('test', alias='raw',
+                                      serializer=RAW_SERIALIZER)
+        self.assertIsInstance(response, RawResponse)
+        self.assertEqual(await caches[RESULT_CACHE].aget(
+            query.get_search_key() + ':result'), body)
+
+
+@tag('unit')
+class SearchBundleTests(TestCase):
+
+    def setUp(self):
+        self.config = XDSConfiguration(target_xse_host='test',
+                                       target_xse_index='test')
+        self.config.save()
+        Organization(name='orgName', filter='orgFilter').save()
+
+    def msearch(self, multi_search, raise_on_error=True):
+        """Stubs MultiSearch.execute, failing the searches for the index
+            'broken' and answering the others with one hit"""
+        responses = []
+
+        for search in multi_search._searches:
+            if search._index == ['broken']:
+                responses.append(None)
+                continue
+            responses.append(Response(search, {
+                "hits": {"total": {"value": 1}, "hits": [
+                    {"_index": "test", "_id": "1", "_source": {"a": 1}}]},
+                "suggest": {"autocomplete_suggestion": [{"text": "py"}]}
+            }))
+
+        return responses
+
+    def test_execute(self):
+        """Test that every section is sent in one _msearch and formatted
+            under its name"""
+        bundle = SearchBundle('test', 'test')
+        bundle.add('search', lambda queries: queries.build_search_by_keyword(
+            keyword='python', filters={'page': '1'}), format_hits)
+        bundle.add('suggestions',
+                   lambda queries: queries.build_suggest('py'),
+                   format_suggestions)
+
+        with patch('es_api.utils.bundle.MultiSearch.execute',
+                   autospec=True) as execute:
+            execute.side_effect = self.msearch
+            results = bundle.execute()
+
+            self.assertEqual(execute.call_count, 1)
+            self.assertEqual(len(execute.call_args[0][0]._searches), 2)
+
+        self.assertEqual(results['search']['total'], 1)
+        self.assertEqual(results['search']['hits'][0]['a'], 1)
+        self.assertEqual(results['suggestions'], [{"text": "py"}])
+
+    def test_execute_section_errors(self):
+        """Test that a section failing to build or in Elasticsearch does
+            not fail the others"""
+        def broken(queries):
+            queries.search = queries.search.index().index('broken')
+
+        def unbuildable(queries):
+            raise ValueError("Invalid cursor")
+
+        bundle = SearchBundle('test', 'test')
+        bundle.add('more_like_this', lambda queries: queries
+                   .build_more_like_this(doc_id='1'), format_hits)
+        bundle.add('broken', broken, format_hits)
+        bundle.add('unbuildable', unbuildable, format_hits)
+
+        with patch('es_api.utils.bundle.MultiSearch.execute',
+                   autospec=True) as execute:
+            execute.side_effect = self.msearch
+            results = bundle.execute()
+
+        self.assertEqual(results['more_like_this']['total'], 1)
+        self.assertEqual(results['broken'], SECTION_ERROR)
+        self.assertEqual(results['unbuildable'], SECTION_ERROR)
+
+    def test_spotlight_section(self):
+        """Test that the spotlight section returns the courses of the active
+            spotlights in their order"""
+        CourseSpotlight(course_id='2').save()
+        CourseSpotlight(course_id='1').save()
+        CourseSpotlight(course_id='3', active=False).save()
+
+        query = XSEQueries('test', 'test')
+        query.build_spotlight_courses()
+
+        self.assertEqual(query.search.to_dict()['query'],
+                         {'ids': {'values': ['2', '1']}})
+
+        response = Response(query.search, {"hits": {
+            "total": {"value": 2},
+            "hits": [{"_index": "test", "_id": "1", "_source": {"a": 1}},
+                     {"_index": "test", "_id": "2", "_source": {"a": 2}}]}})
+
+        self.assertEqual(format_spotlight(query, response), [
+            {"a": 2, "meta": {"id": "2", "index": "test"}},
+            {"a": 1, "meta": {"id": "1", "index": "test"}}])
+
+
+@tag('unit')
+class SingleFlightTests(TestCase):
+
+    def run_concurrently(self, flight, fn, callers):
+        """Calls flight.do from several threads while the first call is
+            blocked and returns the results or errors of every call"""
+        release = threading.Event()
+        outcomes = []
+
+        def blocked_fn():
+            release.wait(5)
+            return fn()
+
+        def call():
+            try:
+                outcomes.append(flight.do('key', blocked_fn))
+            except Exception as err:
+                outcomes.append(err)
+
+        threads = [threading.Thread(target=call) for _ in range(callers)]
+        for thread in threads:
+            thread.start()
+
+        # waits for every caller to join the execution in flight
+        deadline = time.monotonic() + 5
+        while flight.get_stats()['collapsed'] < callers - 1 and \
+                time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        return outcomes
+
+    def test_do_collapses_concurrent_calls(self):
+        """Test that concurrent calls with the same key run the function
+            once and share its result"""
+        flight = SingleFlight()
+        fn = Mock(return_value={'hits': []})
+
+        outcomes = self.run_concurrently(flight, fn, 5)
+
+        self.assertEqual(fn.call_count, 1)
+        self.assertEqual(outcomes, [{'hits': []}] * 5)
+        self.assertEqual(flight.get_stats(), {'executed': 1, 'collapsed': 4,
+                                              'shared': 0, 'in_flight': 0})
+
+    def test_do_shares_errors(self):
+        """Test that the callers waiting on a failed execution get its
+            error and that the next call runs again"""
+        flight = SingleFlight()
+        fn = Mock(side_effect=ValueError('failed'))
+
+        outcomes = self.run_concurrently(flight, fn, 3)
+
+        self.assertEqual(fn.call_count, 1)
+        self.assertTrue(all(isinstance(outcome, ValueError)
+                            for outcome in outcomes))
+
+        self.assertEqual(flight.do('key', lambda: 'done'), 'done')
+
+    def test_ado_collapses_concurrent_calls(self):
+        """Test that concurrent coroutines with the same key run the
+            function once and share its result"""
+        flight = SingleFlight()
+        calls = []
+
+        async def fn():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return 'result'
+
+        async def run():
+            return await asyncio.gather(
+                *(flight.ado('key', fn) for _ in range(4)))
+
+        self.assertEqual(asyncio.run(run()), ['result'] * 4)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flight.get_stats()['collapsed'], 3)
+
+    def test_ado_leader_cancelled(self):
+        """Test that cancelling the first caller leaves the execution
+            running for the others"""
+        flight = SingleFlight()
+
+        async def fn():
+            await asyncio.sleep(0.05)
+            return 'result'
+
+        async def run():
+            leader = asyncio.ensure_future(flight.ado('key', fn))
+            await asyncio.sleep(0)
+            follower = asyncio.ensure_future(flight.ado('key', fn))
+            await asyncio.sleep(0.01)
+            leader.cancel()
+
+            return await follower, leader.cancelled()
+
+        self.assertEqual(asyncio.run(run()), ('result', True))
+        self.assertEqual(flight.get_stats()['executed'], 1)
+        self.assertEqual(flight.get_stats()['in_flight'], 0)
+
+    def test_do_shared_backoff(self):
+        """Test that a worker waiting on another one reads the cache once
+            per check, backing off between the checks"""
+        flight = SingleFlight()
+        cache = caches[RESULT_CACHE]
+        fn = Mock(return_value='own')
+
+        cache.add('slow-key:lock', True)
+        clock = [0]
+        intervals = []
+
+        def sleep(seconds):
+            intervals.append(seconds)
+            clock[0] += seconds
+
+        with patch('es_api.utils.single_flight.time') as fake_time, \
+                patch.object(cache, 'get_many', wraps=cache.get_many) \
+                as get_many:
+            fake_time.monotonic.side_effect = lambda: clock[0]
+            fake_time.sleep.side_effect = sleep
+            result = flight.do_shared('slow-key', fn, encode=None,
+                                      decode=None, timeout=5)
+
+        self.assertEqual(result, 'own')
+        self.assertEqual(intervals[:6], [0.05, 0.1, 0.2, 0.4, 0.8, 1.0])
+        self.assertAlmostEqual(sum(intervals), 5)
+        # one read of the result and the lock per check
+        self.assertEqual(get_many.call_count, len(intervals))
+        self.assertLessEqual(get_many.call_count, 10)
+
+    def test_do_shared_other_worker(self):
+        """Test that a search running on another worker is waited on and
+            its shared result decoded"""
+        flight = SingleFlight()
+        cache = caches[RESULT_CACHE]
+        fn = Mock()
+
+        cache.add('shared-key:lock', True)
+        cache.set('shared-key:result', {'raw': 1})
+
+        result = flight.do_shared('shared-key', fn, encode=dict,
+                                  decode=lambda raw: ('decoded', raw),
+                                  timeout=1)
+
+        fn.assert_not_called()
+        self.assertEqual(result, ('decoded', {'raw': 1}))
+        self.assertEqual(flight.get_stats()['shared'], 1)
+
+    def test_do_shared_leader(self):
+        """Test that the worker taking the lock runs the function, shares
+            its encoded result and releases the lock"""
+        flight = SingleFlight()
+        cache = caches[RESULT_CACHE]
+
+        result = flight.do_shared('leader-key', lambda: 'result',
+                                  encode=lambda result: {'raw': result},
+                                  decode=None, timeout=1)
+
+        self.assertEqual(result, 'result')
+        self.assertEqual(cache.get('leader-key:result'), {'raw': 'result'})
+        self.assertIsNone(cache.get('leader-key:lock'))
+
+    async def test_ado_shared_other_worker(self):
+        """Test that a coroutine waits on a search running on another
+            worker and decodes its shared result"""
+        flight = SingleFlight()
+        cache = caches[RESULT_CACHE]
+        fn = AsyncMock()
+
+        await cache.aadd('async-shared-key:lock', True)
+        await cache.aset('async-shared-key:result', {'raw': 1})
+
+        result = await flight.ado_shared(
+            'async-shared-key', fn, encode=dict,
+            decode=lambda raw: ('decoded', raw), timeout=1)
+
+        fn.assert_not_awaited()
+        self.assertEqual(result, ('decoded', {'raw': 1}))
+        self.assertEqual(flight.get_stats()['shared'], 1)
+
+    async def test_ado_shared_leader(self):
+        """Test that the coroutine taking the lock runs the function, shares
+            its encoded result and releases the lock"""
+        flight = SingleFlight()
+        cache = caches[RESULT_CACHE]
+
+        async def fn():
+            return 'result'
+
+        result = await flight.ado_shared(
+            'async-leader-key', fn, encode=lambda result: {'raw': result},
+            decode=None, timeout=1)
+
+        self.assertEqual(result, 'result')
+        self.assertEqual(await cache.aget('async-leader-key:result'),
+                         {'raw': 'result'})
+        self.assertIsNone(await cache.aget('async-leader-key:lock'))
+
+    def test_execute_search_key(self):
+        """Test that identical searches share a key and differently scoped
+            ones do not"""
+        first, second = XSEQueries('test', 'test'), XSEQueries('test', 'test')
+        first.search = first.search.query('match', title='python')
+        second.search = second.search.query('match', title='python')
+
+        self.assertEqual(first.get_search_key(), second.get_search_key())
+
+        second.search = second.search.filter('terms', filter=['org'])
+
+        self.assertNotEqual(first.get_search_key(), second.get_search_key())
+
+
+@tag('unit')
+class RawResultsTests(TestCase):
+
+    def setUp(self):
+        self.body = {
+            "took": 2,
+            "pit_id": "newPitId",
+            "hits": {
+                "total": {"value": 12, "relation": "eq"},
+                "hits": [{
+                    "_index": "test",
+                    "_type": "_doc",
+                    "_id": str(num),
+                    "_score": 1.5,
+                    "_source": {"Course": {"CourseTitle": f"Course \"{num}\"",
+                                           "Tags": ["a", {"b": [1, 2]}]}},
+                    "sort": [1.5, num]
+                } for num in range(2)] + [{
+                    "_index": "test",
+                    "_id": "2",
+                    "_score": None,
+                    "_source": {},
+                    "sort": [1.0, 2]
+                }]
+            },
+            "aggregations": {
+                "Course Type": {"buckets": [{"key": "Online",
+                                             "doc_count": 3}]}
+            }
+        }
+
+    def assert_same_results(self, query, body_text):
+        parsed = query.get_results(Response(query.search,
+                                            json.loads(body_text)))
+        raw = query.get_results(RawResponse(body_text))
+
+        self.assertEqual(json.loads(raw), json.loads(parsed))
+
+    def test_get_results_raw(self):
+        """Test that a RawResponse is formatted like the parsed response,
+            whatever its whitespace"""
+        query = XSEQueries('test', 'test')
+        query.aggregation_fields = {'Course Type': 'Course.CourseType'}
+
+        self.assert_same_results(query, json.dumps(self.body))
+        self.assert_same_results(query, json.dumps(self.body, indent=2))
+
+    def test_get_results_raw_cursor(self):
+        """Test that the next cursor of a RawResponse continues from its last
+            hit in the point in time it returned"""
+        query = XSEQueries('test', 'test')
+        query.aggregation_fields = {'Course Type': 'Course.CourseType'}
+        query.pit_id = 'pitId'
+        query.page_size = 3
+
+        self.assert_same_results(query, json.dumps(self.body))
+
+        cursor = json.loads(query.get_results(
+            RawResponse(json.dumps(self.body))))['cursor']
+
+        self.assertEqual(decode_cursor(cursor), ('newPitId', [1.0, 2]))
+
+    def test_raw_response_mapping(self):
+        """Test that a RawResponse keeps its text and is only parsed when it
+            is read as a mapping"""
+        raw_response = RawResponse(json.dumps(self.body))
+
+        self.assertIsNone(raw_response._parsed)
+        self.assertEqual(raw_response['took'], 2)
+        self.assertEqual(len(raw_response), len(self.body))
+        self.assertEqual(dict(raw_response), self.body)
+
+    def test_execute_raw(self):
+        """Test that raw searches are sent through the raw client and hand
+            back the text of the response"""
+        body = {"hits": {"total": {"value": 0, "relation": "eq"},
+                         "hits": []}}
+
+        try:
+            with stub_elasticsearch(body) as host:
+                query = XSEQueries(host, 'test', raw=True)
+                query.search = query.search.query('match', title='python')
+                response = query.execute()
+
+                self.assertIs(get_client(host, alias='raw',
+                                         serializer=RAW_SERIALIZER).transport
+                              .serializer, RAW_SERIALIZER)
+        finally:
+            reset_clients()
+
+        self.assertIsInstance(response, RawResponse)
+        self.assertEqual(json.loads(query.get_results(response)),
+                         {"hits": [], "total": 0, "aggregations": {}})
+
+
+@tag('unit')
+class SearchFacetsTests(TestCase):
+
+    def setUp(self):
+        config = XDSConfiguration(target_xse_host='test',
+                                  target_xse_index='test')
+        config.save()
+        ui_config = XDSUIConfiguration(xds_configuration=config)
+        ui_config.save()
+        SearchFilter(display_name='Type', field_name='Course.Type',
+                     xds_ui_configuration=ui_config).save()
+        self.provider = SearchFilter(display_name='Provider',
+                                     field_name='Course.Provider', size=2,
+                                     shard_size=50,
+                                     xds_ui_configuration=ui_config)
+        self.provider.save()
+
+    def buckets_response(self, query, values):
+        return Response(query.search, {
+            "hits": {"total": {"value": 5}, "hits": []},
+            "aggregations": {"Provider": {
+                "after_key": {"Course.Provider": values[-1]},
+                "buckets": [{"key": {"Course.Provider": value},
+                             "doc_count": 1} for value in values]}}
+        })
+
+    def test_add_search_aggregations_sizes(self):
+        """Test that the filter aggregations are sized as configured"""
+        query = XSEQueries('test', 'test')
+        query.build_search_facets('python')
+
+        aggs = query.search.to_dict()['aggs']
+
+        self.assertEqual(aggs['Type']['terms'], {
+            'field': 'Course.Type.keyword', 'size': 10})
+        self.assertEqual(aggs['Provider']['terms'], {
+            'field': 'Course.Provider.keyword', 'size': 2, 'shard_size': 50})
+
+    def test_build_facet_buckets(self):
+        """Test that the buckets search pages through the values of the
+            filter with a composite aggregation"""
+        query = XSEQueries('test', 'test')
+        query.build_facet_buckets(self.provider, 'python',
+                                  {'Course.Type': ['Online']}, after='b')
+
+        search_dict = query.search.to_dict()
+
+        self.assertEqual(search_dict['size'], 0)
+        self.assertEqual(list(search_dict['aggs']), ['Provider'])
+        self.assertEqual(search_dict['aggs']['Provider']['composite'], {
+            'size': 2,
+            'sources': [{'Course.Provider': {
+                'terms': {'field': 'Course.Provider.keyword'}}}],
+            'after': {'Course.Provider': 'b'}})
+        self.assertEqual(search_dict['query']['bool']['filter'], [
+            {'terms': {'Course.Type.keyword': ['Online']}}])
+        self.assertEqual(query.search._params, {'request_cache': True})
+
+    def test_get_facet_buckets_results(self):
+        """Test that the buckets results point to the next values until a
+            page comes back short"""
+        query = XSEQueries('test', 'test')
+
+        full_page = json.loads(query.get_facet_buckets_results(
+            self.provider, self.buckets_response(query, ['a', 'b'])))
+        last_page = json.loads(query.get_facet_buckets_results(
+            self.provider, self.buckets_response(query, ['c'])))
+
+        self.assertEqual(full_page, {
+            "field_name": "Course.Provider",
+            "buckets": [{"key": "a", "doc_count": 1},
+                        {"key": "b", "doc_count": 1}],
+            "after": "b"})
+        self.assertIsNone(last_page['after'])
+
+    def test_build_search_facets(self):
+        """Test that the facets search only asks for the aggregations and
+            lets Elasticsearch cache them"""
+        query = XSEQueries('test', 'test')
+        query.build_search_facets('python', {'Course.Type': ['Online']})
+
+        search_dict = query.search.to_dict()
+
+        self.assertEqual(search_dict['size'], 0)
+        self.assertIn('Type', search_dict['aggs'])
+        self.assertEqual(search_dict['query']['bool']['filter'], [
+            {'terms': {'Course.Type.keyword': ['Online']}}])
+        self.assertNotIn('_source', search_dict)
+        self.assertEqual(query.search._params, {'request_cache': True})
+
+    def test_build_search_by_keyword_without_facets(self):
+        """Test that keyword searches only skip the aggregations when asked
+            to"""
+        query = XSEQueries('test', 'test')
+        query.build_search_by_keyword('python', {'page': '1'})
+
+        self.assertIn('aggs', query.search.to_dict())
+
+        query = XSEQueries('test', 'test')
+        query.build_search_by_keyword('python', {'page': '1',
+                                                 'facets': False})
+
+        self.assertNotIn('aggs', query.search.to_dict())
+
+    def test_search_facets_results_cached_across_pages(self):
+        """Test that the facets of every page and sort of a search are
+            computed once"""
+        query = XSEQueries('test', 'test')
+
+        with patch('es_api.utils.queries.XSEQueries.search_facets') \
+                as search_facets:
+            search_facets.return_value = Response(query.search, {
+                "hits": {"total": {"value": 3}, "hits": []},
+                "aggregations": {"Type": {"buckets": [
+                    {"key": "Online", "doc_count": 3}]}}
+            })
+
+            result = XSEQueries('test', 'test').search_facets_results(
+                'python', {'page': '1'})
+            other_page = XSEQueries('test', 'test').search_facets_results(
+                'Python', {'page': '5', 'sort': 'Course.Title'})
+            other_filters = XSEQueries('test', 'test').search_facets_results(
+                'python', {'Course.Type': ['Online']})
+
+            self.assertEqual(search_facets.call_count, 2)
+
+        self.assertEqual(result, other_page)
+        self.assertEqual(other_filters, result)
+        self.assertEqual(json.loads(result), {
+            "total": 3,
+            "aggregations": {"Type": {
+                "buckets": [{"key": "Online", "doc_count": 3}],
+                "field_name": "Course.Type"}}
+        })
+
+
+@tag('unit')
+class SuggestionIndexTests(TestCase):
+
+    def setUp(self):
+        self.index = SuggestionIndex()
+        self.index.load('test', [
+            ('Python Basics', '1', ('orgA',), 1),
+            ('python advanced', '2', ('orgA', 'orgB'), 1),
+            ('Pythonic Code', '2', ('orgA',), 1),
+            ('Java', '3', ('orgA',), 1),
+            ('Pyramids', '4', ('orgB',), 1),
+        ], {'1': {'Course': {'CourseTitle': 'Python Basics'}}})
+        # keeps the loaded entries instead of the published ones
+        self.index.checked = time.monotonic()
+
+    def option_texts(self, results):
+        return [option['text'] for option in results[0]['options']]
+
+    def test_completion_inputs(self):
+        """Test that the inputs of every form of completion value are read
+            with their contexts"""
+        value = ['Plain', {'input': ['A', 'B'], 'contexts': {'filter': 'x'},
+                           'weight': 5},
+                 {'input': 'C'}]
+
+        self.assertEqual(list(completion_inputs(value, ['y'])), [
+            ('Plain', ('y',), 1), ('A', ('x',), 5), ('B', ('x',), 5),
+            ('C', ('y',), 1)])
+        self.assertEqual(list(completion_inputs(None)), [])
+
+    def test_lookup(self):
+        """Test that lookups return one suggestion per document of the
+            contexts starting with the partial, whatever its case"""
+        results = self.index.lookup('PYTH', ['orgA'], 'test')
+
+        self.assertEqual(results[0]['text'], 'PYTH')
+        self.assertEqual(results[0]['length'], 4)
+        self.assertEqual(self.option_texts(results),
+                         ['python advanced', 'Python Basics'])
+        self.assertEqual(results[0]['options'][0]['_id'], '2')
+        self.assertEqual(results[0]['options'][1], {
+            'text': 'Python Basics', '_index': 'test', '_type': '_doc',
+            '_id': '1', '_score': 1.0,
+            '_source': {'Course': {'CourseTitle': 'Python Basics'}},
+            'contexts': {'filter': ['orgA']}})
+        self.assertEqual(
+            self.option_texts(self.index.lookup('py', ['orgB'], 'test')),
+            ['Pyramids', 'python advanced'])
+        self.assertEqual(
+            len(self.index.lookup('py', ['orgA', 'orgB'], 'test', size=2)[0]
+                ['options']), 2)
+
+    def test_lookup_ranked(self):
+        """Test that lookups rank the suggestions by the weight of their
+            best input, like the completion suggester"""
+        self.index.load('test', [
+            ('Python Basics', '1', ('orgA',), 1),
+            ('Python for Data', '2', ('orgA',), 10),
+            ('Pythonic Code', '1', ('orgA',), 3),
+            ('Pyramids', '3', ('orgA',), 2),
+        ])
+
+        results = self.index.lookup('py', ['orgA'], 'test')
+
+        self.assertEqual(self.option_texts(results),
+                         ['Python for Data', 'Pythonic Code', 'Pyramids'])
+        self.assertEqual([option['_score'] for option in
+                          results[0]['options']], [10.0, 3.0, 2.0])
+
+    def test_lookup_miss(self):
+        """Test that lookups without matches are left to Elasticsearch and
+            counted in the hit rate"""
+        self.assertIsNone(self.index.lookup('pyhton', ['orgA'], 'test'))
+        self.assertIsNone(self.index.lookup('java', ['orgC'], 'test'))
+        # entries read from another index
+        self.assertIsNone(self.index.lookup('java', ['orgA'], 'other'))
+        self.index.lookup('java', ['orgA'], 'test')
+
+        stats = self.index.get_stats()
+
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 3)
+        self.assertAlmostEqual(stats['hit_rate'], 1 / 4)
+        self.assertEqual(stats['entries'], 5)
+        self.assertEqual(stats['contexts'], 2)
+
+    def test_refresh_published(self):
+        """Test that workers load the entries published by the refresh
+            command"""
+        version = publish_suggestion_entries(
+            'test', [('Go', '9', ('orgA',), 1)], {'9': {'title': 'Go'}})
+        self.index.checked = None
+
+        results = self.index.lookup('g', ['orgA'], 'test')
+
+        self.assertEqual(self.index.version, version)
+        self.assertEqual(self.option_texts(results), ['Go'])
+        self.assertEqual(results[0]['options'][0]['_source'],
+                         {'title': 'Go'})
+
+    def test_publish_chunks(self):
+        """Test that the entries are published in chunks holding the sources
+            of their documents, the chunks of the previous publication being
+            dropped"""
+        entries = [('Go', '1', ('orgA',), 1), ('Gin', '1', ('orgA',), 1),
+                   ('Git', '2', ('orgA',), 1)]
+        sources = {'1': {'title': 'Go'}, '2': {'title': 'Git'}}
+
+        with patch('es_api.utils.suggestion_index.SUGGESTION_CHUNK_SIZE', 2):
+            first = publish_suggestion_entries('test', entries, sources)
+            second = publish_suggestion_entries('test', entries, sources)
+
+        self.assertEqual(cache.get(f'{SUGGESTION_INDEX_KEY}:{second}:1'),
+                         {'entries': [('Git', '2', ('orgA',), 1)],
+                          'sources': {'2': {'title': 'Git'}}})
+        self.assertIsNone(cache.get(f'{SUGGESTION_INDEX_KEY}:{first}:0'))
+        self.index.checked = None
+
+        results = self.index.lookup('gi', ['orgA'], 'test')
+
+        self.assertEqual(self.index.version, second)
+        self.assertEqual(self.index.entry_count, 3)
+        self.assertEqual(self.option_texts(results), ['Gin', 'Git'])
+
+    def test_build_suggest_source(self):
+        """Test that the completion suggester returns the fields the UI
+            renders, the fields of the suggestion index"""
+        XDSConfiguration(target_xse_host='test',
+                         target_xse_index='test').save()
+        Organization(name='testOrg', filter='orgA').save()
+        query = XSEQueries('test', 'test')
+        query.build_suggest('py')
+
+        self.assertEqual(query.search.to_dict()['_source'],
+                         {'includes': list(
+                             get_config_snapshot().source_fields)})
+
+    def test_refresh_other_index(self):
+        """Test that workers ignore entries published for another index"""
+        publish_suggestion_entries('other', [('Go', '9', ('orgA',), 1)], {})
+        self.index.checked = None
+
+        self.assertIsNone(self.index.lookup('g', ['orgA'], 'test'))
+        self.assertEqual(self.index.index, 'test')
+
+    def test_build_suggestion_entries(self):
+        """Test that the entries are read from the completion inputs with the
+            contexts at the path of the mapping"""
+        hits = Response(Search(), {"hits": {"hits": [{
+            "_id": "1",
+            "_source": {"autocomplete": ["Python"],
+                        "Course": {"Provider": "orgA", "Title": "Py"}}
+        }]}}).hits
+
+        with patch('es_api.utils.suggestion_index.get_context_path') \
+                as context_path, \
+                patch('es_api.utils.suggestion_index.Search.scan') as scan:
+            context_path.return_value = 'Course.Provider'
+            scan.return_value = iter(hits)
+
+            entries, sources = build_suggestion_entries(
+                'test', 'test', ['Course.Title'])
+
+        self.assertEqual(entries, [('Python', '1', ('orgA',), 1)])
+        self.assertEqual(sources, {'1': {'Course': {'Title': 'Py'}}})
+
+    def test_suggest_results_fallback(self):
+        """Test that suggest_results only asks Elasticsearch when the index
+            has no suggestion"""
+        Organization(name='testOrg', filter='orgA').save()
+        query = XSEQueries('test', 'test')
+
+        with patch('es_api.utils.queries.suggestion_index', self.index), \
+                patch('es_api.utils.queries.XSEQueries.suggest') as suggest:
+            suggest.return_value.suggest.to_dict.return_value = {
+                'autocomplete_suggestion': [{'text': 'pyhton'}]}
+
+            local = query.suggest_results('pyth')
+            fallback = query.suggest_results('pyhton')
+
+            suggest.assert_called_once_with('pyhton')
+
+        self.assertEqual(self.option_texts(local),
+                         ['python advanced', 'Python Basics'])
+        self.assertEqual(fallback, [{'text': 'pyhton'}])
+
+
+@tag('unit')
+class QueryCompilationTests(TestCase):
+
+    def setUp(self):
+        config = XDSConfiguration(target_xse_host='test',
+                                  target_xse_index='test')
+        config.save()
+        XDSUIConfiguration(xds_configuration=config).save()
+        Organization(name='testOrg', filter='orgA').save()
+
+    def test_build_search_by_filters_filter_context(self):
+        """Test that the course title of a filter search scores the hits
+            while the other fields and organizations are compiled into the
+            filter context"""
+        query = XSEQueries('test', 'test')
+        query.build_search_by_filters(1, {'Course.CourseTitle': 'data',
+                                          'Course.CourseProvider': 'edX'})
+
+        clauses = query.explain()['clauses']
+
+        self.assertEqual(clauses['scoring'], [
+            {'match': {'Course.CourseTitle': 'data'}}])
+        self.assertEqual(clauses['filter'], [
+            {'terms': {'filter': ['orgA']}},
+            {'match': {'Course.CourseProvider': 'edX'}}])
+
+    def test_explain_keyword_search(self):
+        """Test that the explain output splits the keyword query from the
+            organization and facet constraints"""
+        query = XSEQueries('test', 'test')
+        query.build_search_by_keyword('python', {
+            'page': '2', 'Course.Type': ['Online']})
+
+        explained = query.explain()
+
+        self.assertEqual(explained['index'], ['test'])
+        self.assertEqual(explained['body'], query.search.to_dict())
+        self.assertEqual(
+            [list(clause) for clause in explained['clauses']['scoring']],
+            [['multi_match']])
+        self.assertEqual(explained['clauses']['filter'], [
+            {'terms': {'filter': ['orgA']}},
+            {'terms': {'Course.Type.keyword': ['Online']}}])
+        self.assertEqual(explain_search(XSEQueries('test', 'test').search)
+                         ['clauses'],
+                         {'scoring': [], 'filter': [], 'must_not': []})
+
+
+@tag('unit')
+class RecommendationsTests(TestCase):
+
+    def setUp(self):
+        config = XDSConfiguration(target_xse_host='test',
+                                  target_xse_index='test')
+        config.save()
+        self.ui_config = XDSUIConfiguration(xds_configuration=config,
+                                            more_like_this_size=3,
+                                            similar_courses_size=2)
+        self.ui_config.save()
+
+    def test_recommendation_sizes(self):
+        """Test that the recommendation searches are sized as configured"""
+        query = XSEQueries('test', 'test')
+        query.build_more_like_this('1')
+
+        self.assertEqual(query.search.to_dict()['size'], 3)
+
+        query = XSEQueries('test', 'test')
+        query.build_similar_courses('python')
+
+        self.assertEqual(query.search.to_dict()['size'], 2)
+
+    def test_more_like_this_results_cached(self):
+        """Test that the courses like a document are fetched once until the
+            configuration changes"""
+        with patch('es_api.utils.queries.XSEQueries.more_like_this'), \
+                patch('es_api.utils.queries.XSEQueries.get_results') \
+                as get_results:
+            get_results.return_value = '{"hits": []}'
+
+            result = XSEQueries('test', 'test').more_like_this_results('1')
+            XSEQueries('test', 'test').more_like_this_results('1')
+            XSEQueries('test', 'test').more_like_this_results('2')
+
+            self.assertEqual(result, '{"hits": []}')
+            self.assertEqual(get_results.call_count, 2)
+
+            self.ui_config.more_like_this_size = 4
+            self.ui_config.save()
+            XSEQueries('test', 'test').more_like_this_results('1')
+
+            self.assertEqual(get_results.call_count, 3)
+
+    def test_similar_courses_results_org_scope(self):
+        """Test that similar courses are cached per keyword and organization
+            scope"""
+        with patch('es_api.utils.queries.XSEQueries.similar_courses'), \
+                patch('es_api.utils.queries.XSEQueries.get_results') \
+                as get_results:
+            get_results.return_value = '{"hits": []}'
+
+            XSEQueries('test', 'test').similar_courses_results('Python')
+            XSEQueries('test', 'test').similar_courses_results('python ')
+
+            self.assertEqual(get_results.call_count, 1)
+
+            Organization(name='testOrg', filter='orgA').save()
+            XSEQueries('test', 'test').similar_courses_results('python')
+
+            self.assertEqual(get_results.call_count, 2)
@@ -1,11 +1,20 @@
 import json
-from unittest.mock import patch
-
-from django.test import tag
+from unittest.mock import AsyncMock, patch
+
+from configurations.models import XDSConfiguration
+from core.models import SearchFilter
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection
+from django.test import RequestFactory, tag
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from es_api import async_views
+from es_api.utils.queries import InvalidCursorError
+from es_api.utils.stub_server import stub_elasticsearch
 from requests.exceptions import HTTPError
 from rest_framework import status
 from rest_framework.test import APITestCase
+from users.models import XDSUser
 
 from django.test import override_settings
 
@@ -18,6 +27,31 @@ class ViewTests(APITestCase):
         settings_manager.enable()
         self.addCleanup(settings_manager.disable)
 
+    def test_search_index_queries(self):
+        """Test that a keyword search served from the result cache only
+            reads the configuration version, organization filters and
+            results from the database"""
+        body = {"took": 1, "timed_out": False,
+                "hits": {"total": {"value": 0, "relation": "eq"},
+                         "hits": []}}
+
+        with stub_elasticsearch(body) as host:
+            XDSConfiguration(target_xis_metadata_api='test',
+                             target_xse_host=host,
+                             target_xse_index='test').save()
+            url = reverse('es_api:search-index') + '?keyword=python'
+            self.client.get(url)
+
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len([captured for captured in queries
+                              if 'xds_config_snapshot_version' in
+                              captured['sql']]), 1)
+        self.assertEqual(len(queries), 3, [captured['sql']
+                                           for captured in queries])
+
     def test_search_index_no_keyword(self):
         """
         Test that the /es-api/ endpoint sends an HTTP error when no
@@ -34,18 +68,153 @@ class ViewTests(APITestCase):
         """
         url = "%s?keyword=hello&p=1&sort=1" % (reverse('es_api:search-index'))
         with patch('es_api.views.XSEQueries') as query, \
-                patch('es_api.views.SearchFilter.objects') as sfObj, \
-                patch('es_api.views.XDSConfiguration.objects'):
-            sfObj.return_value = []
-            sfObj.filter.return_value = []
+                patch('es_api.views.get_config_snapshot') as snapshot:
+            snapshot.return_value.search_filters = []
             result_json = json.dumps({"test": "value"})
-            query.get_results.return_value = result_json
+            query.search_by_keyword_results.return_value = result_json
             query.return_value = query
             response = self.client.get(url)
             # print(response.content)
             self.assertEqual(response.status_code, status.HTTP_200_OK)
             self.assertEqual(json.loads(response.content), {'test': "value"})
 
+    def test_search_index_invalid_cursor(self):
+        """
+        Test that the /es-api/ endpoint returns an HTTP 400 error when the
+        cursor cannot be decoded
+        """
+        XDSConfiguration(target_xis_metadata_api='test',
+                         target_xse_host='http://localhost:9200',
+                         target_xse_index='test').save()
+        url = "%s?keyword=hello&cursor=not-a-cursor" % \
+            (reverse('es_api:search-index'))
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(json.loads(response.content),
+                         {"message": "Invalid cursor"})
+
+    def test_search_index_with_cursor(self):
+        """
+        Test that the /es-api/ endpoint passes the cursor and requested
+        fields on to the query
+        """
+        url = "%s?keyword=hello&cursor=abc&fields=a,b&fields=c" % \
+            (reverse('es_api:search-index'))
+        with patch('es_api.views.XSEQueries') as query, \
+                patch('es_api.views.get_config_snapshot') as snapshot:
+            snapshot.return_value.search_filters = []
+            query.search_by_keyword_results.return_value = '{}'
+            query.return_value = query
+            response = self.client.get(url)
+
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            query.search_by_keyword_results.assert_called_once_with(
+                keyword='hello', filters={'page': '1', 'cursor': 'abc',
+                                          'fields': ['a', 'b', 'c']})
+
+    def test_search_index_without_facets(self):
+        """
+        Test that the /es-api/ endpoint asks for a search without
+        aggregations when facets=false is sent
+        """
+        url = "%s?keyword=hello&facets=false" % \
+            (reverse('es_api:search-index'))
+        with patch('es_api.views.XSEQueries') as query, \
+                patch('es_api.views.get_config_snapshot') as snapshot:
+            snapshot.return_value.search_filters = []
+            query.search_by_keyword_results.return_value = '{}'
+            query.return_value = query
+            response = self.client.get(url)
+
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            query.search_by_keyword_results.assert_called_once_with(
+                keyword='hello', filters={'page': '1', 'facets': False})
+
+    def test_search_facets_no_keyword(self):
+        """
+        Test that the /es-api/facets/ endpoint sends an HTTP error when no
+        keyword is provided
+        """
+        url = reverse('es_api:search-facets')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_search_facets_with_keyword(self):
+        """
+        Test that the /es-api/facets/ endpoint returns the facets of the
+        keyword and configured filters, ignoring the paging parameters
+        """
+        url = "%s?keyword=hello&p=3&Course.Type=Online" % \
+            (reverse('es_api:search-facets'))
+        with patch('es_api.views.XSEQueries') as query, \
+                patch('es_api.views.get_config_snapshot') as snapshot:
+            snapshot.return_value.search_filters = [
+                SearchFilter(field_name='Course.Type')]
+            query.search_facets_results.return_value = '{"total": 1}'
+            query.return_value = query
+            response = self.client.get(url)
+
+            query.search_facets_results.assert_called_once_with(
+                keyword='hello', filters={'Course.Type': ['Online']})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content), {'total': 1})
+
+    def test_search_facets_exception(self):
+        """
+        Test that the /es-api/facets/ endpoint returns a server error when
+        the search fails
+        """
+        url = "%s?keyword=hello" % (reverse('es_api:search-facets'))
+        with patch('es_api.views.XSEQueries') as query, \
+                patch('es_api.views.get_config_snapshot') as snapshot:
+            snapshot.return_value.search_filters = []
+            query.search_facets_results.side_effect = HTTPError
+            query.return_value = query
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code,
+                         status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    def test_search_facet_buckets(self):
+        """
+        Test that the /es-api/facets/buckets/ endpoint loads the values of
+        the requested configured filter
+        """
+        provider = SearchFilter(field_name='Course.Provider')
+        url = "%s?keyword=hello&field=Course.Provider&after=b" % \
+            (reverse('es_api:search-facet-buckets'))
+        with patch('es_api.views.XSEQueries') as query, \
+                patch('es_api.views.get_config_snapshot') as snapshot:
+            snapshot.return_value.search_filters = [provider]
+            query.facet_buckets_results.return_value = '{"buckets": []}'
+            query.return_value = query
+            response = self.client.get(url)
+
+            query.facet_buckets_results.assert_called_once_with(
+                provider, keyword='hello', filters={}, after='b')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content), {'buckets': []})
+
+    def test_search_facet_buckets_bad_field(self):
+        """
+        Test that the /es-api/facets/buckets/ endpoint sends an HTTP error
+        when the field is missing or not a configured filter
+        """
+        url = reverse('es_api:search-facet-buckets')
+        with patch('es_api.views.XSEQueries') as query, \
+                patch('es_api.views.get_config_snapshot') as snapshot:
+            snapshot.return_value.search_filters = []
+            missing = self.client.get("%s?keyword=hello" % url)
+            unknown = self.client.get("%s?keyword=hello&field=a" % url)
+
+            query.assert_not_called()
+
+        self.assertEqual(missing.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(unknown.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_gmlt(self):
         """
         Test that the /es-api/more-like-this/{doc_id} endpoint returns code
@@ -54,7 +223,7 @@ class ViewTests(APITestCase):
         doc_id = 19
         url = reverse('es_api:get-more-like-this', args=(doc_id,))
         with patch('es_api.views.XSEQueries') as query, \
-                patch('es_api.views.XDSConfiguration.objects'):
+                patch('es_api.views.get_config_snapshot'):
             result_json = json.dumps({"test": "value"})
             query.get_results.return_value = result_json
             response = self.client.get(url)
@@ -69,7 +238,7 @@ class ViewTests(APITestCase):
         errorMsg = "error executing ElasticSearch query; please check the logs"
         url = reverse('es_api:get-more-like-this', args=(doc_id,))
         with patch('es_api.views.XSEQueries.more_like_this') as query, \
-                patch('es_api.views.XDSConfiguration.objects'):
+                patch('es_api.views.get_config_snapshot'):
             query.more_like_this.side_effect = [HTTPError]
             response = self.client.get(url)
             responseDict = json.loads(response.content)
@@ -86,7 +255,7 @@ class ViewTests(APITestCase):
         key = 'test'
         url = reverse('es_api:get-similar-courses', args=(key,))
         with patch('es_api.views.XSEQueries') as query, \
-                patch('es_api.views.XDSConfiguration.objects'):
+                patch('es_api.views.get_config_snapshot'):
             result_json = json.dumps({"test": "value"})
             query.get_results.return_value = result_json
             response = self.client.get(url)
@@ -97,28 +266,71 @@ class ViewTests(APITestCase):
         Test that the /es-api/filter-search? endpoint returns code
         200 when successful
         """
-        with patch('es_api.utils.queries.'
-                   'CourseInformationMapping.objects') as course_mapping:
+        with patch('es_api.views.get_config_snapshot') as snapshot:
+            course_mapping = snapshot.return_value.course_mapping
             course_mapping.course_title = "Course.CourseTitle"
             course_mapping.course_provider = "Course.CourseProviderName"
 
             url = "%s?Course.CourseTitle=hi" % (reverse('es_api:filters')) + \
                   "&Course.CourseProviderName=" \
                   "test&CourseInstance.CourseLevel=3&p=1"
-            with patch('es_api.views.XSEQueries') as query, \
-                    patch('es_api.views.XDSConfiguration.objects'):
+            with patch('es_api.views.XSEQueries') as query:
                 result_json = json.dumps({"test": "value"})
                 query.get_results.return_value = result_json
                 response = self.client.get(url)
                 self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_filters_cursor(self):
+        """
+        Test that the /es-api/filter-search? endpoint passes the cursor on to
+        the query
+        """
+        with patch('es_api.views.get_config_snapshot'):
+            url = "%s?cursor=abc" % (reverse('es_api:filters'))
+            with patch('es_api.views.XSEQueries') as query:
+                query.return_value = query
+                query.get_results.return_value = '{}'
+                response = self.client.get(url)
+
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                query.search_by_filters.assert_called_once_with(
+                    page_num=1, filters={}, cursor='abc', fields=None)
+
+    def test_filters_explain(self):
+        """
+        Test that the /es-api/filter-search? endpoint returns the compiled
+        search instead of running it when a staff user asks for it
+        """
+        admin = XDSUser.objects.create_superuser('admin@test.com',
+                                                 'test1234')
+        url = "%s?cursor=abc&explain=true" % (reverse('es_api:filters'))
+
+        with patch('es_api.views.get_config_snapshot'), \
+                patch('es_api.views.XSEQueries') as query:
+            query.return_value = query
+            query.explain.return_value = {'body': {}}
+            anonymous_response = self.client.get(url)
+
+            query.search_by_filters.assert_called_once()
+            query.build_search_by_filters.assert_not_called()
+
+            self.client.force_authenticate(user=admin)
+            response = self.client.get(url)
+
+            query.build_search_by_filters.assert_called_once_with(
+                1, filters={}, fields=None)
+            query.search_by_filters.assert_called_once()
+
+        self.assertEqual(anonymous_response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content), {'body': {}})
+
     def test_filters_exception(self):
         """
         Test that the /es-api/filter-search? endpoint returns a server error
         when an exception is raised
         """
-        with patch('es_api.utils.queries.'
-                   'CourseInformationMapping.objects'):
+        with patch('es_api.views.get_config_snapshot'):
             errorMsg = "error executing ElasticSearch query; " \
                        "Please contact " + \
                        "an administrator"
@@ -139,14 +351,14 @@ class ViewTests(APITestCase):
         """
         url = "%s?partial=hi" % (reverse('es_api:suggest'))
         with patch('es_api.views.XSEQueries') as query, \
-                patch('es_api.views.XDSConfiguration.objects'):
-            result_json = {"autocomplete_suggestion": "test"}
-            query.to_dict.return_value = result_json
-            query.suggest = query
-            query.suggest.return_value = query
+                patch('es_api.views.get_config_snapshot'):
+            query.return_value = query
+            query.suggest_results.return_value = "test"
 
             response = self.client.get(url)
 
+            query.suggest_results.assert_called_once_with(partial='hi')
+
             self.assertEqual(response.status_code, status.HTTP_200_OK)
             self.assertEqual(response.content, b'"test"')
 
@@ -174,6 +386,92 @@ class ViewTests(APITestCase):
         self.assertEqual(response.status_code,
                          status.HTTP_400_BAD_REQUEST)
 
+    def test_bundle_no_sections(self):
+        """
+        Test that the /es-api/bundle/ endpoint sends an HTTP error when no
+        section is requested
+        """
+        response = self.client.get(reverse('es_api:search-bundle'))
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bundle(self):
+        """
+        Test that the /es-api/bundle/ endpoint adds a section per parameter
+        and returns their results in one document
+        """
+        url = "%s?keyword=hi&partial=h&similar=key&more_like_this=1" \
+            "&spotlight=true" % reverse('es_api:search-bundle')
+        with patch('es_api.views.SearchBundle') as bundle, \
+                patch('es_api.views.get_config_snapshot') as snapshot:
+            snapshot.return_value.search_filters = []
+            bundle.return_value = bundle
+            bundle.execute.return_value = {"search": {"total": 0}}
+            response = self.client.get(url)
+
+            self.assertEqual([call[0][0] for call in
+                              bundle.add.call_args_list],
+                             ['search', 'suggestions', 'similar_courses',
+                              'more_like_this', 'spotlight_courses'])
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content),
+                         {"search": {"total": 0}})
+
+    def test_bundle_exception(self):
+        """
+        Test that the /es-api/bundle/ endpoint returns a server error when
+        the multi search fails
+        """
+        url = "%s?keyword=hi" % reverse('es_api:search-bundle')
+        with patch('es_api.views.SearchBundle') as bundle, \
+                patch('es_api.views.get_config_snapshot') as snapshot:
+            snapshot.return_value.search_filters = []
+            bundle.return_value = bundle
+            bundle.execute.side_effect = [HTTPError]
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code,
+                         status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    def test_stats_unauthenticated(self):
+        """
+        Test that the /es-api/stats/ endpoint is not open to anonymous users
+        """
+        url = reverse('es_api:stats')
+
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_stats(self):
+        """
+        Test that the /es-api/stats/ endpoint returns the connection pool
+        stats to an admin
+        """
+        url = reverse('es_api:stats')
+        admin = XDSUser.objects.create_superuser('admin@test.com',
+                                                 'test1234')
+        self.client.force_authenticate(user=admin)
+
+        with patch('es_api.views.get_pool_stats') as pool_stats, \
+                patch('es_api.views.search_flight.get_stats') \
+                as flight_stats, \
+                patch('es_api.views.suggestion_index.get_stats') \
+                as suggestion_stats:
+            pool_stats.return_value = {"default": []}
+            flight_stats.return_value = {"executed": 1, "collapsed": 2}
+            suggestion_stats.return_value = {"hits": 3, "misses": 1}
+            response = self.client.get(url)
+
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(json.loads(response.content),
+                             {"connection_pools": {"default": []},
+                              "single_flight": {"executed": 1,
+                                                "collapsed": 2},
+                              "suggestion_index": {"hits": 3,
+                                                   "misses": 1}})
+
 
 @tag('unit')
 class SearchDerivedTests(APITestCase):
@@ -199,10 +497,8 @@ class SearchDerivedTests(APITestCase):
         """
         url = "%s?reference=hello&p=1" % (reverse('es_api:search-derived'))
         with patch('es_api.views.XSEQueries') as query, \
-                patch('es_api.views.SearchFilter.objects') as sf1Obj, \
-                patch('es_api.views.XDSConfiguration.objects'):
-            sf1Obj.return_value = []
-            sf1Obj.filter.return_value = []
+                patch('es_api.views.get_config_snapshot') as snapshot:
+            snapshot.return_value.search_filters = []
             result_json = json.dumps({"test": "value"})
             query.get_results.return_value = result_json
             query.return_value = query
@@ -235,13 +531,129 @@ class SearchCompetencyTests(APITestCase):
         """
         url = "%s?reference=hello&p=1" % (reverse('es_api:search-competency'))
         with patch('es_api.views.XSEQueries') as query, \
-                patch('es_api.views.SearchFilter.objects') as sf1Obj, \
-                patch('es_api.views.XDSConfiguration.objects'):
-            sf1Obj.return_value = []
-            sf1Obj.filter.return_value = []
+                patch('es_api.views.get_config_snapshot') as snapshot:
+            snapshot.return_value.search_filters = []
             result_json = json.dumps({"test": "value"})
             query.get_results.return_value = result_json
             query.return_value = query
             response = self.client.get(url)
             self.assertEqual(response.status_code, status.HTTP_200_OK)
             self.assertEqual(json.loads(response.content), {'test': "value"})
+
+
+@tag('unit')
+class AsyncViewTests(APITestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    async def test_async_search_index_no_keyword(self):
+        """
+        Test that the async search view sends an HTTP error when no keyword
+        is provided
+        """
+        request = self.factory.get('/es-api/')
+        response = await async_views.SearchIndexView.as_view()(request)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    async def test_async_search_index_with_keyword(self):
+        """
+        Test that the async search view returns the results of the async
+        keyword search
+        """
+        request = self.factory.get('/es-api/?keyword=hello&p=2')
+        request.user = AnonymousUser()
+        with patch('es_api.async_views.AsyncXSEQueries') as query, \
+                patch('es_api.async_views.get_config_snapshot') as snapshot:
+            snapshot.return_value.search_filters = []
+            query.return_value = query
+            query.asearch_by_keyword_results = AsyncMock(
+                return_value=json.dumps({"test": "value"}))
+            response = await async_views.SearchIndexView.as_view()(request)
+
+            query.asearch_by_keyword_results.assert_awaited_once_with(
+                keyword='hello', filters={'page': '2'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content), {'test': "value"})
+
+    async def test_async_search_facets(self):
+        """
+        Test that the async facets view returns the results of the async
+        facets search
+        """
+        request = self.factory.get('/es-api/facets/?keyword=hello&p=2')
+        request.user = AnonymousUser()
+        with patch('es_api.async_views.AsyncXSEQueries') as query, \
+                patch('es_api.async_views.get_config_snapshot') as snapshot:
+            snapshot.return_value.search_filters = []
+            query.return_value = query
+            query.asearch_facets_results = AsyncMock(
+                return_value=json.dumps({"total": 1}))
+            response = await async_views.SearchFacetsView.as_view()(request)
+
+            query.asearch_facets_results.assert_awaited_once_with(
+                keyword='hello', filters={})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content), {'total': 1})
+
+    async def test_async_filters_invalid_cursor(self):
+        """
+        Test that the async filters view returns an HTTP 400 error when the
+        cursor cannot be decoded
+        """
+        request = self.factory.get('/es-api/filter-search/?cursor=bad')
+        request.user = AnonymousUser()
+        with patch('es_api.async_views.AsyncXSEQueries') as query, \
+                patch('es_api.async_views.get_config_snapshot'):
+            query.return_value = query
+            query.asearch_by_filters = AsyncMock(
+                side_effect=InvalidCursorError("Invalid cursor"))
+            response = await async_views.FiltersView.as_view()(request)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    async def test_async_search_derived_exception(self):
+        """
+        Test that the async derived view returns a server error when the
+        search fails
+        """
+        request = self.factory.get('/es-api/derived-from/?reference=hi')
+        request.user = AnonymousUser()
+        with patch('es_api.async_views.AsyncXSEQueries') as query, \
+                patch('es_api.async_views.get_config_snapshot'):
+            query.return_value = query
+            query.asearch_for_derived = AsyncMock(side_effect=HTTPError)
+            response = await async_views.SearchDerivedView.as_view()(request)
+
+        self.assertEqual(response.status_code,
+                         status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    async def test_async_more_like_this_permissions(self):
+        """
+        Test that the async views run the permission checks of the sync
+        views, refusing anonymous users outside of the open endpoints
+        """
+        request = self.factory.get('/es-api/more-like-this/a-b/')
+        request.user = AnonymousUser()
+        with patch('es_api.async_views.AsyncXSEQueries') as query, \
+                patch('es_api.async_views.get_config_snapshot'):
+            response = await async_views.GetMoreLikeThisView.as_view()(
+                request, doc_id='a-b')
+
+            query.assert_not_called()
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        request = self.factory.get('/es-api/more-like-this/ab/')
+        request.user = AnonymousUser()
+        with patch('es_api.async_views.AsyncXSEQueries') as query, \
+                patch('es_api.async_views.get_config_snapshot'):
+            query.return_value = query
+            query.amore_like_this_results = AsyncMock(return_value='[]')
+            response = await async_views.GetMoreLikeThisView.as_view()(
+                request, doc_id='ab')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
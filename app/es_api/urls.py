@@ -1,21 +1,34 @@
+from django.conf import settings
 from django.urls import path
 from rest_framework.routers import DefaultRouter
 
-from es_api import views
+from es_api import async_views, views
 
 router = DefaultRouter()
 
+# the async search views only pay off when served by the ASGI application
+search_views = async_views if settings.XSE_ASYNC_VIEWS else views
+
 app_name = 'es_api'
 urlpatterns = [
-    path('more-like-this/<str:doc_id>/', views.GetMoreLikeThisView.as_view(),
+    path('more-like-this/<str:doc_id>/',
+         search_views.GetMoreLikeThisView.as_view(),
          name='get-more-like-this'),
-    path('filter-search/', views.FiltersView.as_view(), name='filters'),
-    path('', views.SearchIndexView.as_view(), name='search-index'),
-    path('suggest/', views.SuggestionsView.as_view(), name='suggest'),
-    path('derived-from/', views.SearchDerivedView.as_view(),
+    path('filter-search/', search_views.FiltersView.as_view(),
+         name='filters'),
+    path('', search_views.SearchIndexView.as_view(), name='search-index'),
+    path('facets/', search_views.SearchFacetsView.as_view(),
+         name='search-facets'),
+    path('facets/buckets/', search_views.SearchFacetBucketsView.as_view(),
+         name='search-facet-buckets'),
+    path('suggest/', search_views.SuggestionsView.as_view(), name='suggest'),
+    path('derived-from/', search_views.SearchDerivedView.as_view(),
          name='search-derived'),
-    path('teaches/', views.SearchCompetencyView.as_view(),
+    path('teaches/', search_views.SearchCompetencyView.as_view(),
          name='search-competency'),
     path('similar-courses/<str:key>/',
-         views.GetSimilarCoursesView.as_view(), name='get-similar-courses'),
+         search_views.GetSimilarCoursesView.as_view(),
+         name='get-similar-courses'),
+    path('bundle/', views.SearchBundleView.as_view(), name='search-bundle'),
+    path('stats/', views.StatsView.as_view(), name='stats'),
 ]
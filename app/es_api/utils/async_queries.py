@@ -0,0 +1,236 @@
+import logging
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from elasticsearch_dsl.response import Response
+
+from .clients import get_async_client
+from .queries import XSEQueries
+from .raw_response import RAW_SERIALIZER
+from .result_cache import aget_or_set_results
+from .single_flight import search_flight
+from .suggestion_index import suggestion_index
+from .threads import in_request_thread, in_thread
+
+logger = logging.getLogger('dict_config_logger')
+
+
+class AsyncXSEQueries(XSEQueries):
+    """XSEQueries sending its searches through the async Elasticsearch
+        client, so one worker can wait on many searches at once.
+
+        The searches are built by the XSEQueries build methods, which read
+        the configuration and organizations from the cache or database and
+        are therefore run in the thread of the request"""
+
+    def __init__(self, host, index, user=AnonymousUser(), raw=False):
+        super().__init__(host, index, user=user, raw=raw)
+        self.async_client = get_async_client(self.host)
+        # point in time opened by the async client for an empty cursor
+        self.opened_pit_id = None
+
+    def open_point_in_time(self):
+        """This helper method returns the point in time opened by
+            aopen_point_in_time instead of blocking on the sync client"""
+        if self.opened_pit_id is not None:
+            return self.opened_pit_id
+
+        return super().open_point_in_time()
+
+    async def aopen_point_in_time(self, cursor):
+        """This helper method opens the point in time of a new cursor search
+            ahead of building it"""
+        if cursor == '':
+            response = await self.async_client.open_point_in_time(
+                index=self.index, keep_alive=settings.XSE_PIT_KEEP_ALIVE)
+            self.opened_pit_id = response['id']
+
+    async def abuild(self, build, *args, **kwargs):
+        """This helper method runs one of the build methods in the thread of
+            the request"""
+        return await in_request_thread(build)(*args, **kwargs)
+
+    async def asend_search(self, search):
+        """This helper method is the async version of send_search"""
+        if not self.raw:
+            return Response(search, await self.async_client.search(
+                index=search._index, body=search.to_dict(),
+                **search._params))
+
+        client = get_async_client(self.host, alias='raw',
+                                  serializer=RAW_SERIALIZER)
+
+        return await client.search(index=search._index, body=search.to_dict(),
+                                   **search._params)
+
+    async def aexecute(self):
+        """This method sends the built search to Elasticsearch and returns
+            the Response Object without blocking the event loop, identical
+            searches in flight on the loop are sent once"""
+        search = self.search
+        encode, decode = self.get_response_codec(search)
+
+        async def execute_search():
+            if not settings.XSE_SINGLE_FLIGHT_SHARED:
+                return await self.asend_search(search)
+
+            return await search_flight.ado_shared(
+                key, lambda: self.asend_search(search), encode=encode,
+                decode=decode, timeout=settings.XSE_SINGLE_FLIGHT_TIMEOUT)
+
+        key = self.get_search_key()
+        response = await search_flight.ado(key, execute_search)
+        logger.info(search.to_dict())
+
+        return response
+
+    async def aget_results(self, response):
+        """This method formats the response with get_results in the thread
+            of the request, naming the aggregations may read the
+            configuration"""
+        return await in_request_thread(self.get_results)(response)
+
+    async def asearch_by_keyword(self, keyword="", filters={}):
+        """This method is the async version of search_by_keyword"""
+        await self.aopen_point_in_time(filters.get('cursor'))
+        await self.abuild(self.build_search_by_keyword, keyword=keyword,
+                          filters=filters)
+
+        return await self.aexecute()
+
+    async def asearch_by_keyword_results(self, keyword="", filters={}):
+        """This method is the async version of search_by_keyword_results"""
+        async def build():
+            return await self.aget_results(
+                await self.asearch_by_keyword(keyword=keyword,
+                                              filters=filters))
+
+        # cursor pages belong to a single point in time, not worth caching
+        if 'cursor' in filters:
+            return await build()
+
+        cache_key = await in_request_thread(self.get_keyword_cache_key)(
+            keyword, filters)
+
+        return await aget_or_set_results(cache_key, build)
+
+    async def asearch_facets(self, keyword="", filters={}):
+        """This method is the async version of search_facets"""
+        await self.abuild(self.build_search_facets, keyword=keyword,
+                          filters=filters)
+
+        return await self.aexecute()
+
+    async def asearch_facets_results(self, keyword="", filters={}):
+        """This method is the async version of search_facets_results"""
+        async def build():
+            return await in_request_thread(self.get_facets_results)(
+                await self.asearch_facets(keyword=keyword, filters=filters))
+
+        cache_key = await in_request_thread(self.get_facets_cache_key)(
+            keyword, filters)
+
+        return await aget_or_set_results(cache_key, build)
+
+    async def afacet_buckets(self, search_filter, keyword="", filters={},
+                             after=None):
+        """This method is the async version of facet_buckets"""
+        await self.abuild(self.build_facet_buckets, search_filter,
+                          keyword=keyword, filters=filters, after=after)
+
+        return await self.aexecute()
+
+    async def afacet_buckets_results(self, search_filter, keyword="",
+                                     filters={}, after=None):
+        """This method is the async version of facet_buckets_results"""
+        async def build():
+            # formatting the buckets reads neither the database nor the cache
+            return await in_thread(self.get_facet_buckets_results)(
+                search_filter,
+                await self.afacet_buckets(search_filter, keyword=keyword,
+                                          filters=filters, after=after))
+
+        cache_key = await in_request_thread(self.get_facets_cache_key)(
+            keyword, filters, field=search_filter.field_name, after=after)
+
+        return await aget_or_set_results(cache_key, build)
+
+    async def asearch_by_competency(self, comp_uuid="", filters={}):
+        """This method is the async version of search_by_competency"""
+        await self.aopen_point_in_time(filters.get('cursor'))
+        await self.abuild(self.build_search_by_competency,
+                          comp_uuid=comp_uuid, filters=filters)
+
+        return await self.aexecute()
+
+    async def asearch_for_derived(self, reference="", filters={}):
+        """This method is the async version of search_for_derived"""
+        await self.aopen_point_in_time(filters.get('cursor'))
+        await self.abuild(self.build_search_for_derived, reference=reference,
+                          filters=filters)
+
+        return await self.aexecute()
+
+    async def amore_like_this(self, doc_id):
+        """This method is the async version of more_like_this"""
+        await self.abuild(self.build_more_like_this, doc_id=doc_id)
+
+        return await self.aexecute()
+
+    async def amore_like_this_results(self, doc_id):
+        """This method is the async version of more_like_this_results"""
+        async def build():
+            return await self.aget_results(
+                await self.amore_like_this(doc_id=doc_id))
+
+        cache_key = await in_request_thread(
+            self.get_more_like_this_cache_key)(doc_id)
+
+        return await aget_or_set_results(
+            cache_key, build, timeout=settings.XSE_RECOMMENDATIONS_TIMEOUT)
+
+    async def asimilar_courses(self, keyword=""):
+        """This method is the async version of similar_courses"""
+        await self.abuild(self.build_similar_courses, keyword=keyword)
+
+        return await self.aexecute()
+
+    async def asimilar_courses_results(self, keyword=""):
+        """This method is the async version of similar_courses_results"""
+        async def build():
+            return await self.aget_results(
+                await self.asimilar_courses(keyword=keyword))
+
+        cache_key = await in_request_thread(
+            self.get_similar_courses_cache_key)(keyword)
+
+        return await aget_or_set_results(
+            cache_key, build, timeout=settings.XSE_RECOMMENDATIONS_TIMEOUT)
+
+    async def asearch_by_filters(self, page_num, filters={}, cursor=None,
+                                 fields=None):
+        """This method is the async version of search_by_filters"""
+        await self.aopen_point_in_time(cursor)
+        await self.abuild(self.build_search_by_filters, page_num,
+                          filters=filters, cursor=cursor, fields=fields)
+
+        return await self.aexecute()
+
+    async def asuggest(self, partial):
+        """This method is the async version of suggest"""
+        await self.abuild(self.build_suggest, partial)
+
+        return await self.aexecute()
+
+    async def asuggest_results(self, partial):
+        """This method is the async version of suggest_results"""
+        contexts = await in_request_thread(self.get_suggestion_contexts)()
+        # the lookup reads the published index from the cache now and then
+        results = await in_request_thread(suggestion_index.lookup)(
+            partial, contexts, self.index)
+
+        if results is None:
+            response = await self.asuggest(partial)
+            results = response.suggest.to_dict()['autocomplete_suggestion']
+
+        return results
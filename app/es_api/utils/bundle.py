@@ -0,0 +1,89 @@
+import logging
+
+from django.contrib.auth.models import AnonymousUser
+from elasticsearch_dsl import MultiSearch
+
+from .queries import XSEQueries
+
+logger = logging.getLogger('dict_config_logger')
+
+SECTION_ERROR = {
+    "message": "error executing ElasticSearch query; " +
+    "Please contact an administrator"
+}
+
+
+class SearchBundle():
+    """Runs the searches of several sections of a page in a single _msearch
+        request, each built by its own XSEQueries"""
+
+    def __init__(self, host, index, user=AnonymousUser()):
+        self.host = host
+        self.index = index
+        self.user = user
+        # (name, queries, format_response) of the sections to execute
+        self.sections = []
+        # results of the sections that failed to build
+        self.errors = {}
+
+    def add(self, name, build, format_response):
+        """This method adds a section to the bundle, build is called with a
+            new XSEQueries to build its search and format_response with the
+            queries and the section's response"""
+        queries = XSEQueries(self.host, self.index, user=self.user)
+
+        try:
+            build(queries)
+        except Exception as err:
+            logger.error(err)
+            self.errors[name] = SECTION_ERROR
+        else:
+            self.sections.append((name, queries, format_response))
+
+    def execute(self):
+        """This method sends the searches of every section in one _msearch
+            request and returns the formatted results keyed by section,
+            a section that fails does not fail the others"""
+        results = dict(self.errors)
+
+        if not self.sections:
+            return results
+
+        # the searches carry their own index, point in time ones have none
+        multi_search = MultiSearch(using='default')
+        for name, queries, format_response in self.sections:
+            multi_search = multi_search.add(queries.search)
+
+        responses = multi_search.execute(raise_on_error=False)
+        logger.info(multi_search.to_dict())
+
+        for (name, queries, format_response), response in \
+                zip(self.sections, responses):
+            # failed searches come back as None
+            if response is None:
+                logger.error("Bundle section %s failed", name)
+                results[name] = SECTION_ERROR
+                continue
+
+            try:
+                results[name] = format_response(queries, response)
+            except Exception as err:
+                logger.error(err)
+                results[name] = SECTION_ERROR
+
+        return results
+
+
+def format_hits(queries, response):
+    """This method formats the response of a hit returning section"""
+    return queries.format_results(response)
+
+
+def format_suggestions(queries, response):
+    """This method formats the response of the suggestions section"""
+    return response.suggest.to_dict()['autocomplete_suggestion']
+
+
+def format_spotlight(queries, response):
+    """This method formats the response of the spotlight section"""
+    return queries.format_spotlight_results(response)
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import threading
+
+from django.conf import settings
+from elasticsearch import AsyncElasticsearch
+from elasticsearch_dsl import connections
+
+logger = logging.getLogger('dict_config_logger')
+
+# alias -> (registry key, Elasticsearch client)
+_registry = {}
+_registry_lock = threading.Lock()
+
+# alias -> (registry key, event loop, AsyncElasticsearch client)
+_async_registry = {}
+
+
+def _registry_key(host, options):
+    """This helper method returns a hashable key representing the host and
+        the options a client was built with"""
+    return (host, tuple(sorted(options.items())))
+
+
+def get_client(host, alias='default', **options):
+    """This method returns the process-wide Elasticsearch client registered
+        under alias, only building a new one (and its connection pool) when
+        the host or options differ from the ones it was built with"""
+    options.setdefault('timeout', settings.XSE_TIMEOUT)
+    options.setdefault('maxsize', settings.XSE_MAXSIZE)
+    key = _registry_key(host, options)
+
+    entry = _registry.get(alias)
+    if entry is not None and entry[0] == key:
+        return entry[1]
+
+    with _registry_lock:
+        # another thread may have rebuilt the client while we waited
+        entry = _registry.get(alias)
+        if entry is not None and entry[0] == key:
+            return entry[1]
+
+        # the previous client is not closed here as in flight requests on
+        # other threads may still be using it, it is released once
+        # unreferenced
+        client = connections.create_connection(alias=alias, hosts=[host, ],
+                                               **options)
+        _registry[alias] = (key, client)
+        logger.info("Built Elasticsearch client '%s' for %s", alias, host)
+
+        return client
+
+
+def get_async_client(host, alias='default', **options):
+    """This method returns the AsyncElasticsearch client registered under
+        alias for the running event loop, only building a new one when the
+        host, options or loop differ from the ones it was built with"""
+    options.setdefault('timeout', settings.XSE_TIMEOUT)
+    options.setdefault('maxsize', settings.XSE_ASYNC_MAXSIZE)
+    key = _registry_key(host, options)
+    # the aiohttp session of a client is bound to the loop it was made on
+    loop = asyncio.get_running_loop()
+
+    entry = _async_registry.get(alias)
+    if entry is not None and entry[0] == key and entry[1] is loop:
+        return entry[2]
+
+    # a single loop runs this, no lock is needed
+    client = AsyncElasticsearch(hosts=[host, ], **options)
+    _async_registry[alias] = (key, loop, client)
+    logger.info("Built async Elasticsearch client '%s' for %s", alias, host)
+
+    return client
+
+
+async def close_async_clients():
+    """This method closes and drops every registered async client"""
+    for alias in list(_async_registry):
+        key, loop, client = _async_registry.pop(alias)
+        await client.close()
+
+
+def reset_clients():
+    """This method drops every registered client so the next call to
+        get_client builds a new one"""
+    with _registry_lock:
+        for alias in list(_registry):
+            connections.remove_connection(alias)
+            del _registry[alias]
+
+
+def get_pool_stats():
+    """This method returns the connection pool statistics of every
+        registered client, keyed by alias"""
+    stats = {}
+
+    for alias, (key, client) in list(_registry.items()):
+        pools = []
+
+        for conn in client.transport.connection_pool.connections:
+            pool = getattr(conn, 'pool', None)
+            if pool is None or pool.pool is None:
+                continue
+            idle = len([c for c in list(pool.pool.queue) if c is not None])
+            pools.append({
+                "host": conn.host,
+                "maxsize": pool.pool.maxsize,
+                "connections_opened": pool.num_connections,
+                "requests": pool.num_requests,
+                "idle_connections": idle,
+            })
+
+        stats[alias] = pools
+
+    return stats
@@ -0,0 +1,58 @@
+import time
+
+from django.core.cache import cache
+
+from users.models import Organization
+
+ORG_FILTERS_GENERATION_KEY = 'organization_filters_generation'
+
+
+def _cache_key(user_id):
+    """This helper method returns the cache key of the organization filters
+        of a user, or of anonymous users when user_id is None"""
+    scope = 'anonymous' if user_id is None else f'user:{user_id}'
+
+    return f'organization_filters:{scope}'
+
+
+def get_organization_filters(user):
+    """This method returns the sorted filter values of the organizations a
+        user is assigned to, or of every organization for anonymous users.
+        The cached entry holds the generation it was built in and is read
+        along with the current generation in a single cache query"""
+    user_id = user.pk if user is not None and user.is_authenticated else None
+    key = _cache_key(user_id)
+    cached = cache.get_many([ORG_FILTERS_GENERATION_KEY, key])
+    generation = cached.get(ORG_FILTERS_GENERATION_KEY)
+    entry = cached.get(key)
+
+    if generation is None:
+        cache.add(ORG_FILTERS_GENERATION_KEY, time.time_ns(), timeout=None)
+        generation = cache.get(ORG_FILTERS_GENERATION_KEY)
+
+    if entry is not None and entry[0] == generation:
+        return entry[1]
+
+    if user_id is None:
+        organizations = Organization.objects.all()
+    else:
+        organizations = user.organizations.all()
+
+    org_filters = sorted(organizations.values_list('filter', flat=True))
+    cache.set(key, (generation, org_filters))
+
+    return org_filters
+
+
+def invalidate_user_organization_filters(user_ids):
+    """This method drops the cached organization filters of the users"""
+    cache.delete_many([_cache_key(user_id) for user_id in user_ids])
+
+
+def invalidate_organization_filters():
+    """This method bumps the generation so every cached organization filter
+        list is rebuilt"""
+    try:
+        cache.incr(ORG_FILTERS_GENERATION_KEY)
+    except ValueError:
+        cache.add(ORG_FILTERS_GENERATION_KEY, time.time_ns(), timeout=None)
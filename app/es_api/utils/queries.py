@@ -1,23 +1,105 @@
-import functools
+import base64
+import binascii
 import json
 import logging
 
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
 from django.core.exceptions import ObjectDoesNotExist
 from elasticsearch_dsl import A, Document, Q
 from elasticsearch_dsl.query import MoreLikeThis
+from elasticsearch_dsl.response import Response
 
-from configurations.models import CourseInformationMapping, XDSConfiguration
-from core.models import (CourseSpotlight, SearchField, SearchFilter,
-                         SearchSortOption)
-from users.models import Organization
+from configurations.utils.config_snapshot import get_config_snapshot
+from core.models import CourseSpotlight
+from xds_api.utils.spotlight_snapshot import (XSE_SPOTLIGHT_KEY,
+                                              get_spotlight_snapshot)
 
+from .clients import get_client
+from .organization_filters import get_organization_filters
 from .queries_base import BaseQueries
+from .raw_response import RAW_SERIALIZER, RawResponse, parse_raw_results
+from .result_cache import (get_or_set_results, make_cache_key,
+                           normalize_filters, normalize_keyword)
+from .single_flight import search_flight
+from .suggestion_index import suggestion_index
 
 logger = logging.getLogger('dict_config_logger')
 
+# request parameters sent along with the filters that are not filters
+SEARCH_PARAMETERS = ('page', 'sort', 'cursor', 'fields', 'facets')
+
+
+def encode_cursor(pit_id, search_after):
+    """This method packs a point in time id and the sort values of the last
+        hit of a page into an opaque, url safe cursor"""
+    payload = json.dumps({'pit': pit_id, 'after': search_after},
+                         separators=(',', ':'))
+
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a cursor sent by a client cannot be decoded"""
+
+
+def decode_cursor(cursor):
+    """This method unpacks a cursor made by encode_cursor into the point in
+        time id and the search_after values, raising InvalidCursorError when
+        the cursor is malformed"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        pit_id, search_after = payload['pit'], payload['after']
+    except (binascii.Error, UnicodeError, TypeError, KeyError,
+            ValueError) as err:
+        raise InvalidCursorError("Invalid cursor") from err
+
+    if not isinstance(pit_id, str) or not isinstance(search_after, list):
+        raise InvalidCursorError("Invalid cursor")
+
+    return pit_id, search_after
+
+
+def explain_search(search):
+    """This method returns the compiled DSL of a search with its query
+        clauses split by the context they run in"""
+    body = search.to_dict()
+    query = body.get('query', {})
+    bool_query = query.get('bool', {}) if list(query) == ['bool'] else {}
+    clauses = {
+        'scoring': bool_query.get('must', []) + bool_query.get('should', []),
+        'filter': bool_query.get('filter', []),
+        'must_not': bool_query.get('must_not', []),
+    }
+
+    if query and not bool_query:
+        clauses['scoring'] = [query]
+
+    return {
+        'index': search._index,
+        'params': search._params,
+        'body': body,
+        'clauses': clauses,
+    }
+
 
 class XSEQueries(BaseQueries):
 
+    def __init__(self, host, index, user=AnonymousUser(), raw=False):
+        super().__init__(host, index, user=user)
+        # when set searches return the RawResponse of the raw client, which
+        # get_results formats without parsing the hit sources
+        self.raw = raw
+        # display name -> field name of the aggregations added to the search
+        self.aggregation_fields = {}
+        # set by add_search_pagination when paging with a cursor
+        self.page_size = None
+        self.pit_id = None
+        # set by build_spotlight_courses
+        self.spotlight_ids = []
+        # set by get_organization_filters
+        self.organization_filters = None
+
     def get_page_start(self, page_number, page_size):
         """
         This helper method returns the starting index of a page given the page
@@ -30,6 +112,62 @@ class XSEQueries(BaseQueries):
 
             return start_index
 
+    def add_search_pagination(self, page_number, page_size, cursor=None):
+        """This helper method limits the search to one page of results.
+            Without a cursor the page number is turned into a from/size
+            slice, with one the search walks a point in time using
+            search_after so deep pages cost the same as the first; an empty
+            cursor opens a new point in time"""
+        if cursor is None:
+            start_index = self.get_page_start(page_number, page_size)
+            end_index = start_index + page_size
+            self.search = self.search[start_index:end_index]
+            return
+
+        if cursor:
+            pit_id, search_after = decode_cursor(cursor)
+        else:
+            pit_id = self.open_point_in_time()
+            search_after = None
+
+        self.page_size = page_size
+        self.pit_id = pit_id
+
+        # _shard_doc breaks ties between equal sort values so no hit is
+        # skipped or repeated across pages of the point in time
+        sort = self.search.to_dict().get('sort', ['_score'])
+        result_search = self.search.sort(*sort, {'_shard_doc': 'asc'})
+
+        # a point in time already targets the index it was opened on
+        result_search = result_search.index().extra(
+            size=page_size,
+            pit={'id': pit_id, 'keep_alive': settings.XSE_PIT_KEEP_ALIVE})
+
+        if search_after is not None:
+            result_search = result_search.extra(search_after=search_after)
+
+        self.search = result_search
+
+    def open_point_in_time(self):
+        """This helper method opens a point in time on the index and returns
+            its id"""
+        return self.client.open_point_in_time(
+            index=self.index,
+            keep_alive=settings.XSE_PIT_KEEP_ALIVE)['id']
+
+    def get_next_cursor(self, response):
+        """This helper method returns the cursor of the page following the
+            response of a cursor search, or None on the last page"""
+        hits = response.hits
+
+        if len(hits) < self.page_size:
+            return None
+
+        # Elasticsearch may hand back a new id for the point in time
+        pit_id = response.to_dict().get('pit_id') or self.pit_id
+
+        return encode_cursor(pit_id, list(hits[-1].meta.sort))
+
     def add_search_aggregations(self, filter_set):
         """This helper method takes in a queryset of filters
             then creates an aggregation for each filter"""
@@ -38,8 +176,18 @@ class XSEQueries(BaseQueries):
             # this is needed because elastic search only filters on keyword
             # fields
             full_field_name = curr_filter.field_name + '.keyword'
-            curr_agg = A(curr_filter.filter_type, field=full_field_name)
+            options = {'size': curr_filter.size}
+
+            # every shard sends back its own top values, more of them makes
+            # the counts of high-cardinality fields more accurate
+            if curr_filter.shard_size:
+                options['shard_size'] = curr_filter.shard_size
+
+            curr_agg = A(curr_filter.filter_type, field=full_field_name,
+                         **options)
             self.search.aggs.bucket(curr_filter.display_name, curr_agg)
+            self.aggregation_fields[curr_filter.display_name] = \
+                curr_filter.field_name
 
         return
 
@@ -49,7 +197,7 @@ class XSEQueries(BaseQueries):
         result_search = self.search
 
         for filter_name in filters:
-            if filter_name != 'page' and filter_name != 'sort':
+            if filter_name not in SEARCH_PARAMETERS:
                 # .keyword is necessary for elastic search filtering
                 field_name = filter_name + '.keyword'
                 result_search = result_search\
@@ -67,29 +215,91 @@ class XSEQueries(BaseQueries):
 
         if 'sort' in filters:
             key = filters['sort']
-            sort_option = SearchSortOption.objects.filter(field_name=key,
-                                                          active=True)
 
             # checking that the passed field name is allowed
-            if sort_option:
+            if key in get_config_snapshot().sort_options:
                 # need to add .keyword for Elasticsearch
                 result_search = result_search.sort(key + '.keyword')
 
         self.search = result_search
 
-    def search_by_keyword(self, keyword="", filters={}):
-        """This method takes in a keyword string + a page number and queries
-            ElasticSearch for the term then returns the Response Object"""
+    def add_source_filtering(self, fields=None):
+        """This helper method limits the _source of the hits to the fields
+            requested, or to the fields the UI renders when none are, so
+            unused ledger and supplemental fields are not fetched"""
+        includes = fields or get_config_snapshot().source_fields
+
+        if includes:
+            self.search = self.search.source(includes=list(includes))
+
+    def explain(self):
+        """This method returns the compiled DSL of the built search for
+            checking what is sent to Elasticsearch"""
+        return explain_search(self.search)
+
+    def get_search_key(self):
+        """This helper method returns a key identifying the built search, the
+            organization filters are part of the body"""
+        search = self.search
+
+        return make_cache_key('search', host=self.host, index=search._index,
+                              body=search.to_dict(), params=search._params,
+                              raw=self.raw)
+
+    def send_search(self, search):
+        """This helper method sends the search to Elasticsearch, through the
+            raw client in raw mode"""
+        if not self.raw:
+            return search.execute()
+
+        client = get_client(self.host, alias='raw', serializer=RAW_SERIALIZER)
+
+        return client.search(index=search._index, body=search.to_dict(),
+                             **search._params)
+
+    def get_response_codec(self, search):
+        """This helper method returns the functions encoding the response of
+            the search to share it with the other workers through the cache,
+            and decoding it back"""
+        if self.raw:
+            return (lambda response: response.body), RawResponse
+
+        return (lambda response: response.to_dict()), \
+            (lambda raw_response: Response(search, raw_response))
+
+    def execute(self):
+        """This method sends the built search to Elasticsearch and returns
+            the Response Object. Identical searches running at the same time
+            are sent once and share the response"""
+        search = self.search
+        encode, decode = self.get_response_codec(search)
+
+        def execute_search():
+            if not settings.XSE_SINGLE_FLIGHT_SHARED:
+                return self.send_search(search)
+
+            return search_flight.do_shared(
+                key, lambda: self.send_search(search), encode=encode,
+                decode=decode, timeout=settings.XSE_SINGLE_FLIGHT_TIMEOUT)
+
+        key = self.get_search_key()
+        response = search_flight.do(key, execute_search)
+        logger.info(search.to_dict())
+
+        return response
 
-        course_mapping = CourseInformationMapping.objects.first()
+    def add_keyword_query(self, keyword):
+        """This helper method adds the query matching the keyword against the
+            mapped course fields and the configured search fields"""
+        config = get_config_snapshot()
+        course_mapping = config.course_mapping
         fields = [
             course_mapping.course_title, course_mapping.course_description,
             course_mapping.course_code, course_mapping.course_provider,
             course_mapping.course_instructor,
             course_mapping.course_deliveryMode,
             course_mapping.course_competency,
-            *SearchField.objects.filter(
-                active=True).values_list('field_name', flat=True)
+            *config.search_fields
         ]
 
         q = Q("multi_match",
@@ -99,95 +309,250 @@ class XSEQueries(BaseQueries):
         # setting up the search object
         self.search = self.search.query(q)
 
+    def build_search_by_keyword(self, keyword="", filters={}):
+        """This method takes in a keyword string + a page number and builds
+            the search for the term"""
+        config = get_config_snapshot()
+
+        self.add_keyword_query(keyword)
+
         self.user_organization_filtering()
 
+        self.add_source_filtering(filters.get('fields'))
+
         # add sort if it's part of the request
         self.add_search_sort(filters=filters)
 
+        # create aggregations for each filter, unless the client gets them
+        # from search_facets
+        if filters.get('facets', True):
+            self.add_search_aggregations(filter_set=config.search_filters)
+
+        # add filters to the search query
+        self.add_search_filters(filters=filters)
+
         # getting the page size for result pagination
-        configuration = XDSConfiguration.objects.first()
-        uiConfig = configuration.xdsuiconfiguration
-        search_filters = SearchFilter.objects.filter(
-            xds_ui_configuration=uiConfig, active=True)
+        page_size = config.search_results_per_page
+        self.add_search_pagination(int(filters['page']), page_size,
+                                   cursor=filters.get('cursor'))
 
-        # create aggregations for each filter
-        self.add_search_aggregations(filter_set=search_filters)
+        return self.search
+
+    def search_by_keyword(self, keyword="", filters={}):
+        """This method takes in a keyword string + a page number and queries
+            ElasticSearch for the term then returns the Response Object"""
+        self.build_search_by_keyword(keyword=keyword, filters=filters)
+
+        return self.execute()
+
+    def get_keyword_cache_key(self, keyword, filters):
+        """This helper method returns the result cache key of a keyword
+            search as seen by the user"""
+        return make_cache_key(
+            'keyword',
+            keyword=normalize_keyword(keyword),
+            filters=normalize_filters(filters),
+            organizations=sorted(self.get_organization_filters()),
+            config_version=get_config_snapshot().version)
+
+    def search_by_keyword_results(self, keyword="", filters={}):
+        """This method returns the results of search_by_keyword formatted by
+            get_results, served from the result cache when an identical
+            search was run recently"""
+        # cursor pages belong to a single point in time, not worth caching
+        if 'cursor' in filters:
+            return self.get_results(
+                self.search_by_keyword(keyword=keyword, filters=filters))
+
+        return get_or_set_results(
+            self.get_keyword_cache_key(keyword, filters),
+            lambda: self.get_results(
+                self.search_by_keyword(keyword=keyword, filters=filters)))
+
+    def build_search_facets(self, keyword="", filters={}):
+        """This method builds the search returning the aggregations of a
+            keyword search without its hits"""
+        config = get_config_snapshot()
+
+        self.add_keyword_query(keyword)
+
+        self.user_organization_filtering()
+
+        self.add_search_aggregations(filter_set=config.search_filters)
 
-        # add filters to the search query
         self.add_search_filters(filters=filters)
 
-        page_size = uiConfig.search_results_per_page
-        start_index = self.get_page_start(int(filters['page']), page_size)
-        end_index = start_index + page_size
-        self.search = self.search[start_index:end_index]
+        # Elasticsearch only caches the shard results of searches without
+        # hits, requesting it also caches them where the index disables it
+        self.search = self.search.extra(size=0).params(request_cache=True)
+
+        return self.search
+
+    def search_facets(self, keyword="", filters={}):
+        """This method queries ElasticSearch for the aggregations of a keyword
+            search and returns the Response Object"""
+        self.build_search_facets(keyword=keyword, filters=filters)
+
+        return self.execute()
+
+    def get_facets_cache_key(self, keyword, filters, **parts):
+        """This helper method returns the result cache key of the facets of a
+            keyword search, the same for every page and sort of it"""
+        return make_cache_key(
+            'facets',
+            keyword=normalize_keyword(keyword),
+            filters=normalize_filters(
+                {name: value for name, value in filters.items()
+                 if name not in SEARCH_PARAMETERS}),
+            organizations=sorted(self.get_organization_filters()),
+            config_version=get_config_snapshot().version,
+            **parts)
+
+    def search_facets_results(self, keyword="", filters={}):
+        """This method returns the results of search_facets formatted by
+            get_facets_results, served from the result cache when the facets
+            of the search were computed recently"""
+        return get_or_set_results(
+            self.get_facets_cache_key(keyword, filters),
+            lambda: self.get_facets_results(
+                self.search_facets(keyword=keyword, filters=filters)))
+
+    def build_facet_buckets(self, search_filter, keyword="", filters={},
+                            after=None):
+        """This method builds the search returning the next values of one
+            filter of a keyword search, following the value after. The values
+            come in the order of the field rather than by count, which lets
+            Elasticsearch page through all of them without every shard
+            ranking them first"""
+        self.add_keyword_query(keyword)
 
-        # call to elasticsearch to execute the query
-        response = self.search.execute()
-        logger.info(self.search.to_dict())
+        self.user_organization_filtering()
 
-        return response
+        self.add_search_filters(filters=filters)
 
-    def search_by_competency(self, comp_uuid="", filters={}):
+        field_name = search_filter.field_name
+        options = {}
+
+        if after is not None:
+            options['after'] = {field_name: after}
+
+        self.search.aggs.bucket(search_filter.display_name, A(
+            'composite', size=search_filter.size,
+            sources=[{field_name: A('terms', field=field_name + '.keyword')}],
+            **options))
+
+        self.search = self.search.extra(size=0).params(request_cache=True)
+
+        return self.search
+
+    def facet_buckets(self, search_filter, keyword="", filters={},
+                      after=None):
+        """This method queries ElasticSearch for the next values of one
+            filter of a keyword search and returns the Response Object"""
+        self.build_facet_buckets(search_filter, keyword=keyword,
+                                 filters=filters, after=after)
+
+        return self.execute()
+
+    def get_facet_buckets_results(self, search_filter, response):
+        """
+        This helper method returns the values of a facet buckets search as
+        JSON, with the value to send as after to load the next ones or None
+        after the last ones
+        """
+        field_name = search_filter.field_name
+        agg = response.aggregations[search_filter.display_name].to_dict()
+        buckets = [{'key': bucket['key'][field_name],
+                    'doc_count': bucket['doc_count']}
+                   for bucket in agg['buckets']]
+        after = None
+
+        if len(buckets) >= search_filter.size and 'after_key' in agg:
+            after = agg['after_key'][field_name]
+
+        return json.dumps({
+            "field_name": field_name,
+            "buckets": buckets,
+            "after": after
+        })
+
+    def facet_buckets_results(self, search_filter, keyword="", filters={},
+                              after=None):
+        """This method returns the results of facet_buckets formatted by
+            get_facet_buckets_results, served from the result cache when the
+            same values were loaded recently"""
+        return get_or_set_results(
+            self.get_facets_cache_key(keyword, filters,
+                                      field=search_filter.field_name,
+                                      after=after),
+            lambda: self.get_facet_buckets_results(
+                search_filter,
+                self.facet_buckets(search_filter, keyword=keyword,
+                                   filters=filters, after=after)))
+
+    def build_search_by_competency(self, comp_uuid="", filters={}):
         """This method takes in a competency ID string + a page number and
-        queries ElasticSearch for the term then returns the Response Object"""
-        course_mapping = CourseInformationMapping.objects.first()
+        builds the search for the term"""
+        config = get_config_snapshot()
 
         q = Q("match",
-              **{course_mapping.course_competency: comp_uuid})
+              **{config.course_mapping.course_competency: comp_uuid})
 
         # setting up the search object
         self.search = self.search.query(q)
 
         self.user_organization_filtering()
 
+        self.add_source_filtering(filters.get('fields'))
+
         # getting the page size for result pagination
-        configuration = XDSConfiguration.objects.first()
-        uiConfig = configuration.xdsuiconfiguration
+        page_size = config.search_results_per_page
+        self.add_search_pagination(int(filters['page']), page_size,
+                                   cursor=filters.get('cursor'))
 
-        page_size = uiConfig.search_results_per_page
-        start_index = self.get_page_start(int(filters['page']), page_size)
-        end_index = start_index + page_size
-        self.search = self.search[start_index:end_index]
+        return self.search
 
-        # call to elasticsearch to execute the query
-        response = self.search.execute()
-        logger.info(self.search.to_dict())
+    def search_by_competency(self, comp_uuid="", filters={}):
+        """This method takes in a competency ID string + a page number and
+        queries ElasticSearch for the term then returns the Response Object"""
+        self.build_search_by_competency(comp_uuid=comp_uuid, filters=filters)
 
-        return response
+        return self.execute()
 
-    def search_for_derived(self, reference="", filters={}):
-        """This method takes in a reference string and queries
-            ElasticSearch for the items derived from it then returns the
-            Response Object"""
+    def build_search_for_derived(self, reference="", filters={}):
+        """This method takes in a reference string and builds the search
+            for the items derived from it"""
 
-        course_mapping = CourseInformationMapping.objects.first()
+        config = get_config_snapshot()
 
         q = Q("match",
-              **{course_mapping.course_derived_from: reference})
+              **{config.course_mapping.course_derived_from: reference})
 
         # setting up the search object
         self.search = self.search.query(q)
 
         self.user_organization_filtering()
 
+        self.add_source_filtering(filters.get('fields'))
+
         # getting the page size for result pagination
-        configuration = XDSConfiguration.objects.first()
-        uiConfig = configuration.xdsuiconfiguration
+        page_size = config.search_results_per_page
+        self.add_search_pagination(int(filters['page']), page_size,
+                                   cursor=filters.get('cursor'))
 
-        page_size = uiConfig.search_results_per_page
-        start_index = self.get_page_start(int(filters['page']), page_size)
-        end_index = start_index + page_size
-        self.search = self.search[start_index:end_index]
+        return self.search
 
-        # call to elasticsearch to execute the query
-        response = self.search.execute()
-        logger.info(self.search.to_dict())
+    def search_for_derived(self, reference="", filters={}):
+        """This method takes in a reference string and queries
+            ElasticSearch for the items derived from it then returns the
+            Response Object"""
+        self.build_search_for_derived(reference=reference, filters=filters)
 
-        return response
+        return self.execute()
 
-    def more_like_this(self, doc_id):
-        """This method takes in a doc ID and queries the elasticsearch index
-            for courses with similar title or description"""
+    def build_more_like_this(self, doc_id):
+        """This method takes in a doc ID and builds the search for courses
+            with similar title or description"""
         likeObj = [
             {
                 "_index": self.index,
@@ -195,7 +560,7 @@ class XSEQueries(BaseQueries):
             }
         ]
 
-        course_mapping = CourseInformationMapping.objects.first()
+        course_mapping = get_config_snapshot().course_mapping
         fields = [
             course_mapping.course_title, course_mapping.course_description,
             course_mapping.course_provider
@@ -205,20 +570,46 @@ class XSEQueries(BaseQueries):
         self.search = self.search.query(
             MoreLikeThis(like=likeObj, fields=fields))
         self.user_organization_filtering()
+        self.add_source_filtering()
 
-        # only fetch the first 6 results
-        # TODO: make the size configurable
-        self.search = self.search[0:6]
-        response = self.search.execute()
-        logger.info(response)
-
-        return response
+        # only fetch the configured number of results
+        self.search = self.search[0:get_config_snapshot().more_like_this_size]
 
-    def similar_courses(self, keyword=""):
-        """This method takes in a keyword and queries the elasticsearch index
-           for 4 courses with similar competencies or subjects"""
+        return self.search
 
-        course_mapping = CourseInformationMapping.objects.first()
+    def more_like_this(self, doc_id):
+        """This method takes in a doc ID and queries the elasticsearch index
+            for courses with similar title or description"""
+        self.build_more_like_this(doc_id=doc_id)
+
+        return self.execute()
+
+    def get_more_like_this_cache_key(self, doc_id):
+        """This helper method returns the result cache key of the courses
+            like a document as seen by the user"""
+        config = get_config_snapshot()
+
+        return make_cache_key(
+            'more_like_this',
+            doc_id=doc_id,
+            organizations=sorted(self.get_organization_filters()),
+            size=config.more_like_this_size,
+            config_version=config.version)
+
+    def more_like_this_results(self, doc_id):
+        """This method returns the results of more_like_this formatted by
+            get_results, served from the result cache when the courses like
+            the document were fetched recently"""
+        return get_or_set_results(
+            self.get_more_like_this_cache_key(doc_id),
+            lambda: self.get_results(self.more_like_this(doc_id=doc_id)),
+            timeout=settings.XSE_RECOMMENDATIONS_TIMEOUT)
+
+    def build_similar_courses(self, keyword=""):
+        """This method takes in a keyword and builds the search for the
+           courses with similar competencies or subjects"""
+
+        course_mapping = get_config_snapshot().course_mapping
         fields = [
             course_mapping.course_competency,
             course_mapping.course_subject
@@ -233,17 +624,43 @@ class XSEQueries(BaseQueries):
         self.search = self.search.query(q)
 
         self.user_organization_filtering()
+        self.add_source_filtering()
 
-        # sending back 4 responses
-        self.search = self.search[0:4]
+        # sending back the configured number of responses
+        self.search = \
+            self.search[0:get_config_snapshot().similar_courses_size]
 
-        # call to elasticsearch to execute the query
-        response = self.search.execute()
-        logger.info(self.search.to_dict())
+        return self.search
 
-        return response
-
-    def spotlight_courses(self):
+    def similar_courses(self, keyword=""):
+        """This method takes in a keyword and queries the elasticsearch index
+           for courses with similar competencies or subjects"""
+        self.build_similar_courses(keyword=keyword)
+
+        return self.execute()
+
+    def get_similar_courses_cache_key(self, keyword):
+        """This helper method returns the result cache key of the courses
+            similar to a keyword as seen by the user"""
+        config = get_config_snapshot()
+
+        return make_cache_key(
+            'similar_courses',
+            keyword=normalize_keyword(keyword),
+            organizations=sorted(self.get_organization_filters()),
+            size=config.similar_courses_size,
+            config_version=config.version)
+
+    def similar_courses_results(self, keyword=""):
+        """This method returns the results of similar_courses formatted by
+            get_results, served from the result cache when the courses
+            similar to the keyword were fetched recently"""
+        return get_or_set_results(
+            self.get_similar_courses_cache_key(keyword),
+            lambda: self.get_results(self.similar_courses(keyword=keyword)),
+            timeout=settings.XSE_RECOMMENDATIONS_TIMEOUT)
+
+    def get_spotlight_documents(self):
         """This method queries elasticsearch for courses with ids matching the
             ids of stored CourseSpotlight objects that are active"""
         course_spotlights = CourseSpotlight.objects.filter(active=True)
@@ -271,33 +688,84 @@ class XSEQueries(BaseQueries):
 
         return result
 
-    def search_by_filters(self, page_num, filters={}):
+    def build_spotlight_snapshot(self):
+        """This method returns the spotlight courses of the index as the JSON
+            bytes stored in the spotlight snapshot"""
+        return json.dumps(self.get_spotlight_documents()).encode('utf-8')
+
+    def spotlight_courses(self):
+        """This method returns the courses of the active CourseSpotlight
+            objects from the spotlight snapshot of the index, fetching them
+            when it has none"""
+        return json.loads(get_spotlight_snapshot(
+            XSE_SPOTLIGHT_KEY, self.build_spotlight_snapshot,
+            source=self.index))
+
+    def build_spotlight_courses(self):
+        """This method builds a search for the courses of the active
+            CourseSpotlight objects, in the order of the spotlights"""
+        self.spotlight_ids = list(
+            CourseSpotlight.objects.filter(active=True)
+            .values_list('course_id', flat=True))
+
+        self.search = self.search.query('ids', values=self.spotlight_ids)
+        self.search = self.search[0:len(self.spotlight_ids)]
+
+        return self.search
+
+    def format_spotlight_results(self, response):
+        """This helper method returns the hits of a spotlight search in the
+            format of spotlight_courses"""
+        courses = {}
+
+        for hit in response:
+            courses[hit.meta.id] = {
+                **hit.to_dict(),
+                "meta": {"id": hit.meta.id, "index": hit.meta.index}}
+
+        return [courses[course_id] for course_id in self.spotlight_ids
+                if course_id in courses]
+
+    def build_search_by_filters(self, page_num, filters={}, cursor=None,
+                                fields=None):
         """This method takes in a page number + a dict of field names and
-        values and queries ElasticSearch for the term then returns the
-            Response Object"""
+        values and builds the search for the term, paging with the cursor
+            instead when passed"""
 
         # setting up the search object
         self.user_organization_filtering()
+        self.add_source_filtering(fields)
         # getting the page size for result pagination
-        configuration = XDSConfiguration.objects.first()
-        uiConfig = configuration.xdsuiconfiguration
+        config = get_config_snapshot()
 
+        # the course title is free text, its match scores the hits so the
+        # best matching titles come first, the exact value fields only
+        # select courses, matching them in filter context skips scoring and
+        # lets Elasticsearch cache them
         for field_name in filters:
-            self.search = self.search.query(
-                Q("match", **{field_name: filters[field_name]}))
+            clause = Q("match", **{field_name: filters[field_name]})
 
-        page_size = uiConfig.search_results_per_page
-        start_index = self.get_page_start(page_num, page_size)
-        end_index = start_index + page_size
-        self.search = self.search[start_index:end_index]
+            if field_name == config.course_mapping.course_title:
+                self.search = self.search.query(clause)
+            else:
+                self.search = self.search.filter(clause)
 
-        # call to elasticsearch to execute the query
-        response = self.search.execute()
-        logger.info(self.search.to_dict())
+        page_size = config.search_results_per_page
+        self.add_search_pagination(page_num, page_size, cursor=cursor)
 
-        return response
+        return self.search
 
-    def get_results(self, response):
+    def search_by_filters(self, page_num, filters={}, cursor=None,
+                          fields=None):
+        """This method takes in a page number + a dict of field names and
+        values and queries ElasticSearch for the term then returns the
+            Response Object, paging with the cursor instead when passed"""
+        self.build_search_by_filters(page_num, filters=filters, cursor=cursor,
+                                     fields=fields)
+
+        return self.execute()
+
+    def format_results(self, response):
         """
         This helper method consumes the response of an ElasticSearch Query and
         adds the hits to an array then returns a dictionary representing the
@@ -306,30 +774,93 @@ class XSEQueries(BaseQueries):
         hit_arr = []
         agg_dict = response.aggregations.to_dict()
 
+        # the response may be shared with other requests, so its dictionaries
+        # are copied rather than modified
         for hit in response:
-            hit_dict = hit.to_dict()
-
             # adding the meta data to the dictionary
-            hit_dict['meta'] = hit.meta.to_dict()
+            hit_dict = {**hit.to_dict(), 'meta': hit.meta.to_dict()}
             hit_arr.append(hit_dict)
 
-        for key in agg_dict:
-            search_filter = SearchFilter.objects.filter(display_name=key,
-                                                        active=True).first()
-            filter_obj = agg_dict[key]
-            filter_obj['field_name'] = search_filter.field_name
-
         resultObj = {
             "hits": hit_arr,
             "total": response.hits.total.value,
-            "aggregations": agg_dict
+            "aggregations": self.name_aggregations(agg_dict)
         }
 
-        return json.dumps(resultObj)
+        if self.pit_id is not None:
+            resultObj["cursor"] = self.get_next_cursor(response)
 
-    def suggest(self, partial):
+        return resultObj
+
+    def name_aggregations(self, agg_dict):
         """
-        This method receives a partial to make a completion suggestion
+        This helper method returns a copy of the aggregations with the field
+        name of their filter added
+        """
+        # aggregations are named after the filter display names, fall back
+        # to the configured filters for ones this search did not add
+        aggregation_fields = self.aggregation_fields
+        if any(key not in aggregation_fields for key in agg_dict):
+            aggregation_fields = {
+                **{search_filter.display_name: search_filter.field_name
+                   for search_filter in get_config_snapshot().search_filters},
+                **aggregation_fields}
+
+        return {key: {**agg_dict[key], 'field_name': aggregation_fields[key]}
+                for key in agg_dict}
+
+    def format_raw_results(self, response):
+        """
+        This helper method returns the results of a RawResponse as JSON in the
+        format of get_results, copying the hit sources over as text instead
+        of parsing them
+        """
+        hit_json, last_meta, total, agg_dict, pit_id = \
+            parse_raw_results(response)
+
+        results = [
+            '"hits": [' + ', '.join(hit_json) + ']',
+            '"total": ' + json.dumps(total),
+            '"aggregations": ' + json.dumps(self.name_aggregations(agg_dict)),
+        ]
+
+        if self.pit_id is not None:
+            cursor = None
+            if len(hit_json) >= self.page_size:
+                cursor = encode_cursor(pit_id or self.pit_id,
+                                       last_meta['sort'])
+            results.append('"cursor": ' + json.dumps(cursor))
+
+        return '{' + ', '.join(results) + '}'
+
+    def get_results(self, response):
+        """
+        This helper method returns the results of format_results as JSON
+        """
+        if isinstance(response, RawResponse):
+            return self.format_raw_results(response)
+
+        return json.dumps(self.format_results(response))
+
+    def get_facets_results(self, response):
+        """
+        This helper method returns the total and the aggregations of a facets
+        search as JSON
+        """
+        if isinstance(response, RawResponse):
+            body = response.parsed
+        else:
+            body = response.to_dict()
+
+        return json.dumps({
+            "total": body['hits']['total']['value'],
+            "aggregations": self.name_aggregations(
+                body.get('aggregations', {}))
+        })
+
+    def build_suggest(self, partial):
+        """
+        This method receives a partial to build a completion suggestion
         request to Elastic
         """
         # common settings for suggest query
@@ -337,55 +868,79 @@ class XSEQueries(BaseQueries):
             'fuzziness': 'AUTO'
         }}
 
-        # check if user is logged in and in an organization
-        if self.user.is_authenticated and self.user.organizations.count() > 0:
-            # gets context from orgs user is a member of
-            query_dict['contexts'] = {
-                'filter': [org.filter for org in
-                           self.user.organizations.all()]}
-        # check if there are any organizations
-        elif Organization.objects.count() > 0:
-            # add all organizations to filter so nothing is excluded
-            query_dict['contexts'] = {
-                'filter': [org.filter for org in Organization.objects.all()]}
-        # if no organizations
-        else:
-            # throw error, a filter is required for context suggestions
-            raise ObjectDoesNotExist("No Organizations configured")
+        query_dict['contexts'] = {'filter': self.get_suggestion_contexts()}
+        # the options carry the fields the UI renders, like the ones of the
+        # suggestion index
+        self.add_source_filtering()
 
         # adds completion type suggestion to search query
         self.search = self.search.suggest('autocomplete_suggestion', partial,
                                           completion=query_dict)
 
-        response = self.search.execute()
+        return self.search
 
-        return response
+    def suggest(self, partial):
+        """
+        This method receives a partial to make a completion suggestion
+        request to Elastic
+        """
+        self.build_suggest(partial)
+
+        return self.execute()
+
+    def get_suggestion_contexts(self):
+        """
+        This helper method returns the organization filters the suggestions
+        of the user are taken from
+        """
+        # gets context from orgs user is a member of, otherwise add all
+        # organizations to filter so nothing is excluded
+        org_filters = self.get_organization_filters() or \
+            get_organization_filters(None)
+
+        # if no organizations
+        if not org_filters:
+            # throw error, a filter is required for context suggestions
+            raise ObjectDoesNotExist("No Organizations configured")
+
+        return org_filters
+
+    def suggest_results(self, partial):
+        """
+        This method returns the suggestions for a partial, from the
+        suggestion index of the worker when it has inputs starting with it,
+        otherwise from the fuzzy completion suggester of Elastic
+        """
+        results = suggestion_index.lookup(partial,
+                                          self.get_suggestion_contexts(),
+                                          self.index)
+
+        if results is None:
+            response = self.suggest(partial)
+            results = response.suggest.to_dict()['autocomplete_suggestion']
+
+        return results
+
+    def get_organization_filters(self):
+        """
+        This helper method returns the filter values of the organizations
+        scoping the user's searches, an empty list means no scoping
+        """
+        # memoized in the cache and dropped when memberships change, read
+        # once per instance as a search asks for them several times
+        if self.organization_filters is None:
+            self.organization_filters = get_organization_filters(self.user)
+
+        return self.organization_filters
 
     def user_organization_filtering(self):
         """
         This helper method returns an updated search with the organizations
         the user belongs to filtering the query
         """
-        # if user logged in and assigned organizations
-        if self.user.is_authenticated and self.user.organizations.count() > 0:
-            # generate queries for CourseProviderName from orgs
-            orgs = [Q("match", filter=org.filter)
-                    for org in self.user.organizations.all()]
-            # combine queries into a chained OR query
-            filtered_search = self.search.query(
-                functools.reduce(lambda a, b: a | b, orgs))
-            setattr(filtered_search, "minimum_should_match", 1)
-            self.search = filtered_search
-            return
-        # if user not logged in but organizations exist
-        if not self.user.is_authenticated and\
-                Organization.objects.all().count() > 0:
-            # generate queries for CourseProviderName from orgs
-            orgs = [Q("match", filter=org.filter)
-                    for org in Organization.objects.all()]
-            # combine queries into a chained OR query
-            filtered_search = self.search.query(
-                functools.reduce(lambda a, b: a | b, orgs))
-            setattr(filtered_search, "minimum_should_match", 1)
-            self.search = filtered_search
-            return
+        org_filters = self.get_organization_filters()
+
+        # a single terms clause in filter context does not affect scoring,
+        # letting Elasticsearch cache it as a bitset across searches
+        if org_filters:
+            self.search = self.search.filter('terms', filter=org_filters)
@@ -1,7 +1,9 @@
 import logging
 
 from django.contrib.auth.models import AnonymousUser
-from elasticsearch_dsl import A, Search, connections
+from elasticsearch_dsl import A, Search
+
+from .clients import get_client
 
 logger = logging.getLogger('dict_config_logger')
 
@@ -12,9 +14,10 @@ class BaseQueries():
         self.host = host
         self.index = index
         self.user = user
+        # reuses the pooled client for this host instead of rebuilding the
+        # transport (and its keep-alive connections) on every request
+        self.client = get_client(self.host)
         self.search = Search(using='default', index=index)
-        connections.create_connection(alias='default',
-                                      hosts=[self.host, ], timeout=60)
 
     def filter_options(self):
         """Aggregates options for filter field in XSE"""
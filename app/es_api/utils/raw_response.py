@@ -0,0 +1,158 @@
+import json
+import re
+from collections.abc import Mapping
+from json.decoder import scanstring
+from json.scanner import make_scanner
+
+from elasticsearch.serializer import JSONSerializer
+
+# scans one JSON value with the C scanner of the json module, which is
+# several times faster than skipping over it from Python
+_scan_once = make_scanner(json.JSONDecoder())
+_WHITESPACE = re.compile(r'\s*')
+
+
+class RawResponse(Mapping):
+    """Body of an Elasticsearch response kept as the text it was sent as,
+        only parsed when it is read as a mapping"""
+
+    def __init__(self, body):
+        self.body = body
+        self._parsed = None
+
+    @property
+    def parsed(self):
+        if self._parsed is None:
+            self._parsed = json.loads(self.body)
+
+        return self._parsed
+
+    def __getitem__(self, key):
+        return self.parsed[key]
+
+    def __iter__(self):
+        return iter(self.parsed)
+
+    def __len__(self):
+        return len(self.parsed)
+
+
+class RawJSONSerializer(JSONSerializer):
+    """Serializes requests as JSON but hands the JSON responses back as
+        RawResponse objects"""
+
+    def loads(self, s):
+        return RawResponse(s)
+
+
+RAW_SERIALIZER = RawJSONSerializer()
+
+
+def skip_whitespace(text, pos):
+    return _WHITESPACE.match(text, pos).end()
+
+
+def scan_value(text, pos):
+    """This method returns the JSON value starting at pos and the index
+        following it"""
+    try:
+        return _scan_once(text, pos)
+    except StopIteration as err:
+        raise ValueError(f"Expecting a JSON value at {pos}") from err
+
+
+def walk_object(text, pos, handlers={}):
+    """This method walks the JSON object starting at pos. The values of the
+        members named in handlers are passed to their handler, called with
+        the text and their start and returning their end, the others are
+        scanned. Returns the scanned values by name and the index following
+        the object"""
+    values = {}
+    pos = skip_whitespace(text, pos + 1)
+
+    while text[pos] != '}':
+        name, pos = scanstring(text, pos + 1)
+        # skips the colon
+        start = skip_whitespace(text, skip_whitespace(text, pos) + 1)
+
+        if name in handlers:
+            end = handlers[name](text, start)
+        else:
+            values[name], end = scan_value(text, start)
+            values[name + ':span'] = (start, end)
+
+        pos = skip_whitespace(text, end)
+        if text[pos] == ',':
+            pos = skip_whitespace(text, pos + 1)
+
+    return values, pos + 1
+
+
+def walk_array(text, pos, handle_item):
+    """This method walks the JSON array starting at pos, passing every item
+        to handle_item, called with the text and the item's start and
+        returning its end. Returns the index following the array"""
+    pos = skip_whitespace(text, pos + 1)
+
+    while text[pos] != ']':
+        pos = skip_whitespace(text, handle_item(text, pos))
+        if text[pos] == ',':
+            pos = skip_whitespace(text, pos + 1)
+
+    return pos + 1
+
+
+def format_raw_hit(text, pos):
+    """This method returns the JSON of the hit starting at pos in the format
+        of get_results, its metadata and the index following it. The
+        _source is copied over as text, never serialized again"""
+    values, end = walk_object(text, pos)
+    source_span = values.get('_source:span')
+
+    # the metadata is named like the hit attributes of elasticsearch_dsl
+    meta = {(name[1:] if name.startswith('_') else name): value
+            for name, value in values.items()
+            if not name.endswith(':span') and name not in ('_source',
+                                                           'fields')}
+    if 'type' in meta:
+        meta['doc_type'] = meta.pop('type')
+
+    meta_json = '"meta": ' + json.dumps(meta)
+
+    if source_span is None:
+        return '{' + meta_json + '}', meta, end
+
+    source = text[source_span[0]:source_span[1]]
+    separator = ', ' if values['_source'] else ''
+
+    return source[:-1] + separator + meta_json + '}', meta, end
+
+
+def parse_raw_results(raw_response):
+    """This method splits a raw search response into the JSON of its hits,
+        the metadata of its last hit, its total, aggregations and point in
+        time id in a single pass over the text"""
+    text = raw_response.body
+    hit_json = []
+    last_meta = [None]
+
+    def handle_hit(text, pos):
+        formatted, last_meta[0], end = format_raw_hit(text, pos)
+        hit_json.append(formatted)
+        return end
+
+    def handle_hits(text, pos):
+        hits, end = walk_object(text, pos, {
+            'hits': lambda text, pos: walk_array(text, pos, handle_hit)})
+        handle_hits.hits = hits
+        return end
+
+    top, _ = walk_object(text, skip_whitespace(text, 0),
+                         {'hits': handle_hits})
+
+    total = handle_hits.hits.get('total')
+    if isinstance(total, dict):
+        total = total['value']
+
+    return (hit_json, last_meta[0], total, top.get('aggregations', {}),
+            top.get('pit_id'))
@@ -0,0 +1,64 @@
+import hashlib
+import json
+import logging
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+logger = logging.getLogger('dict_config_logger')
+
+# alias of the TTL and size bounded cache configured in settings.CACHES
+RESULT_CACHE = 'search_results'
+
+
+def normalize_keyword(keyword):
+    """This helper method lowercases a keyword and collapses its whitespace
+        so equivalent searches share a cache entry"""
+    return ' '.join(keyword.lower().split())
+
+
+def normalize_filters(filters):
+    """This helper method returns a copy of the request filters with every
+        list of values sorted"""
+    return {name: sorted(value) if isinstance(value, (list, tuple)) else value
+            for name, value in filters.items()}
+
+
+def make_cache_key(namespace, **parts):
+    """This method returns a cache key for the namespace made from a digest
+        of the canonical JSON form of the parts"""
+    canonical = json.dumps(parts, sort_keys=True, separators=(',', ':'),
+                           default=str)
+    digest = hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    return f'{namespace}:{digest}'
+
+
+def get_or_set_results(key, build, timeout=DEFAULT_TIMEOUT):
+    """This method returns the results cached under key, calling build and
+        caching its return value on a miss"""
+    cache = caches[RESULT_CACHE]
+    results = cache.get(key)
+
+    if results is None:
+        results = build()
+        cache.set(key, results, timeout)
+    else:
+        logger.info("Serving cached results for %s", key)
+
+    return results
+
+
+async def aget_or_set_results(key, build, timeout=DEFAULT_TIMEOUT):
+    """This method is the async version of get_or_set_results, build is a
+        coroutine function"""
+    cache = caches[RESULT_CACHE]
+    results = await cache.aget(key)
+
+    if results is None:
+        results = await build()
+        await cache.aset(key, results, timeout)
+    else:
+        logger.info("Serving cached results for %s", key)
+
+    return results
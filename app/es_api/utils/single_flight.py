@@ -0,0 +1,211 @@
+import asyncio
+import logging
+import threading
+import time
+
+from django.core.cache import caches
+
+from .result_cache import RESULT_CACHE
+
+logger = logging.getLogger('dict_config_logger')
+
+# seconds before the first check of a search running on another worker,
+# doubled after every check up to POLL_MAX_INTERVAL so a waiter reads the
+# cache a handful of times rather than every few milliseconds
+POLL_INTERVAL = 0.05
+POLL_MAX_INTERVAL = 1.0
+
+
+class Call():
+    """An execution in flight and its outcome"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight():
+    """Collapses concurrent calls sharing a key into one execution, the
+        calls arriving while it runs wait for it and share its result.
+
+        do and ado only see the calls of their own process. do collapses the
+        calls of the threads of a threaded worker (gunicorn gthread) and ado
+        the coroutines of an ASGI worker's loop. A sync worker handles one
+        request at a time, so nothing is collapsed there. Only do_shared
+        collapses calls across workers, ado_shared being its async
+        version"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # key -> Call of the threads, (loop id, key) -> Task of the loops
+        self.calls = {}
+        self.futures = {}
+        self.counters = {
+            # calls that ran their function
+            'executed': 0,
+            # calls that waited on an execution in this worker
+            'collapsed': 0,
+            # calls served by an execution in another worker
+            'shared': 0,
+        }
+
+    def count(self, counter):
+        with self.lock:
+            self.counters[counter] += 1
+
+    def do(self, key, fn):
+        """This method returns the result of fn, or of the call to fn
+            already running for key on another thread of the process"""
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+
+            if leader:
+                call = self.calls[key] = Call()
+                self.counters['executed'] += 1
+            else:
+                self.counters['collapsed'] += 1
+
+        if not leader:
+            call.done.wait()
+
+            if call.error is not None:
+                raise call.error
+
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as err:
+            call.error = err
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+
+        return call.result
+
+    async def ado(self, key, fn):
+        """This method is the async version of do, fn is a coroutine
+            function. It runs in a task of its own, so cancelling any of the
+            callers, the first one included, leaves it running for the
+            others"""
+        loop = asyncio.get_running_loop()
+        loop_key = (id(loop), key)
+        task = self.futures.get(loop_key)
+
+        if task is not None:
+            self.count('collapsed')
+        else:
+            task = self.futures[loop_key] = loop.create_task(fn())
+            self.count('executed')
+
+            def forget(task):
+                if self.futures.get(loop_key) is task:
+                    del self.futures[loop_key]
+                # marks the exception as retrieved when nobody waited on it
+                if not task.cancelled():
+                    task.exception()
+
+            task.add_done_callback(forget)
+
+        return await asyncio.shield(task)
+
+    def do_shared(self, key, fn, encode, decode, timeout):
+        """This method returns the result of fn, or of the call to fn
+            running for key on another worker, shared through the cache as
+            encoded by encode and decoded by decode. Waiting workers give up
+            and call fn themselves after timeout seconds"""
+        cache = caches[RESULT_CACHE]
+        lock_key = f'{key}:lock'
+        result_key = f'{key}:result'
+
+        if cache.add(lock_key, True, timeout=timeout):
+            try:
+                # drops the result of an earlier execution
+                cache.delete(result_key)
+                result = fn()
+                cache.set(result_key, encode(result), timeout=timeout)
+
+                return result
+            finally:
+                cache.delete(lock_key)
+
+        deadline = time.monotonic() + timeout
+        interval = POLL_INTERVAL
+
+        while True:
+            time.sleep(min(interval, max(deadline - time.monotonic(), 0)))
+            interval = min(interval * 2, POLL_MAX_INTERVAL)
+            # the result and the lock in one query
+            entries = cache.get_many([result_key, lock_key])
+
+            if result_key in entries:
+                self.count('shared')
+                return decode(entries[result_key])
+
+            # the other worker failed without leaving a result
+            if lock_key not in entries or time.monotonic() >= deadline:
+                break
+
+        logger.info("No shared result for %s, executing it", key)
+        return fn()
+
+    async def ado_shared(self, key, fn, encode, decode, timeout):
+        """This method is the async version of do_shared, fn is a coroutine
+            function"""
+        cache = caches[RESULT_CACHE]
+        lock_key = f'{key}:lock'
+        result_key = f'{key}:result'
+
+        if await cache.aadd(lock_key, True, timeout=timeout):
+            try:
+                # drops the result of an earlier execution
+                await cache.adelete(result_key)
+                result = await fn()
+                await cache.aset(result_key, encode(result), timeout=timeout)
+
+                return result
+            finally:
+                await cache.adelete(lock_key)
+
+        deadline = time.monotonic() + timeout
+        interval = POLL_INTERVAL
+
+        while True:
+            await asyncio.sleep(
+                min(interval, max(deadline - time.monotonic(), 0)))
+            interval = min(interval * 2, POLL_MAX_INTERVAL)
+            # the result and the lock in one query
+            entries = await cache.aget_many([result_key, lock_key])
+
+            if result_key in entries:
+                self.count('shared')
+                return decode(entries[result_key])
+
+            # the other worker failed without leaving a result
+            if lock_key not in entries or time.monotonic() >= deadline:
+                break
+
+        logger.info("No shared result for %s, executing it", key)
+        return await fn()
+
+    def get_stats(self):
+        """This method returns the counters and the number of executions in
+            flight"""
+        with self.lock:
+            return {
+                **self.counters,
+                'in_flight': len(self.calls) + len(self.futures),
+            }
+
+    def reset_stats(self):
+        with self.lock:
+            for counter in self.counters:
+                self.counters[counter] = 0
+
+
+# collapses the identical searches sent by XSEQueries
+search_flight = SingleFlight()
@@ -0,0 +1,69 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# body of the info request the Elasticsearch clients send to check that they
+# are talking to Elasticsearch
+INFO_BODY = {
+    "version": {"number": "7.17.0", "build_flavor": "default"},
+    "tagline": "You Know, for Search",
+}
+
+
+class StubElasticsearchHandler(BaseHTTPRequestHandler):
+    """Answers the info request like Elasticsearch and every other request
+        with the body of the server after waiting for its latency"""
+
+    # keeps the connections alive like Elasticsearch does, sending each
+    # response in one write so the latency is not skewed by delayed ACKs
+    protocol_version = 'HTTP/1.1'
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.respond()
+
+    def do_POST(self):
+        self.respond()
+
+    def respond(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        self.rfile.read(length)
+
+        if self.path.split('?')[0] == '/':
+            body = json.dumps(INFO_BODY).encode('utf-8')
+        else:
+            time.sleep(self.server.latency)
+            body = self.server.body
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('X-Elastic-Product', 'Elasticsearch')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        return
+
+
+@contextmanager
+def stub_elasticsearch(body, latency=0):
+    """This method runs a stub Elasticsearch answering searches with body
+        after latency seconds, yielding its URL"""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubElasticsearchHandler)
+    server.daemon_threads = True
+    server.body = body if isinstance(body, bytes) else \
+        json.dumps(body).encode('utf-8')
+    server.latency = latency
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    try:
+        yield f'http://127.0.0.1:{server.server_port}'
+    finally:
+        server.shutdown()
+        server.server_close()
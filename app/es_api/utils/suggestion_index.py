@@ -0,0 +1,368 @@
+import heapq
+import logging
+import threading
+import time
+from bisect import bisect_left
+
+from django.core.cache import cache
+from elasticsearch_dsl import Search
+
+from .clients import get_client
+
+logger = logging.getLogger('dict_config_logger')
+
+# the published entries are stored in chunks under
+# SUGGESTION_INDEX_KEY:<version>:<chunk>, listed by the publication stored
+# under SUGGESTION_VERSION_KEY
+SUGGESTION_INDEX_KEY = 'xds_suggestion_index'
+SUGGESTION_VERSION_KEY = 'xds_suggestion_index_version'
+
+# entries per published chunk, along with the sources of their documents,
+# keeping each cache value well under the item size limit of memcached
+SUGGESTION_CHUNK_SIZE = 500
+
+# completion field of the course documents and its context of organization
+# filters
+COMPLETION_FIELD = 'autocomplete'
+CONTEXT_NAME = 'filter'
+
+# suggestions returned per lookup, the completion suggester default
+SUGGESTION_SIZE = 5
+
+# weight of the completion inputs naming none, the score of their
+# suggestions
+DEFAULT_WEIGHT = 1
+
+# seconds a worker serves its index before checking for a newer one
+VERSION_CHECK_INTERVAL = 30
+
+
+def get_path(source, path):
+    """This helper method returns the value at the dotted path of a document
+        source, or None"""
+    for name in path.split('.'):
+        if not isinstance(source, dict):
+            return None
+        source = source.get(name)
+
+    return source
+
+
+def as_list(value):
+    """This helper method returns value as a list of values"""
+    if value is None:
+        return []
+
+    return value if isinstance(value, list) else [value]
+
+
+def completion_inputs(value, contexts=()):
+    """This method yields the inputs of a completion field value with the
+        contexts they are suggested in, contexts when the value names none,
+        and their weight"""
+    for item in as_list(value):
+        if isinstance(item, dict):
+            item_contexts = item.get('contexts', {}).get(CONTEXT_NAME)
+            if item_contexts is None:
+                item_contexts = contexts
+
+            for text in as_list(item.get('input')):
+                yield (text, tuple(as_list(item_contexts)),
+                       item.get('weight', DEFAULT_WEIGHT))
+        elif isinstance(item, str):
+            yield item, tuple(contexts), DEFAULT_WEIGHT
+
+
+def get_context_path(host, index):
+    """This method returns the document field the completion contexts are
+        read from when the mapping names one, or None"""
+    mappings = get_client(host).indices.get_mapping(index=index)
+
+    for mapping in mappings.values():
+        field = mapping['mappings'].get('properties', {}) \
+            .get(COMPLETION_FIELD, {})
+
+        for context in field.get('contexts', []):
+            if context.get('name') == CONTEXT_NAME and 'path' in context:
+                return context['path']
+
+    return None
+
+
+def select_fields(source, fields):
+    """This helper method returns the parts of a document source at the
+        dotted paths of fields, like the _source includes of a search"""
+    selected = {}
+
+    for field in fields:
+        value = get_path(source, field)
+
+        if value is None:
+            continue
+
+        *parents, name = field.split('.')
+        target = selected
+
+        for parent in parents:
+            target = target.setdefault(parent, {})
+
+        target[name] = value
+
+    return selected
+
+
+def build_suggestion_entries(host, index, source_fields=()):
+    """This method reads the completion inputs of every document of the
+        index and returns them as (input, document id, contexts, weight)
+        entries, along with the source fields of the documents suggested by
+        id, the _source of their suggestions"""
+    context_path = get_context_path(host, index)
+    fields = [COMPLETION_FIELD] + ([context_path] if context_path else [])
+    search = Search(using=get_client(host), index=index) \
+        .source(fields + list(source_fields))
+    entries = []
+    sources = {}
+
+    for hit in search.scan():
+        source = hit.to_dict()
+        contexts = as_list(get_path(source, context_path)) \
+            if context_path else ()
+        inputs = list(completion_inputs(source.get(COMPLETION_FIELD),
+                                        contexts))
+
+        for text, text_contexts, weight in inputs:
+            entries.append((text, hit.meta.id, text_contexts, weight))
+
+        if inputs:
+            sources[hit.meta.id] = select_fields(source, source_fields) \
+                if source_fields else source
+
+    return entries, sources
+
+
+def get_chunk_keys(version, chunk_count):
+    """This helper method returns the cache keys of the chunks of a
+        publication"""
+    return [f'{SUGGESTION_INDEX_KEY}:{version}:{chunk}'
+            for chunk in range(chunk_count)]
+
+
+def publish_suggestion_entries(index, entries, sources):
+    """This method shares the entries and sources with every worker through
+        the cache in chunks of SUGGESTION_CHUNK_SIZE entries, each holding the
+        sources of its documents, and returns the version they are published
+        as. The chunks of the previous publication are dropped"""
+    version = time.time_ns()
+    chunks = {}
+
+    for start in range(0, len(entries), SUGGESTION_CHUNK_SIZE):
+        chunk_entries = entries[start:start + SUGGESTION_CHUNK_SIZE]
+        chunks[len(chunks)] = {
+            'entries': chunk_entries,
+            'sources': {doc_id: sources[doc_id]
+                        for _, doc_id, _, _ in chunk_entries
+                        if doc_id in sources},
+        }
+
+    keys = get_chunk_keys(version, len(chunks))
+    previous = cache.get(SUGGESTION_VERSION_KEY)
+
+    cache.set_many({keys[chunk]: value for chunk, value in chunks.items()},
+                   timeout=None)
+    # the workers only read the chunks once they are all stored
+    cache.set(SUGGESTION_VERSION_KEY,
+              {'version': version, 'index': index, 'chunks': len(chunks)},
+              timeout=None)
+
+    if isinstance(previous, dict):
+        cache.delete_many(get_chunk_keys(previous['version'],
+                                         previous['chunks']))
+
+    return version
+
+
+def read_suggestion_entries(publication):
+    """This method returns the entries and sources of a publication read
+        from its chunks, or None when some were dropped by a newer one"""
+    keys = get_chunk_keys(publication['version'], publication['chunks'])
+    chunks = cache.get_many(keys)
+
+    if len(chunks) < len(keys):
+        return None
+
+    entries = []
+    sources = {}
+
+    for key in keys:
+        entries.extend(chunks[key]['entries'])
+        sources.update(chunks[key]['sources'])
+
+    return entries, sources
+
+
+class SuggestionIndex():
+    """In-process copy of the completion inputs of the course documents,
+        sorted per organization context so exact prefixes are looked up with
+        a binary search. Lookups it cannot answer fall back to the completion
+        suggester"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        # index the entries were read from
+        self.index = None
+        self.checked = None
+        # context -> (sorted lowercased inputs, options in the same order)
+        self.contexts = {}
+        self.entry_count = 0
+        self.counters = {
+            # lookups answered by the index
+            'hits': 0,
+            # lookups left to Elasticsearch
+            'misses': 0,
+        }
+
+    def load(self, index, entries, sources={}, version=None):
+        """This method replaces the contents of the index with the entries,
+            suggesting the sources of their documents"""
+        contexts = {}
+
+        for text, doc_id, text_contexts, weight in entries:
+            # shaped like the options of the completion suggester
+            option = {
+                'text': text,
+                '_index': index,
+                '_type': '_doc',
+                '_id': doc_id,
+                '_score': float(weight),
+                '_source': sources.get(doc_id, {}),
+                'contexts': {CONTEXT_NAME: list(text_contexts)},
+            }
+
+            for context in text_contexts:
+                contexts.setdefault(context, []).append((text.lower(),
+                                                         option))
+
+        for context, context_entries in contexts.items():
+            context_entries.sort(key=lambda entry: entry[0])
+            contexts[context] = ([key for key, _ in context_entries],
+                                 [option for _, option in context_entries])
+
+        with self.lock:
+            self.contexts = contexts
+            self.entry_count = len(entries)
+            self.version = version
+            self.index = index
+
+    def refresh(self, index):
+        """This method loads the entries last published by the refresh
+            command when they are newer than the ones of the index and were
+            read from index, checking at most every VERSION_CHECK_INTERVAL
+            seconds"""
+        now = time.monotonic()
+
+        if self.checked is not None and \
+                now - self.checked < VERSION_CHECK_INTERVAL:
+            return
+
+        self.checked = now
+        publication = cache.get(SUGGESTION_VERSION_KEY)
+
+        if not isinstance(publication, dict) or \
+                publication['version'] == self.version:
+            return
+
+        if publication['index'] != index:
+            logger.info("Ignoring the suggestion entries of %s, the "
+                        "configured index is %s", publication['index'], index)
+            return
+
+        published = read_suggestion_entries(publication)
+
+        if published is None:
+            logger.info("Suggestion entries of version %s were replaced "
+                        "while being read", publication['version'])
+            # the newer ones are read on the next lookup
+            self.checked = None
+            return
+
+        self.load(publication['index'], *published, publication['version'])
+        logger.info("Loaded %s suggestion entries of version %s",
+                    self.entry_count, self.version)
+
+    def count(self, counter):
+        with self.lock:
+            self.counters[counter] += 1
+
+    def iter_prefix(self, context, prefix):
+        """This helper method yields the (input, option) entries of the
+            context starting with the prefix, in input order"""
+        keys, options = self.contexts.get(context, ((), ()))
+        position = bisect_left(keys, prefix)
+
+        while position < len(keys) and keys[position].startswith(prefix):
+            yield keys[position], options[position]
+            position += 1
+
+    def lookup(self, partial, contexts, index, size=SUGGESTION_SIZE):
+        """This method returns the suggestions of the documents of the
+            contexts with an input starting with partial, ranked and
+            formatted like the completion suggester, or None when it has
+            none or its entries were read from another index"""
+        self.refresh(index)
+
+        if self.index != index:
+            self.count('misses')
+            return None
+
+        prefix = partial.lower()
+        best = {}
+
+        for context in contexts:
+            for key, option in self.iter_prefix(context, prefix):
+                # one suggestion per document, its best scoring input, like
+                # the completion suggester
+                rank = (-option['_score'], key)
+                current = best.get(option['_id'])
+
+                if current is None or rank < current[0]:
+                    best[option['_id']] = (rank, option)
+
+        options = [option for _, option in
+                   heapq.nsmallest(size, best.values(),
+                                   key=lambda entry: entry[0])]
+
+        if not options:
+            self.count('misses')
+            return None
+
+        self.count('hits')
+
+        return [{
+            'text': partial,
+            'offset': 0,
+            'length': len(partial),
+            'options': options,
+        }]
+
+    def get_stats(self):
+        """This method returns the size of the index and its hit rate"""
+        with self.lock:
+            lookups = self.counters['hits'] + self.counters['misses']
+
+            return {
+                'version': self.version,
+                'entries': self.entry_count,
+                'contexts': len(self.contexts),
+                **self.counters,
+                'hit_rate': self.counters['hits'] / lookups if lookups else 0,
+            }
+
+    def reset_stats(self):
+        with self.lock:
+            for counter in self.counters:
+                self.counters[counter] = 0
+
+
+# answers the suggestions of this worker
+suggestion_index = SuggestionIndex()
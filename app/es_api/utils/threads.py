@@ -0,0 +1,16 @@
+from asgiref.sync import sync_to_async
+
+
+def in_thread(function):
+    """This helper method returns a coroutine function running function in
+        a thread of the executor, not in the thread of the request. Only for
+        work that reads neither the database nor the cache, as the
+        connections opened by the executor threads are never closed"""
+    return sync_to_async(function, thread_sensitive=False)
+
+
+def in_request_thread(function):
+    """This helper method returns a coroutine function running function in
+        the thread of the request, where the database connections it opens
+        are closed at the end of the request as in the sync views"""
+    return sync_to_async(function, thread_sensitive=True)
@@ -1,6 +1,7 @@
 import json
 import logging
 
+from django.conf import settings
 from django.http import (HttpResponse, HttpResponseBadRequest,
                          HttpResponseServerError)
 from requests.exceptions import HTTPError
@@ -8,15 +9,45 @@ from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from configurations.models import CourseInformationMapping, XDSConfiguration
-from core.models import SearchFilter
-from es_api.utils.queries import XSEQueries
+from configurations.utils.config_snapshot import get_config_snapshot
+from es_api.utils.bundle import (SearchBundle, format_hits, format_spotlight,
+                                 format_suggestions)
+from es_api.utils.clients import get_pool_stats
+from es_api.utils.queries import InvalidCursorError, XSEQueries
+from es_api.utils.single_flight import search_flight
+from es_api.utils.suggestion_index import suggestion_index
 
 logger = logging.getLogger('dict_config_logger')
 
 CONTACT_ADMIN = "Please contact an administrator"
 
 
+def get_requested_fields(request):
+    """This helper method returns the hit fields named by the comma
+        separated or repeated 'fields' parameter, or None when absent"""
+    fields = [field.strip() for value in request.GET.getlist('fields')
+              for field in value.split(',') if field.strip()]
+
+    return fields or None
+
+
+def invalid_cursor_response(err):
+    """This helper method returns the bad request sent when the cursor of a
+        request cannot be decoded"""
+    logger.error(err)
+
+    return HttpResponseBadRequest(json.dumps({"message": "Invalid cursor"}),
+                                  content_type="application/json")
+
+
+def wants_explain(request):
+    """This helper method returns whether the request asks for the compiled
+        search instead of its results with explain=true, only honoured for
+        staff users"""
+    return request.GET.get('explain') == 'true' and \
+        request.user.is_authenticated and request.user.is_staff
+
+
 class SearchIndexView(APIView):
     """This method defines an API for sending keyword queries to ElasticSearch
             without using a model"""
@@ -34,9 +65,21 @@ class SearchIndexView(APIView):
         if (request.GET.get('p')) and (request.GET.get('p') != ''):
             filters['page'] = request.GET['p']
 
+        # an empty cursor starts a new cursor search
+        if 'cursor' in request.GET:
+            filters['cursor'] = request.GET['cursor']
+
+        fields = get_requested_fields(request)
+        if fields:
+            filters['fields'] = fields
+
         if (request.GET.get('sort')) and (request.GET.get('sort') != ''):
             filters['sort'] = request.GET['sort']
 
+        # clients getting the aggregations from the facets endpoint
+        if request.GET.get('facets') == 'false':
+            filters['facets'] = False
+
         return keyword, filters
 
     def get(self, request):
@@ -52,23 +95,33 @@ class SearchIndexView(APIView):
             errorMsgJSON = json.dumps(errorMsg)
 
             try:
-                search_filters = SearchFilter.objects.filter(active=True)
+                config = get_config_snapshot()
 
                 # only add the filters that are defined in the configuration,
                 # the rest is ignored
-                for curr_filter in search_filters:
+                for curr_filter in config.search_filters:
                     if (request.GET.get(curr_filter.field_name)) and \
                             (request.GET.get(curr_filter.field_name) != ''):
                         filters[curr_filter.field_name] = \
                             request.GET.getlist(curr_filter.field_name)
 
                 queries = XSEQueries(
-                    XDSConfiguration.objects.first().target_xse_host,
-                    XDSConfiguration.objects.first().target_xse_index,
-                    user=request.user)
-                response = queries.search_by_keyword(
-                    keyword=keyword, filters=filters)
-                results = queries.get_results(response)
+                    config.target_xse_host,
+                    config.target_xse_index,
+                    user=request.user,
+                    raw=settings.XSE_RAW_RESULTS)
+
+                if wants_explain(request):
+                    # a cursor would open a point in time
+                    filters.pop('cursor', None)
+                    queries.build_search_by_keyword(keyword=keyword,
+                                                    filters=filters)
+                    results = json.dumps(queries.explain())
+                else:
+                    results = queries.search_by_keyword_results(
+                        keyword=keyword, filters=filters)
+            except InvalidCursorError as cursor_err:
+                return invalid_cursor_response(cursor_err)
             except HTTPError as http_err:
                 logger.error(http_err)
                 return HttpResponseServerError(errorMsgJSON,
@@ -89,6 +142,131 @@ class SearchIndexView(APIView):
                                           content_type="application/json")
 
 
+class SearchFacetsView(APIView):
+    """This method defines an API for the aggregations of a keyword search,
+            which do not change from one page of its results to the next"""
+
+    def get(self, request):
+        keyword = request.GET.get('keyword', '')
+
+        if keyword == '':
+            error = {
+                "message": "Request is missing 'keyword' query paramater"
+            }
+            errorJson = json.dumps(error)
+            return HttpResponseBadRequest(errorJson,
+                                          content_type="application/json")
+
+        errorMsg = {
+            "message": "error executing ElasticSearch query; " +
+            CONTACT_ADMIN
+        }
+        errorMsgJSON = json.dumps(errorMsg)
+
+        try:
+            config = get_config_snapshot()
+            filters = {}
+
+            # only add the filters that are defined in the configuration,
+            # the rest is ignored
+            for curr_filter in config.search_filters:
+                if request.GET.get(curr_filter.field_name):
+                    filters[curr_filter.field_name] = \
+                        request.GET.getlist(curr_filter.field_name)
+
+            queries = XSEQueries(
+                config.target_xse_host,
+                config.target_xse_index,
+                user=request.user)
+            results = queries.search_facets_results(keyword=keyword,
+                                                    filters=filters)
+        except HTTPError as http_err:
+            logger.error(http_err)
+            return HttpResponseServerError(errorMsgJSON,
+                                           content_type="application/json")
+        except Exception as err:
+            logger.error(err)
+            return HttpResponseServerError(errorMsgJSON,
+                                           content_type="application/json")
+        else:
+            logger.info(results)
+            return HttpResponse(results, content_type="application/json")
+
+
+class SearchFacetBucketsView(APIView):
+    """This method defines an API for loading the values of one filter of a
+            keyword search past the ones returned with its facets, a page at
+            a time"""
+
+    def get_request_attributes(self, request, config):
+        """helper method to get the configured filter to load values of and
+            the filters of the search"""
+        search_filter = None
+        filters = {}
+
+        # only add the filters that are defined in the configuration,
+        # the rest is ignored
+        for curr_filter in config.search_filters:
+            if curr_filter.field_name == request.GET.get('field'):
+                search_filter = curr_filter
+
+            if request.GET.get(curr_filter.field_name):
+                filters[curr_filter.field_name] = \
+                    request.GET.getlist(curr_filter.field_name)
+
+        return search_filter, filters
+
+    def get(self, request):
+        keyword = request.GET.get('keyword', '')
+
+        if keyword == '' or not request.GET.get('field'):
+            error = {
+                "message": "Request is missing 'keyword' or 'field' query "
+                           "parameter"
+            }
+            errorJson = json.dumps(error)
+            return HttpResponseBadRequest(errorJson,
+                                          content_type="application/json")
+
+        errorMsg = {
+            "message": "error executing ElasticSearch query; " +
+            CONTACT_ADMIN
+        }
+        errorMsgJSON = json.dumps(errorMsg)
+
+        try:
+            config = get_config_snapshot()
+            search_filter, filters = self.get_request_attributes(request,
+                                                                 config)
+
+            if search_filter is None:
+                error = {
+                    "message": "Requested 'field' is not a search filter"
+                }
+                errorJson = json.dumps(error)
+                return HttpResponseBadRequest(errorJson,
+                                              content_type="application/json")
+
+            queries = XSEQueries(
+                config.target_xse_host,
+                config.target_xse_index,
+                user=request.user)
+            results = queries.facet_buckets_results(
+                search_filter, keyword=keyword, filters=filters,
+                after=request.GET.get('after'))
+        except HTTPError as http_err:
+            logger.error(http_err)
+            return HttpResponseServerError(errorMsgJSON,
+                                           content_type="application/json")
+        except Exception as err:
+            logger.error(err)
+            return HttpResponseServerError(errorMsgJSON,
+                                           content_type="application/json")
+        else:
+            logger.info(results)
+            return HttpResponse(results, content_type="application/json")
+
+
 class SearchDerivedView(APIView):
     """This method defines an API for querying to ElasticSearch
             for derived experiences"""
@@ -106,6 +284,14 @@ class SearchDerivedView(APIView):
         if (request.GET.get('p')) and (request.GET.get('p') != ''):
             filters['page'] = request.GET['p']
 
+        # an empty cursor starts a new cursor search
+        if 'cursor' in request.GET:
+            filters['cursor'] = request.GET['cursor']
+
+        fields = get_requested_fields(request)
+        if fields:
+            filters['fields'] = fields
+
         return reference, filters
 
     def get(self, request):
@@ -121,13 +307,17 @@ class SearchDerivedView(APIView):
             errorMsgJSON = json.dumps(errorMsg)
 
             try:
+                config = get_config_snapshot()
                 queries = XSEQueries(
-                    XDSConfiguration.objects.first().target_xse_host,
-                    XDSConfiguration.objects.first().target_xse_index,
-                    user=request.user)
+                    config.target_xse_host,
+                    config.target_xse_index,
+                    user=request.user,
+                    raw=settings.XSE_RAW_RESULTS)
                 response = queries.search_for_derived(
                     reference=reference, filters=filters)
                 results = queries.get_results(response)
+            except InvalidCursorError as cursor_err:
+                return invalid_cursor_response(cursor_err)
             except HTTPError as http_err:
                 logger.error(http_err)
                 return HttpResponseServerError(errorMsgJSON,
@@ -166,6 +356,14 @@ class SearchCompetencyView(APIView):
         if (request.GET.get('p')) and (request.GET.get('p') != ''):
             filters['page'] = request.GET['p']
 
+        # an empty cursor starts a new cursor search
+        if 'cursor' in request.GET:
+            filters['cursor'] = request.GET['cursor']
+
+        fields = get_requested_fields(request)
+        if fields:
+            filters['fields'] = fields
+
         return reference, filters
 
     def get(self, request):
@@ -181,13 +379,17 @@ class SearchCompetencyView(APIView):
             errorMsgJSON = json.dumps(errorMsg)
 
             try:
+                config = get_config_snapshot()
                 queries = XSEQueries(
-                    XDSConfiguration.objects.first().target_xse_host,
-                    XDSConfiguration.objects.first().target_xse_index,
-                    user=request.user)
+                    config.target_xse_host,
+                    config.target_xse_index,
+                    user=request.user,
+                    raw=settings.XSE_RAW_RESULTS)
                 response = queries.search_by_competency(
                     comp_uuid=reference, filters=filters)
                 results = queries.get_results(response)
+            except InvalidCursorError as cursor_err:
+                return invalid_cursor_response(cursor_err)
             except HTTPError as http_err:
                 logger.error(http_err)
                 return HttpResponseServerError(errorMsgJSON,
@@ -224,12 +426,13 @@ class GetMoreLikeThisView(APIView):
         errorMsgJSON = json.dumps(errorMsg)
 
         try:
+            config = get_config_snapshot()
             queries = XSEQueries(
-                XDSConfiguration.objects.first().target_xse_host,
-                XDSConfiguration.objects.first().target_xse_index,
-                user=request.user)
-            response = queries.more_like_this(doc_id=doc_id)
-            results = queries.get_results(response)
+                config.target_xse_host,
+                config.target_xse_index,
+                user=request.user,
+                raw=settings.XSE_RAW_RESULTS)
+            results = queries.more_like_this_results(doc_id=doc_id)
         except HTTPError as http_err:
             logger.error(http_err)
             return HttpResponseServerError(errorMsgJSON,
@@ -257,13 +460,13 @@ class GetSimilarCoursesView(APIView):
             errorMsgJSON = json.dumps(errorMsg)
 
             try:
+                config = get_config_snapshot()
                 queries = XSEQueries(
-                    XDSConfiguration.objects.first().target_xse_host,
-                    XDSConfiguration.objects.first().target_xse_index,
-                    user=request.user)
-                response = queries.similar_courses(
-                    keyword=key)
-                results = queries.get_results(response)
+                    config.target_xse_host,
+                    config.target_xse_index,
+                    user=request.user,
+                    raw=settings.XSE_RAW_RESULTS)
+                results = queries.similar_courses_results(keyword=key)
             except HTTPError as http_err:
                 logger.error(http_err)
                 return HttpResponseServerError(errorMsgJSON,
@@ -288,30 +491,14 @@ class FiltersView(APIView):
     """This method defines an API for performing a filter search"""
 
     def get(self, request):
-        course_mapping = CourseInformationMapping.objects.first()
-
         results = []
         filters = {}
         page_num = 1
+        cursor = request.GET.get('cursor')
 
         if (request.GET.get('p')) and (request.GET.get('p') != ''):
             page_num = int(request.GET['p'])
 
-        if (request.GET.get(course_mapping.course_title) and
-                request.GET.get(course_mapping.course_title) != ''):
-            filters[course_mapping.course_title] = \
-                request.GET[course_mapping.course_title]
-
-        if (request.GET.get(course_mapping.course_provider) and
-                request.GET.get(course_mapping.course_provider) != ''):
-            filters[course_mapping.course_provider] = \
-                request.GET[course_mapping.course_provider]
-
-        if (request.GET.get('CourseInstance.CourseLevel') and
-                request.GET.get('CourseInstance.CourseLevel') != ''):
-            filters['CourseInstance.CourseLevel'] = \
-                request.GET['CourseInstance.CourseLevel']
-
         errorMsg = {
             "message": "error executing ElasticSearch query; " +
             CONTACT_ADMIN
@@ -319,13 +506,42 @@ class FiltersView(APIView):
         errorMsgJSON = json.dumps(errorMsg)
 
         try:
+            config = get_config_snapshot()
+            course_mapping = config.course_mapping
+
+            if (request.GET.get(course_mapping.course_title) and
+                    request.GET.get(course_mapping.course_title) != ''):
+                filters[course_mapping.course_title] = \
+                    request.GET[course_mapping.course_title]
+
+            if (request.GET.get(course_mapping.course_provider) and
+                    request.GET.get(course_mapping.course_provider) != ''):
+                filters[course_mapping.course_provider] = \
+                    request.GET[course_mapping.course_provider]
+
+            if (request.GET.get('CourseInstance.CourseLevel') and
+                    request.GET.get('CourseInstance.CourseLevel') != ''):
+                filters['CourseInstance.CourseLevel'] = \
+                    request.GET['CourseInstance.CourseLevel']
+
             queries = XSEQueries(
-                XDSConfiguration.objects.first().target_xse_host,
-                XDSConfiguration.objects.first().target_xse_index,
-                user=request.user)
-            response = queries.search_by_filters(
-                page_num=page_num, filters=filters)
-            results = queries.get_results(response)
+                config.target_xse_host,
+                config.target_xse_index,
+                user=request.user,
+                raw=settings.XSE_RAW_RESULTS)
+
+            if wants_explain(request):
+                queries.build_search_by_filters(
+                    page_num, filters=filters,
+                    fields=get_requested_fields(request))
+                results = json.dumps(queries.explain())
+            else:
+                response = queries.search_by_filters(
+                    page_num=page_num, filters=filters, cursor=cursor,
+                    fields=get_requested_fields(request))
+                results = queries.get_results(response)
+        except InvalidCursorError as cursor_err:
+            return invalid_cursor_response(cursor_err)
         except HTTPError as http_err:
             logger.error(http_err)
             return HttpResponseServerError(errorMsgJSON,
@@ -351,16 +567,114 @@ class SuggestionsView(APIView):
                             status=status.HTTP_400_BAD_REQUEST)
 
         try:
+            config = get_config_snapshot()
             queries = XSEQueries(
-                XDSConfiguration.objects.first().target_xse_host,
-                XDSConfiguration.objects.first().target_xse_index)
-            response = queries.suggest(
+                config.target_xse_host,
+                config.target_xse_index)
+            results = queries.suggest_results(
                 partial=request.GET['partial'])
 
-            results = response.suggest.to_dict()['autocomplete_suggestion']
-
             return Response(results, status=status.HTTP_200_OK)
         except Exception as err:
             logger.error(err)
             return Response({"message": err.args[0]},
                             status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class SearchBundleView(APIView):
+    """
+    This method defines an API for running the searches of the search results
+    page in one Elasticsearch request. Each parameter adds a section:
+    keyword (with the search parameters) the search results, partial the
+    suggestions, similar the similar courses, more_like_this the courses
+    like a document and spotlight=true the spotlight courses
+    """
+
+    get_request_attributes = SearchIndexView.get_request_attributes
+
+    def get(self, request):
+        keyword, filters = self.get_request_attributes(request)
+        partial = request.GET.get('partial', '')
+        similar = request.GET.get('similar', '')
+        doc_id = request.GET.get('more_like_this', '')
+        spotlight = request.GET.get('spotlight', '').lower() == 'true'
+
+        if not (keyword or partial or similar or doc_id or spotlight):
+            error = {
+                "message": "Request is missing a 'keyword', 'partial', " +
+                "'similar', 'more_like_this' or 'spotlight' query parameter"
+            }
+            return HttpResponseBadRequest(json.dumps(error),
+                                          content_type="application/json")
+
+        errorMsg = {
+            "message": "error executing ElasticSearch query; " +
+            CONTACT_ADMIN
+        }
+        errorMsgJSON = json.dumps(errorMsg)
+
+        try:
+            config = get_config_snapshot()
+            bundle = SearchBundle(config.target_xse_host,
+                                  config.target_xse_index,
+                                  user=request.user)
+
+            if keyword:
+                for curr_filter in config.search_filters:
+                    if request.GET.get(curr_filter.field_name):
+                        filters[curr_filter.field_name] = \
+                            request.GET.getlist(curr_filter.field_name)
+
+                bundle.add('search', lambda queries: queries
+                           .build_search_by_keyword(keyword=keyword,
+                                                    filters=filters),
+                           format_hits)
+
+            if partial:
+                bundle.add('suggestions',
+                           lambda queries: queries.build_suggest(partial),
+                           format_suggestions)
+
+            if similar:
+                bundle.add('similar_courses', lambda queries: queries
+                           .build_similar_courses(keyword=similar),
+                           format_hits)
+
+            if doc_id:
+                bundle.add('more_like_this', lambda queries: queries
+                           .build_more_like_this(doc_id=doc_id),
+                           format_hits)
+
+            if spotlight:
+                bundle.add('spotlight_courses', lambda queries: queries
+                           .build_spotlight_courses(),
+                           format_spotlight)
+
+            results = json.dumps(bundle.execute())
+        except HTTPError as http_err:
+            logger.error(http_err)
+            return HttpResponseServerError(errorMsgJSON,
+                                           content_type="application/json")
+        except Exception as err:
+            logger.error(err)
+            return HttpResponseServerError(errorMsgJSON,
+                                           content_type="application/json")
+        else:
+            logger.info(results)
+            return HttpResponse(results, content_type="application/json")
+
+
+class StatsView(APIView):
+    """
+    This method defines an API for reporting the Elasticsearch client
+    statistics of the current worker process
+    """
+
+    def get(self, request):
+        results = {
+            "connection_pools": get_pool_stats(),
+            "single_flight": search_flight.get_stats(),
+            "suggestion_index": suggestion_index.get_stats(),
+        }
+
+        return Response(results, status=status.HTTP_200_OK)
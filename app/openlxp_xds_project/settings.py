@@ -128,6 +128,30 @@ DATABASES = {
 
 DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
 
+# Cache shared by every worker, defaults to the database cache table created
+# by the createcachetable command
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND', 'django.core.cache.backends.db.DatabaseCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'xds_cache'),
+    },
+    # Elasticsearch results, expired after SEARCH_CACHE_TIMEOUT seconds and
+    # culled once SEARCH_CACHE_MAX_ENTRIES is reached
+    'search_results': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND', 'django.core.cache.backends.db.DatabaseCache'),
+        'LOCATION': os.environ.get('SEARCH_CACHE_LOCATION',
+                                   'xds_search_cache'),
+        'KEY_PREFIX': 'search',
+        'TIMEOUT': int(os.environ.get('SEARCH_CACHE_TIMEOUT', 60)),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('SEARCH_CACHE_MAX_ENTRIES',
+                                              1000)),
+        },
+    },
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
 
@@ -316,6 +340,81 @@ XAPI_ACTOR_ACCOUNT_NAME_JWT_FIELDS = [
 ]
 
 
+# Experience Search Engine (XSE) client settings
+
+# seconds to wait on an Elasticsearch request before timing out
+XSE_TIMEOUT = int(os.environ.get('XSE_TIMEOUT', 60))
+
+# number of keep-alive connections pooled per Elasticsearch node
+XSE_MAXSIZE = int(os.environ.get('XSE_MAXSIZE', 10))
+
+# number of connections the async Elasticsearch client keeps per node, one
+# per search in flight
+XSE_ASYNC_MAXSIZE = int(os.environ.get('XSE_ASYNC_MAXSIZE', 100))
+
+# serve the search endpoints with async views, requires running the ASGI
+# application
+XSE_ASYNC_VIEWS = os.getenv('XSE_ASYNC_VIEWS', 'false').lower() == 'true'
+
+# format search hits from the response text of Elasticsearch, copying their
+# sources over instead of parsing them
+XSE_RAW_RESULTS = os.getenv('XSE_RAW_RESULTS', 'false').lower() == 'true'
+
+# identical searches in flight are always sent once per worker, this also
+# shares them across workers through the search_results cache
+XSE_SINGLE_FLIGHT_SHARED = os.getenv('XSE_SINGLE_FLIGHT_SHARED',
+                                     'false').lower() == 'true'
+
+# seconds a worker waits on a search running on another worker before
+# sending it itself
+XSE_SINGLE_FLIGHT_TIMEOUT = float(os.environ.get('XSE_SINGLE_FLIGHT_TIMEOUT',
+                                                 5))
+
+# how long Elasticsearch keeps a point in time open between cursor pages
+XSE_PIT_KEEP_ALIVE = os.environ.get('XSE_PIT_KEEP_ALIVE', '1m')
+
+# seconds the more like this and similar courses of a course are cached in
+# the search_results cache
+XSE_RECOMMENDATIONS_TIMEOUT = int(os.environ.get(
+    'XSE_RECOMMENDATIONS_TIMEOUT', 300))
+
+
+# Experience Index Service (XIS) client settings
+
+# seconds to wait on an XIS request before timing out
+XIS_TIMEOUT = float(os.environ.get('XIS_TIMEOUT', 3.0))
+
+# number of keep-alive connections pooled per XIS host
+XIS_MAXSIZE = int(os.environ.get('XIS_MAXSIZE', 10))
+
+# number of times a failed XIS GET is retried, and the backoff factor of the
+# seconds slept between the retries
+XIS_RETRIES = int(os.environ.get('XIS_RETRIES', 3))
+XIS_BACKOFF_FACTOR = float(os.environ.get('XIS_BACKOFF_FACTOR', 0.3))
+
+# number of threads fetching the pages of an XIS listing at once, kept below
+# XIS_MAXSIZE so every thread gets a pooled connection
+XIS_PAGE_WORKERS = int(os.environ.get('XIS_PAGE_WORKERS', 4))
+
+# number of metadata key hashes looked up per XIS request, keeping the urls
+# of large interest lists within the limits of proxies
+XIS_HASH_CHUNK_SIZE = int(os.environ.get('XIS_HASH_CHUNK_SIZE', 100))
+
+# seconds the metadata stored on an experience is served before it is
+# refreshed from XIS in the background
+XIS_EXPERIENCE_TTL = int(os.environ.get('XIS_EXPERIENCE_TTL', 300))
+
+# largest number of experiences looked up by one batch request
+XIS_EXPERIENCE_BATCH_SIZE = int(os.environ.get('XIS_EXPERIENCE_BATCH_SIZE',
+                                               100))
+
+# codec compressing the metadata stored on experiences (json, zlib or zstd,
+# which requires the zstandard package) and the path of the dictionary
+# trained for it by the train_metadata_dictionary command
+XIS_METADATA_CODEC = os.environ.get('XIS_METADATA_CODEC', 'zlib')
+XIS_METADATA_DICTIONARY = os.environ.get('XIS_METADATA_DICTIONARY', '')
+
+
 # Accepts regex arguments
 OPEN_ENDPOINTS = [
     "/api/auth/register",
@@ -327,11 +426,15 @@ OPEN_ENDPOINTS = [
     "/es-api/more-like-this/[a-zA-Z0-9]+/",
     "/es-api/",
     "/es-api/suggest/",
+    "/es-api/facets/",
+    "/es-api/facets/buckets/",
     "/es-api/derived-from/",
     "/es-api/teaches/",
     "/api/experiences/[a-zA-Z0-9]+/",
+    "/api/experiences/batch",
     "/api/spotlight-courses",
     "/es-api/similar-courses/[a-zA-Z0-9]+/",
+    "/es-api/bundle/",
 ]
 
 if XAPI_ALLOW_ANON and not XAPI_USE_JWT:
@@ -7,4 +7,5 @@ class XdsApiConfig(AppConfig):
     def ready(self):
         import xds_api.signals
         xds_api.signals.add_permissions
+        xds_api.signals.spotlight_snapshot_invalidate
         return super().ready()
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from configurations.utils.config_snapshot import get_config_snapshot
+from es_api.utils.queries import XSEQueries
+from xds_api.utils.spotlight_snapshot import (XIS_SPOTLIGHT_KEY,
+                                              XSE_SPOTLIGHT_KEY,
+                                              build_xis_spotlight,
+                                              store_spotlight_snapshot)
+
+
+class Command(BaseCommand):
+    """This command rebuilds the spotlight course snapshots served by the
+        landing page from XIS and by es_api from the XSE index, meant to be
+        run periodically so changes to the courses are picked up"""
+
+    def handle(self, *args, **options):
+        config = get_config_snapshot()
+
+        landing_page = store_spotlight_snapshot(
+            XIS_SPOTLIGHT_KEY, build_xis_spotlight,
+            source=config.target_xis_metadata_api)
+
+        queries = XSEQueries(config.target_xse_host, config.target_xse_index)
+        search_engine = store_spotlight_snapshot(
+            XSE_SPOTLIGHT_KEY, queries.build_spotlight_snapshot,
+            source=config.target_xse_index)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Stored spotlight snapshots of {len(landing_page)} bytes from "
+            f"XIS and {len(search_engine)} bytes from "
+            f"{config.target_xse_index}"))
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from xds_api.utils.experience_sync import sync_experiences
+
+
+class Command(BaseCommand):
+    """This command mirrors the XIS metadata of the experiences referenced by
+        interest lists and course spotlights onto their Experience rows,
+        meant to be run periodically so the experience details are served
+        without waiting on XIS"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=None,
+                            help='experiences to sync in this run, the next '
+                                 'run continues where this one stopped')
+        parser.add_argument('--full', action='store_true',
+                            help='start a new pass over every experience')
+
+    def handle(self, *args, **options):
+        if options['limit'] is not None and options['limit'] < 1:
+            raise CommandError("--limit must be at least 1")
+
+        report = sync_experiences(limit=options['limit'],
+                                  full=options['full'])
+        throughput = report.stored / report.seconds if report.seconds else 0
+
+        self.stdout.write(
+            f"Synced {report.stored} of {report.requested} experiences in "
+            f"{report.seconds:.2f}s ({throughput:.1f} experiences/s), "
+            f"{report.failed} failed")
+
+        if report.pass_completed:
+            self.stdout.write("Pass completed")
+        else:
+            self.stdout.write(f"{report.remaining} experiences left in the "
+                              "current pass")
+
+        lag = 'n/a' if report.lag_seconds is None else \
+            f"{report.lag_seconds:.0f}s"
+        self.stdout.write(f"Lag: {report.unfetched} experiences never "
+                          f"fetched, oldest metadata fetched {lag} ago")
+
+        style = self.style.WARNING if report.failed else self.style.SUCCESS
+        self.stdout.write(style("Experience sync finished"))
@@ -1,8 +1,11 @@
 import logging
 
-from django.db.models.signals import post_migrate
+from django.db.models.signals import post_delete, post_migrate, post_save
 from django.dispatch import receiver
 
+from core.models import CourseSpotlight
+from xds_api.utils.spotlight_snapshot import invalidate_spotlight_snapshots
+
 logger = logging.getLogger('dict_config_logger')
 
 GROUPS = ['System Operator', 'Experience Owner', 'Experience Manager',
@@ -54,3 +57,11 @@ def add_permissions(sender, verbosity, stdout, using, apps, **kwargs):
                             format(name))
                         stdout.flush()
                     continue
+
+
+@receiver(post_save, sender=CourseSpotlight)
+@receiver(post_delete, sender=CourseSpotlight)
+def spotlight_snapshot_invalidate(sender, **kwargs):
+    """Drops the spotlight snapshots when a course spotlight changes, so the
+        next request builds them from the current course spotlights"""
+    invalidate_spotlight_snapshots()
@@ -1,9 +1,15 @@
+from io import StringIO
 from unittest.mock import patch
 
+from django.core.cache import cache
 from django.core.management import call_command
 from django.db.utils import OperationalError
 from django.test import TestCase, tag
 
+from xds_api.utils.experience_sync import SyncReport
+from xds_api.utils.spotlight_snapshot import (XIS_SPOTLIGHT_KEY,
+                                              XSE_SPOTLIGHT_KEY)
+
 
 @tag('unit')
 class CommandTests(TestCase):
@@ -25,3 +31,44 @@ class CommandTests(TestCase):
             gi.ensure_connection.side_effect = [OperationalError] * 5 + [True]
             call_command('waitdb')
             self.assertEqual(gi.ensure_connection.call_count, 6)
+
+    def test_refresh_spotlight(self):
+        """Test that refresh_spotlight stores the spotlight snapshots of XIS
+            and of the XSE index"""
+        with patch('xds_api.management.commands.refresh_spotlight'
+                   '.get_config_snapshot') as snapshot, \
+                patch('xds_api.management.commands.refresh_spotlight'
+                      '.build_xis_spotlight') as build_xis, \
+                patch('xds_api.management.commands.refresh_spotlight'
+                      '.XSEQueries') as queries:
+            snapshot.return_value.target_xis_metadata_api = 'xis'
+            snapshot.return_value.target_xse_index = 'xse'
+            build_xis.return_value = b'[{"xis": 1}]'
+            queries.return_value.build_spotlight_snapshot.return_value = \
+                b'[{"xse": 1}]'
+
+            call_command('refresh_spotlight', stdout=StringIO())
+
+            self.assertEqual(cache.get(XIS_SPOTLIGHT_KEY)[1:],
+                             ('xis', b'[{"xis": 1}]'))
+            self.assertEqual(cache.get(XSE_SPOTLIGHT_KEY)[1:],
+                             ('xse', b'[{"xse": 1}]'))
+
+    def test_sync_experiences(self):
+        """Test that sync_experiences reports the throughput and lag of the
+            sync"""
+        with patch('xds_api.management.commands.sync_experiences'
+                   '.sync_experiences') as sync:
+            sync.return_value = SyncReport(
+                requested=10, stored=9, failed=1, seconds=2.0, remaining=5,
+                pass_completed=False, unfetched=3, lag_seconds=120.0)
+            out = StringIO()
+
+            call_command('sync_experiences', limit=10, stdout=out)
+
+            sync.assert_called_once_with(limit=10, full=False)
+            self.assertIn("Synced 9 of 10 experiences in 2.00s "
+                          "(4.5 experiences/s), 1 failed", out.getvalue())
+            self.assertIn("5 experiences left", out.getvalue())
+            self.assertIn("3 experiences never fetched, oldest metadata "
+                          "fetched 120s ago", out.getvalue())
@@ -1,5 +1,9 @@
+import io
+import json
 from unittest.mock import patch
 
+import requests
+
 from configurations.models import XDSConfiguration
 from core.models import Experience, InterestList, SavedFilter
 from openlxp_notifications.models import email
@@ -9,6 +13,16 @@ from users.models import XDSUser
 from django.test import override_settings
 
 
+def xis_response(body, status_code=200):
+    """Builds a response of XIS with the JSON body, read from a stream like
+        the responses of the XIS session"""
+    response = requests.Response()
+    response.status_code = status_code
+    response.raw = io.BytesIO(json.dumps(body).encode('utf-8'))
+
+    return response
+
+
 class TestSetUp(APITestCase):
     """Class with setup and teardown for tests in XDS"""
 
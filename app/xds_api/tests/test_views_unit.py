@@ -1,18 +1,21 @@
 import json
 import requests
-from unittest.mock import Mock, patch
+from unittest.mock import patch
 
 from configurations.models import XDSConfiguration
-from core.models import CourseSpotlight, InterestList, SavedFilter
+from core.models import (CourseSpotlight, Experience, InterestList,
+                         SavedFilter)
 from django.contrib.auth.models import Permission
 from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ObjectDoesNotExist
 from django.test import tag
 from django.urls import reverse
+from django.utils import timezone
 from requests.exceptions import HTTPError, RequestException
 from rest_framework import status
+from users.models import XDSUser
 
-from .test_setup import TestSetUp
+from .test_setup import TestSetUp, xis_response
 
 
 @tag('unit')
@@ -168,20 +171,15 @@ class InterestListsTests(TestSetUp):
                 XDSConfiguration(target_xis_metadata_api="www.test.com")
 
             # mock the get request
-            mock_response = get_request.return_value
-            mock_response.status_code = 200
-            mock_response.json.return_value = {
+            get_request.return_value = xis_response({
                 "results": [
                     {
                         "test": "value",
                     }, ]
-            }
-
-            # re-assign the mock to the get request
-            get_request.return_value = mock_response
+            })
 
             response = self.client.get(url)
-            responseDict = json.loads(response.content)
+            responseDict = json.loads(b''.join(response.streaming_content))
 
             self.assertEqual(response.status_code, status.HTTP_200_OK)
             self.assertEqual(responseDict["experiences"], [None])
@@ -208,20 +206,77 @@ class InterestListsTests(TestSetUp):
                 XDSConfiguration(target_xis_metadata_api="www.test.com")
 
             # mock the get request
-            mock_response = get_request.return_value
-            mock_response.status_code = 500
-            mock_response.json.return_value = [{
+            get_request.return_value = xis_response([{
                 "test": "value",
-            }]
-
-            # re-assign the mock to the get request
-            get_request.return_value = mock_response
+            }], status_code=500)
 
             response = self.client.get(url)
 
             self.assertEqual(response.status_code,
                              status.HTTP_503_SERVICE_UNAVAILABLE)
 
+    def test_get_interest_list_partially_unavailable(self):
+        """
+        Test that an interest list lists the experiences XIS returned and
+        the ones it failed to return
+        """
+        course_2 = Experience('5678')
+        course_2.save()
+        self.list_1.experiences.add(course_2)
+        list_id = self.list_1.pk
+        url = reverse('xds_api:interest-list', args=(list_id,))
+        self.client.login(email=self.auth_email, password=self.auth_password)
+
+        def iter_record_chunks(experiences, failed):
+            failed.append('5678')
+            yield [{"unique_record_identifier": "1",
+                    "metadata_key_hash": "1234",
+                    "metadata": {"Metadata_Ledger": {}}}]
+
+        with patch('xds_api.views.iter_record_chunks') as record_chunks:
+            record_chunks.side_effect = iter_record_chunks
+
+            response = self.client.get(url)
+            responseDict = json.loads(b''.join(response.streaming_content))
+
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(responseDict["experiences"], [{
+                "Supplemental_Ledger": None,
+                "meta": {"id": "1", "metadata_key_hash": "1234"}}])
+            self.assertEqual(responseDict["unavailable_experiences"],
+                             ['5678'])
+
+    def test_get_interest_list_failed_while_streaming(self):
+        """
+        Test that the experiences of an interest list not written when the
+        lookup fails after the response started are reported as unavailable
+        """
+        course_2 = Experience('5678')
+        course_2.save()
+        self.list_1.experiences.add(course_2)
+        list_id = self.list_1.pk
+        url = reverse('xds_api:interest-list', args=(list_id,))
+        self.client.login(email=self.auth_email, password=self.auth_password)
+
+        def iter_record_chunks(experiences, failed):
+            yield [{"unique_record_identifier": "1",
+                    "metadata_key_hash": "1234",
+                    "metadata": {"Metadata_Ledger": {}}}]
+            raise ValueError("XIS went away")
+
+        with patch('xds_api.views.iter_record_chunks') as record_chunks:
+            record_chunks.side_effect = iter_record_chunks
+
+            response = self.client.get(url)
+            responseDict = json.loads(b''.join(response.streaming_content))
+
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(
+                [experience["meta"]["metadata_key_hash"]
+                 for experience in responseDict["experiences"]], ['1234'])
+            self.assertEqual(responseDict["unavailable_experiences"],
+                             ['5678'])
+
     def test_get_interest_list_by_id_not_found(self):
         """
         Test that requesting an interest list by ID using the
@@ -729,16 +784,13 @@ class SpotlightCoursesTests(TestSetUp):
 
         self.client.login(email=self.auth_email, password=self.auth_password)
 
-        with patch('xds_api.views.get_request') as get_request, \
-                patch('xds_api.views.'
+        with patch('xds_api.utils.xds_utils.get_request') as get_request, \
+                patch('xds_api.utils.spotlight_snapshot.'
                       'get_spotlight_courses_api_url') as get_api_url:
             get_api_url.return_value = "www.test.com"
-            http_resp = Mock()
-            get_request.return_value = http_resp
-            http_resp.json.return_value = [{
-                "test": "value"
-            }]
-            http_resp.status_code = 200
+            get_request.return_value = xis_response({
+                "results": [{"test": "value"}]
+            })
 
             response = self.client.get(url)
             self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -755,8 +807,8 @@ class SpotlightCoursesTests(TestSetUp):
         self.client.login(email=self.auth_email, password=self.auth_password)
         CourseSpotlight(course_id='abc123').save()
 
-        with patch('xds_api.views.get_request') as get_request, \
-                patch('xds_api.views.'
+        with patch('xds_api.utils.xds_utils.get_request') as get_request, \
+                patch('xds_api.utils.spotlight_snapshot.'
                       'get_spotlight_courses_api_url') as get_api_url:
             get_api_url.return_value = "www.test.com"
             get_request.side_effect = [HTTPError]
@@ -777,8 +829,8 @@ class SpotlightCoursesTests(TestSetUp):
         self.auth_user.user_permissions.add(permission)
         self.client.login(email=self.auth_email, password=self.auth_password)
 
-        with patch('xds_api.views.get_request'), \
-                patch('xds_api.views.'
+        with patch('xds_api.utils.xds_utils.get_request'), \
+                patch('xds_api.utils.spotlight_snapshot.'
                       'get_spotlight_courses_api_url'):
 
             response = self.client.get(url)
@@ -787,6 +839,76 @@ class SpotlightCoursesTests(TestSetUp):
                              status.HTTP_200_OK)
             self.assertEqual(len(response.content), 0)
 
+    def test_get_spotlight_courses_snapshot(self):
+        """test that calling the endpoint /api/spotlight-courses serves the
+            spotlight snapshot, only reaching out to XIS again after a course
+            spotlight changes"""
+        url = reverse('xds_api:spotlight-courses')
+        permission = Permission.objects. \
+            get(name='Can view get spotlight courses')
+        self.auth_user.user_permissions.add(permission)
+        self.client.login(email=self.auth_email, password=self.auth_password)
+        spotlight = CourseSpotlight(course_id='abc123')
+        spotlight.save()
+        record = {
+            "unique_record_identifier": "1",
+            "metadata_key_hash": "abc123",
+            "metadata": {"Metadata_Ledger": {"Course": {"CourseTitle": "a"}}}
+        }
+
+        with patch('xds_api.utils.xds_utils.get_request') as get_request, \
+                patch('xds_api.utils.spotlight_snapshot.'
+                      'get_spotlight_courses_api_url') as get_api_url:
+            get_api_url.return_value = "www.test.com"
+            get_request.return_value = xis_response({
+                "results": [record], "next": None})
+
+            response = self.client.get(url)
+            cached_response = self.client.get(url)
+
+            self.assertEqual(get_request.call_count, 1)
+            self.assertEqual(cached_response.content, response.content)
+            self.assertEqual(response['Content-Length'],
+                             str(len(response.content)))
+            self.assertEqual(json.loads(response.content)[0]["meta"],
+                             {"id": "1", "metadata_key_hash": "abc123"})
+
+            spotlight.active = False
+            spotlight.save()
+            response = self.client.get(url)
+
+            self.assertEqual(get_request.call_count, 1)
+            self.assertEqual(len(response.content), 0)
+
+
+@tag('unit')
+class StatsTests(TestSetUp):
+    def test_stats_unauthenticated(self):
+        """test that the /api/stats endpoint is not open to anonymous
+            users"""
+        url = reverse('xds_api:stats')
+
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_stats(self):
+        """test that the /api/stats endpoint returns the XIS connection
+            reuse to an admin"""
+        url = reverse('xds_api:stats')
+        admin = XDSUser.objects.create_superuser('admin@test.com',
+                                                 'test1234')
+        self.client.force_authenticate(user=admin)
+
+        with patch('xds_api.views.get_session_stats') as session_stats:
+            session_stats.return_value = {"http://xis:80": {"requests": 2}}
+            response = self.client.get(url)
+
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(json.loads(response.content),
+                             {"xis_session": {
+                                 "http://xis:80": {"requests": 2}}})
+
 
 @tag('unit')
 class ViewTests(TestSetUp):
@@ -799,7 +921,8 @@ class ViewTests(TestSetUp):
         errorMsg = "error reaching out to configured XIS API; " + \
                    "please check the XIS logs"
         self.client.login(email=self.auth_email, password=self.auth_password)
-        with patch('xds_api.views.get_request') as get_request:
+        with patch('xds_api.utils.experience_store.get_request') as \
+                get_request:
             get_request.side_effect = RequestException
 
             response = self.client.get(url)
@@ -809,6 +932,23 @@ class ViewTests(TestSetUp):
                              status.HTTP_500_INTERNAL_SERVER_ERROR)
             self.assertEqual(responseDict['message'], errorMsg)
 
+    def test_get_experiences_stored(self):
+        """Test that calling the endpoint /api/experiences serves the
+            metadata stored on the experience without reaching out to XIS"""
+        Experience(metadata_key_hash='123456', metadata={"meta": {"id": "1"}},
+                   metadata_fetched_at=timezone.now()).save()
+        url = reverse('xds_api:get_courses', args=('123456',))
+        self.client.login(email=self.auth_email, password=self.auth_password)
+
+        with patch('xds_api.utils.experience_store.get_request') as \
+                get_request:
+            response = self.client.get(url)
+
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(json.loads(response.content),
+                             {"meta": {"id": "1"}})
+            get_request.assert_not_called()
+
     def test_get_experiences_not_found(self):
         """
         Test that calling /api/experiences returns an http 404 error when
@@ -820,7 +960,8 @@ class ViewTests(TestSetUp):
         # login user and get token
         self.client.login(email=self.auth_email, password=self.auth_password)
 
-        with patch('xds_api.views.get_request') as get_request:
+        with patch('xds_api.utils.experience_store.get_request') as \
+                get_request:
             get_request.side_effect = ObjectDoesNotExist
 
             response = self.client.get(url)
@@ -828,6 +969,50 @@ class ViewTests(TestSetUp):
             self.assertEqual(response.status_code,
                              status.HTTP_404_NOT_FOUND)
 
+    def test_get_experiences_batch(self):
+        """Test that calling /api/experiences/batch returns the experiences
+            in the order requested with the status of each"""
+        url = reverse('xds_api:experiences-batch')
+
+        with patch('xds_api.views.get_experiences_metadata') as \
+                get_experiences:
+            get_experiences.return_value = [('b', 200, {"b": 1}),
+                                            ('a', 404, None),
+                                            ('c', 503, None)]
+
+            response = self.client.post(
+                url, {"metadata_key_hashes": ['b', 'a', 'c']},
+                format='json')
+            responseList = json.loads(response.content)
+
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            get_experiences.assert_called_once_with(['b', 'a', 'c'])
+            self.assertEqual([item['metadata_key_hash']
+                              for item in responseList], ['b', 'a', 'c'])
+            self.assertEqual([item['status'] for item in responseList],
+                             [200, 404, 503])
+            self.assertEqual(responseList[0]['metadata'], {"b": 1})
+            self.assertEqual(responseList[1]['message'], "Key not found")
+
+    def test_get_experiences_batch_invalid(self):
+        """Test that calling /api/experiences/batch without a list of
+            hashes, or with too many, returns an http 400 error"""
+        url = reverse('xds_api:experiences-batch')
+
+        with patch('xds_api.views.get_experiences_metadata') as \
+                get_experiences, \
+                self.settings(XIS_EXPERIENCE_BATCH_SIZE=2):
+            for body in ({}, {"metadata_key_hashes": "a"},
+                         {"metadata_key_hashes": []},
+                         {"metadata_key_hashes": ['a', 1]},
+                         {"metadata_key_hashes": ['a', 'b', 'c']}):
+                response = self.client.post(url, body, format='json')
+
+                self.assertEqual(response.status_code,
+                                 status.HTTP_400_BAD_REQUEST)
+
+            get_experiences.assert_not_called()
+
 
 VALID_STATEMENT = {
     "actor": {
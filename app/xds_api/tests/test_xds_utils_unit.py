@@ -1,11 +1,46 @@
+import copy
 import json
-from unittest.mock import patch
+import threading
+import time
+from datetime import timedelta
+from unittest.mock import Mock, patch
+from urllib.parse import parse_qs, urlencode, urlsplit
 
 from configurations.models import XDSConfiguration
-from core.models import CourseSpotlight, Experience
-from django.test import TestCase, tag
-from xds_api.utils.xds_utils import (get_spotlight_courses_api_url,
+from core.models import (CourseSpotlight, Experience, ExperienceSync,
+                         InterestList)
+from django.test import TestCase, override_settings, tag
+from django.utils import timezone
+from es_api.utils.stub_server import stub_elasticsearch
+from requests.exceptions import RequestException
+from xds_api.utils.experience_store import (FOUND, NOT_FOUND, UNAVAILABLE,
+                                            get_experience_metadata,
+                                            get_experiences_metadata,
+                                            refresh_experience)
+from xds_api.utils.experience_sync import (sync_experiences,
+                                           upsert_experiences)
+from xds_api.utils.page_reader import PageReader
+from xds_api.utils.spotlight_snapshot import (
+    fetch_spotlight_records, get_spotlight_snapshot,
+    invalidate_spotlight_snapshots)
+from xds_api.utils.xds_utils import (get_all_pages, get_page_urls,
+                                     get_records_by_hashes, get_request,
+                                     get_spotlight_courses_api_url,
+                                     iter_json_array, iter_ordered,
                                      metadata_to_target, save_experiences)
+from users.models import XDSUser
+from xds_api.utils.xis_session import (get_session, get_session_stats,
+                                       reset_session)
+
+from .test_setup import xis_response
+
+
+RECORD = {
+    "unique_record_identifier": "1",
+    "metadata_key_hash": "abc",
+    "metadata": {"Metadata_Ledger": {"Course": {"CourseTitle": "a"}}}
+}
+METADATA = metadata_to_target(copy.deepcopy(RECORD))
 
 
 @tag('unit')
@@ -65,3 +100,492 @@ class UtilTests(TestCase):
         save_experiences([course_1.pk, '456'])
 
         self.assertEqual(len(Experience.objects.all()), 2)
+
+    def test_fetch_spotlight_records(self):
+        """Test that fetch_spotlight_records follows the next pages of XIS
+            and returns the records of every page"""
+        first_page = xis_response({"results": [{"id": 1}],
+                                   "next": "next.com"})
+        last_page = xis_response({"results": [{"id": 2}], "next": None})
+
+        with patch('xds_api.utils.xds_utils.get_request') as get_request, \
+                patch('xds_api.utils.spotlight_snapshot.'
+                      'get_spotlight_courses_api_url') as get_api_url:
+            get_api_url.return_value = "test.com"
+            get_request.side_effect = [first_page, last_page]
+
+            records = fetch_spotlight_records()
+
+            self.assertEqual(records, [{"id": 1}, {"id": 2}])
+            get_request.assert_called_with("next.com", stream=True)
+
+    def test_get_spotlight_snapshot_source(self):
+        """Test that get_spotlight_snapshot rebuilds a snapshot built from
+            another source and serves it otherwise"""
+        build = Mock(side_effect=[b'[1]', b'[2]'])
+
+        self.assertEqual(get_spotlight_snapshot('key', build, 'a'), b'[1]')
+        self.assertEqual(get_spotlight_snapshot('key', build, 'a'), b'[1]')
+        self.assertEqual(get_spotlight_snapshot('key', build, 'b'), b'[2]')
+        self.assertEqual(build.call_count, 2)
+
+    def test_get_spotlight_snapshot_invalidated(self):
+        """Test that get_spotlight_snapshot does not store a snapshot whose
+            build raced an invalidation and rebuilds it on the next call"""
+        def build_stale():
+            invalidate_spotlight_snapshots()
+            return b'[1]'
+
+        build = Mock(side_effect=[b'[2]'])
+
+        self.assertEqual(get_spotlight_snapshot('key', build_stale, 'a'),
+                         b'[1]')
+        self.assertEqual(get_spotlight_snapshot('key', build, 'a'), b'[2]')
+        self.assertEqual(get_spotlight_snapshot('key', build, 'a'), b'[2]')
+        self.assertEqual(build.call_count, 1)
+
+    def test_get_page_urls(self):
+        """Test that get_page_urls lists the remaining pages of a listing
+            paged by page number or offset, and none of other listings"""
+        self.assertEqual(
+            get_page_urls('xis.com/?metadata_key_hash_list=a,b&page=2', 5, 2),
+            ['xis.com/?metadata_key_hash_list=a%2Cb&page=2',
+             'xis.com/?metadata_key_hash_list=a%2Cb&page=3'])
+        self.assertEqual(
+            get_page_urls('xis.com/?limit=2&offset=2', 5, 2),
+            ['xis.com/?limit=2&offset=2', 'xis.com/?limit=2&offset=4'])
+        self.assertIsNone(get_page_urls('xis.com/?cursor=abc', 5, 2))
+        self.assertIsNone(get_page_urls('xis.com/?page=2', None, 2))
+
+    def test_get_all_pages(self):
+        """Test that get_all_pages fetches the pages of a listing reporting
+            its count and returns their results in order"""
+        pages = {
+            'xis.com/?page=1': (200, [1, 2], 'xis.com/?page=2'),
+            'xis.com/?page=2': (200, [3, 4], 'xis.com/?page=3'),
+            'xis.com/?page=3': (200, [5, 6], 'xis.com/?page=4'),
+            'xis.com/?page=4': (200, [7], None),
+        }
+        responses = []
+
+        def get_request(url, stream=False):
+            status_code, results, next_url = pages[url]
+            responses.append(xis_response({"count": 7, "next": next_url,
+                                           "results": results},
+                                          status_code=status_code))
+            return responses[-1]
+
+        with patch('xds_api.utils.xds_utils.get_request') as request:
+            request.side_effect = get_request
+
+            response, results = get_all_pages('xis.com/?page=1')
+
+            self.assertEqual(results, [1, 2, 3, 4, 5, 6, 7])
+            self.assertIs(response, responses[-1])
+            self.assertEqual(request.call_count, 4)
+
+            pages['xis.com/?page=3'] = (503, [], None)
+            response, results = get_all_pages('xis.com/?page=1')
+
+            self.assertEqual(results, [1, 2, 3, 4])
+            self.assertEqual(response.status_code, 503)
+
+    def test_iter_ordered(self):
+        """Test that iter_ordered yields the results in order with at most
+            workers calls in flight"""
+        lock = threading.Lock()
+        running = [0, 0]
+
+        def call(item):
+            with lock:
+                running[0] += 1
+                running[1] = max(running)
+            time.sleep(0.01)
+            with lock:
+                running[0] -= 1
+            return item * 2
+
+        self.assertEqual(list(iter_ordered(call, range(10), 3)),
+                         [num * 2 for num in range(10)])
+        self.assertLessEqual(running[1], 3)
+
+    def test_page_reader(self):
+        """Test that PageReader decodes the results of a page one at a time
+            however its text is split, along with its other members"""
+        text = json.dumps({"count": 12345, "next": "xis.com/?page=2",
+                           "results": [{"a": [1, "}]"]}, 67, None, "é"],
+                           "previous": None}, ensure_ascii=False)
+
+        for size in [1, 2, 7, len(text)]:
+            page = {}
+            pieces = [text[start:start + size]
+                      for start in range(0, len(text), size)]
+
+            self.assertEqual(list(PageReader(pieces).iter_results(page)),
+                             [{"a": [1, "}]"]}, 67, None, "é"])
+            self.assertEqual(page, {"count": 12345,
+                                    "next": "xis.com/?page=2",
+                                    "previous": None})
+
+        with self.assertRaises(ValueError):
+            list(PageReader([text[:-20]]).iter_results({}))
+
+    def test_iter_json_array(self):
+        """Test that iter_json_array writes the items of the pages as one
+            JSON array"""
+        self.assertEqual(b''.join(iter_json_array([[1, {"a": "é"}], [],
+                                                   [None]])),
+                         '[1,{"a":"é"},null]'.encode('utf-8'))
+        self.assertEqual(b''.join(iter_json_array([])), b'[]')
+
+    @override_settings(XIS_HASH_CHUNK_SIZE=2)
+    def test_get_records_by_hashes(self):
+        """Test that get_records_by_hashes looks the hashes up in chunks and
+            returns the records in the order of the hashes, along with the
+            hashes of the chunks that failed"""
+        XDSConfiguration(target_xis_metadata_api="xis.com/").save()
+        failed_url = 'xis.com/?metadata_key_hash_list=e'
+
+        def get_request(url, stream=False):
+            # XIS answers the hashes of a chunk in its own order
+            key_hashes = url.split('=')[1].split(',')[::-1]
+            return xis_response({"results": [
+                {"metadata_key_hash": key_hash} for key_hash in key_hashes]},
+                status_code=503 if url == failed_url else 200)
+
+        with patch('xds_api.utils.xds_utils.get_request') as request:
+            request.side_effect = get_request
+
+            records, failed = get_records_by_hashes(['a', 'b', 'c', 'd',
+                                                     'e'])
+
+            self.assertEqual(request.call_count, 3)
+            self.assertEqual([record['metadata_key_hash']
+                              for record in records], ['a', 'b', 'c', 'd'])
+            self.assertEqual(failed, ['e'])
+
+    @override_settings(XIS_HASH_CHUNK_SIZE=4, XIS_PAGE_WORKERS=3)
+    def test_get_records_by_hashes_workers(self):
+        """Test that get_records_by_hashes keeps at most XIS_PAGE_WORKERS
+            requests in flight when the chunks have several pages"""
+        XDSConfiguration(target_xis_metadata_api="xis.com/").save()
+        lock = threading.Lock()
+        running = [0, 0]
+
+        def get_request(url, stream=False):
+            with lock:
+                running[0] += 1
+                running[1] = max(running)
+            time.sleep(0.01)
+            with lock:
+                running[0] -= 1
+
+            # every chunk has a page per hash
+            query = parse_qs(urlsplit(url).query)
+            key_hashes = query['metadata_key_hash_list'][0].split(',')
+            page = int(query.get('page', [1])[0])
+            next_url = None if page == len(key_hashes) else \
+                'xis.com/?' + urlencode({**query, 'page': page + 1},
+                                        doseq=True)
+            return xis_response({
+                "count": len(key_hashes), "next": next_url,
+                "results": [{"metadata_key_hash": key_hashes[page - 1]}]})
+
+        with patch('xds_api.utils.xds_utils.get_request') as request:
+            request.side_effect = get_request
+
+            records, failed = get_records_by_hashes(
+                [str(num) for num in range(12)])
+
+            self.assertEqual(request.call_count, 12)
+            self.assertEqual([record['metadata_key_hash']
+                              for record in records],
+                             [str(num) for num in range(12)])
+            self.assertLessEqual(running[1], 3)
+
+
+@tag('unit')
+class XISSessionTests(TestCase):
+
+    def setUp(self):
+        reset_session()
+        self.addCleanup(reset_session)
+
+    def test_get_session(self):
+        """Test that get_session returns the same session for the process,
+            retrying failed GETs"""
+        session = get_session()
+        retries = session.get_adapter('http://xis').max_retries
+
+        self.assertIs(get_session(), session)
+        self.assertEqual(retries.total, 3)
+        self.assertIn('GET', retries.allowed_methods)
+        self.assertNotIn('POST', retries.allowed_methods)
+
+    def test_get_session_forked(self):
+        """Test that get_session builds a new session in a forked process"""
+        session = get_session()
+
+        with patch('xds_api.utils.xis_session.os.getpid') as getpid:
+            getpid.return_value = -1
+
+            self.assertIsNot(get_session(), session)
+
+    def test_get_request_reuses_connections(self):
+        """Test that get_request sends consecutive requests to a host over
+            one connection and reports its reuse"""
+        with stub_elasticsearch({"results": []}) as host:
+            for _ in range(3):
+                self.assertEqual(get_request(f'{host}/api/metadata/').json(),
+                                 {"results": []})
+
+            stats = get_session_stats()[host]
+
+        self.assertEqual(stats['connections_opened'], 1)
+        self.assertEqual(stats['requests'], 3)
+        self.assertEqual(stats['reused_connections'], 2)
+
+
+@tag('unit')
+class ExperienceStoreTests(TestCase):
+
+    def setUp(self):
+        XDSConfiguration(target_xis_metadata_api="xis.com/").save()
+
+    def xis_response(self, status_code=200, results=(RECORD,), etag='"1"'):
+        response = Mock(status_code=status_code, headers={'ETag': etag})
+        response.json.return_value = {"results": copy.deepcopy(
+            list(results))}
+        return response
+
+    def test_get_experience_metadata_fetched(self):
+        """Test that get_experience_metadata fetches a stored experience
+            never fetched before from XIS and stores its metadata"""
+        Experience(metadata_key_hash='abc').save()
+
+        with patch('xds_api.utils.experience_store.get_request') as \
+                get_request:
+            get_request.return_value = self.xis_response()
+
+            metadata = get_experience_metadata('abc')
+
+        experience = Experience.objects.get(pk='abc')
+        self.assertEqual(metadata, METADATA)
+        self.assertEqual(experience.metadata, metadata)
+        self.assertEqual(experience.metadata_etag, '"1"')
+        self.assertEqual(experience.metadata_version, 1)
+        get_request.assert_called_once_with(
+            'xis.com/?metadata_key_hash_list=abc', headers=None)
+
+    def test_get_experience_metadata_not_stored(self):
+        """Test that get_experience_metadata looks an experience not stored
+            up in XIS without storing it"""
+        with patch('xds_api.utils.experience_store.get_request') as \
+                get_request:
+            get_request.return_value = self.xis_response()
+
+            self.assertEqual(get_experience_metadata('abc'), METADATA)
+            self.assertFalse(Experience.objects.filter(pk='abc').exists())
+
+        get_request.assert_called_once_with(
+            'xis.com/?metadata_key_hash_list=abc')
+
+    def test_get_experience_metadata_not_found(self):
+        """Test that get_experience_metadata returns None for an experience
+            XIS has no record of, without storing it"""
+        with patch('xds_api.utils.experience_store.get_request') as \
+                get_request:
+            get_request.return_value = self.xis_response(results=())
+
+            self.assertIsNone(get_experience_metadata('abc'))
+            self.assertFalse(Experience.objects.filter(pk='abc').exists())
+
+    def test_get_experience_metadata_fresh(self):
+        """Test that get_experience_metadata serves metadata fetched within
+            the TTL without reaching out to XIS"""
+        Experience(metadata_key_hash='abc', metadata={"a": 1},
+                   metadata_fetched_at=timezone.now()).save()
+
+        with patch('xds_api.utils.experience_store.get_request') as \
+                get_request, \
+                patch('xds_api.utils.experience_store.'
+                      'refresh_in_background') as refresh:
+            self.assertEqual(get_experience_metadata('abc'), {"a": 1})
+            get_request.assert_not_called()
+            refresh.assert_not_called()
+
+    def test_get_experience_metadata_stale(self):
+        """Test that get_experience_metadata serves stale metadata and
+            refreshes it in the background"""
+        Experience(metadata_key_hash='abc', metadata={"a": 1},
+                   metadata_fetched_at=timezone.now() - timedelta(days=1))\
+            .save()
+
+        with patch('xds_api.utils.experience_store.get_request') as \
+                get_request, \
+                patch('xds_api.utils.experience_store.'
+                      'refresh_in_background') as refresh:
+            self.assertEqual(get_experience_metadata('abc'), {"a": 1})
+            get_request.assert_not_called()
+            refresh.assert_called_once_with('abc')
+
+    def test_get_experiences_metadata(self):
+        """Test that get_experiences_metadata serves stored metadata, looks
+            the others up in XIS together without storing them and keeps
+            the requested order"""
+        Experience(metadata_key_hash='a', metadata={"a": 1},
+                   metadata_fetched_at=timezone.now()).save()
+        Experience(metadata_key_hash='b', metadata={"b": 1},
+                   metadata_fetched_at=timezone.now() - timedelta(days=1))\
+            .save()
+        records, _ = xis_records(['d'])
+
+        with patch('xds_api.utils.experience_store.get_records_by_hashes') \
+                as get_records, \
+                patch('xds_api.utils.experience_store.'
+                      'refresh_in_background') as refresh:
+            get_records.return_value = (records, ['e'])
+
+            results = get_experiences_metadata(['e', 'd', 'a', 'b', 'c',
+                                                'a'])
+
+        self.assertEqual(results, [
+            ('e', UNAVAILABLE, None),
+            ('d', FOUND, {"Course": {"CourseTitle": "d"},
+                          "Supplemental_Ledger": None,
+                          "meta": {"id": "d", "metadata_key_hash": "d"}}),
+            ('a', FOUND, {"a": 1}),
+            ('b', FOUND, {"b": 1}),
+            ('c', NOT_FOUND, None),
+            ('a', FOUND, {"a": 1})])
+        get_records.assert_called_once_with(['e', 'd', 'c'])
+        refresh.assert_not_called()
+        self.assertEqual(Experience.objects.count(), 2)
+
+    def test_refresh_experience_not_modified(self):
+        """Test that refresh_experience sends the stored ETag and only
+            updates the fetch time when XIS answers not modified"""
+        fetched_at = timezone.now() - timedelta(days=1)
+        Experience(metadata_key_hash='abc', metadata={"a": 1},
+                   metadata_etag='"1"', metadata_version=1,
+                   metadata_fetched_at=fetched_at).save()
+
+        with patch('xds_api.utils.experience_store.get_request') as \
+                get_request:
+            get_request.return_value = self.xis_response(status_code=304)
+
+            refresh_experience('abc')
+
+        experience = Experience.objects.get(pk='abc')
+        self.assertEqual(experience.metadata, {"a": 1})
+        self.assertEqual(experience.metadata_version, 1)
+        self.assertGreater(experience.metadata_fetched_at, fetched_at)
+        get_request.assert_called_once_with(
+            'xis.com/?metadata_key_hash_list=abc',
+            headers={'If-None-Match': '"1"'})
+
+    def test_refresh_experience_changed(self):
+        """Test that refresh_experience stores changed metadata as a new
+            version"""
+        Experience(metadata_key_hash='abc', metadata={"a": 1},
+                   metadata_etag='"1"', metadata_version=1,
+                   metadata_fetched_at=timezone.now()).save()
+
+        with patch('xds_api.utils.experience_store.get_request') as \
+                get_request:
+            get_request.return_value = self.xis_response(etag='"2"')
+
+            refresh_experience('abc')
+
+        experience = Experience.objects.get(pk='abc')
+        self.assertEqual(experience.metadata, METADATA)
+        self.assertEqual(experience.metadata_etag, '"2"')
+        self.assertEqual(experience.metadata_version, 2)
+
+    def test_refresh_experience_xis_error(self):
+        """Test that refresh_experience keeps the stored metadata when XIS
+            fails"""
+        fetched_at = timezone.now() - timedelta(days=1)
+        Experience(metadata_key_hash='abc', metadata={"a": 1},
+                   metadata_fetched_at=fetched_at).save()
+
+        with patch('xds_api.utils.experience_store.get_request') as \
+                get_request:
+            get_request.side_effect = RequestException
+
+            refresh_experience('abc')
+
+        experience = Experience.objects.get(pk='abc')
+        self.assertEqual(experience.metadata, {"a": 1})
+        self.assertEqual(experience.metadata_fetched_at, fetched_at)
+
+
+def xis_records(key_hashes):
+    """Returns XIS records for the metadata key hashes"""
+    return [{"unique_record_identifier": key_hash,
+             "metadata_key_hash": key_hash,
+             "metadata": {"Metadata_Ledger": {"Course": {
+                 "CourseTitle": key_hash}}}} for key_hash in key_hashes], []
+
+
+@tag('unit')
+class ExperienceSyncTests(TestCase):
+
+    def setUp(self):
+        owner = XDSUser.objects.create_user('owner@test.com', 'test1234',
+                                            first_name='first',
+                                            last_name='last')
+        interest_list = InterestList(owner=owner, name='list',
+                                     description='list')
+        interest_list.save()
+        for key_hash in ['a', 'b']:
+            experience = Experience(metadata_key_hash=key_hash)
+            experience.save()
+            interest_list.experiences.add(experience)
+        CourseSpotlight(course_id='c').save()
+        CourseSpotlight(course_id='d', active=False).save()
+
+    def test_sync_experiences(self):
+        """Test that sync_experiences mirrors the referenced experiences in
+            runs of limit experiences, continuing after the last key hash
+            synced by the previous run"""
+        with patch('xds_api.utils.experience_sync.get_records_by_hashes') \
+                as get_records:
+            get_records.side_effect = xis_records
+
+            report = sync_experiences(limit=2)
+
+            get_records.assert_called_with(['a', 'b'])
+            self.assertEqual(report.stored, 2)
+            self.assertEqual(report.remaining, 1)
+            self.assertFalse(report.pass_completed)
+            self.assertEqual(report.unfetched, 1)
+            self.assertEqual(ExperienceSync.objects.get().last_synced_hash,
+                             'b')
+
+            report = sync_experiences(limit=2)
+
+            get_records.assert_called_with(['c'])
+            self.assertTrue(report.pass_completed)
+            self.assertEqual(report.unfetched, 0)
+            self.assertEqual(ExperienceSync.objects.get().last_synced_hash,
+                             '')
+
+        self.assertEqual(Experience.objects.get(pk='c').metadata["Course"],
+                         {"CourseTitle": "c"})
+        self.assertFalse(Experience.objects.filter(pk='d').exists())
+
+    def test_upsert_experiences_versions(self):
+        """Test that upsert_experiences only counts a new version when the
+            metadata of an experience changed"""
+        records, _ = xis_records(['a'])
+        upsert_experiences(records, timezone.now())
+        upsert_experiences(xis_records(['a'])[0], timezone.now())
+
+        self.assertEqual(Experience.objects.get(pk='a').metadata_version, 1)
+
+        records[0]["metadata"]["Metadata_Ledger"]["Course"] = {
+            "CourseTitle": "new"}
+        upsert_experiences(records, timezone.now())
+
+        self.assertEqual(Experience.objects.get(pk='a').metadata_version, 2)
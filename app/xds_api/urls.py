@@ -10,6 +10,8 @@ urlpatterns = [
          name='spotlight-courses'),
     path('experiences/<str:exp_hash>/', views.GetExperiencesView.as_view(),
          name='get_courses'),
+    path('experiences/batch', views.ExperiencesBatchView.as_view(),
+         name='experiences-batch'),
     path('interest-lists/', views.InterestListsView.as_view(),
          name='interest-lists'),
     path('interest-lists/<int:list_id>', views.InterestListView.as_view(),
@@ -40,4 +42,5 @@ urlpatterns = [
     path('statements',
          views.StatementForwardView.as_view(),
          name='forward_statements'),
+    path('stats', views.StatsView.as_view(), name='stats'),
 ]
@@ -0,0 +1,212 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from requests.exceptions import HTTPError
+
+from configurations.utils.config_snapshot import get_config_snapshot
+from core.models import Experience
+from xds_api.utils.experience_sync import get_records_metadata
+from xds_api.utils.xds_utils import (get_records_by_hashes, get_request,
+                                     is_success, metadata_to_target)
+
+logger = logging.getLogger('dict_config_logger')
+
+# threads refreshing the stale experiences of this process
+REFRESH_WORKERS = 2
+
+_executor = None
+# hashes of the experiences being refreshed, refreshed once at a time
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+# status of each experience of a batch lookup
+FOUND = 200
+NOT_FOUND = 404
+UNAVAILABLE = 503
+
+
+def get_experience_url(exp_hash):
+    """This method returns the XIS url of the experience"""
+    return get_config_snapshot().target_xis_metadata_api + \
+        "?metadata_key_hash_list=" + exp_hash
+
+
+def is_fresh(experience):
+    """This method returns whether the metadata of the experience was
+        fetched less than XIS_EXPERIENCE_TTL seconds ago"""
+    return experience.metadata_fetched_at is not None and \
+        timezone.now() - experience.metadata_fetched_at < \
+        timedelta(seconds=settings.XIS_EXPERIENCE_TTL)
+
+
+def fetch_experience(experience):
+    """This method fetches the metadata of the experience from XIS and
+        stores it, only downloading it again when its ETag changed. Returns
+        False when XIS has no record of the experience and raises a
+        RequestException when XIS fails"""
+    headers = None
+    if experience.metadata is not None and experience.metadata_etag:
+        headers = {'If-None-Match': experience.metadata_etag}
+
+    response = get_request(get_experience_url(experience.metadata_key_hash),
+                           headers=headers)
+
+    if response.status_code == 304:
+        experience.metadata_fetched_at = timezone.now()
+        Experience.objects.filter(pk=experience.pk).update(
+            metadata_fetched_at=experience.metadata_fetched_at)
+        return True
+
+    if not is_success(response):
+        raise HTTPError(f"XIS answered {response.status_code}",
+                        response=response)
+
+    results = response.json()['results']
+
+    if not results:
+        return False
+
+    experience.set_metadata(metadata_to_target(results[0]),
+                            etag=response.headers.get('ETag', ''))
+    experience.save()
+
+    return True
+
+
+def lookup_experience(exp_hash):
+    """This method returns the metadata of the experience looked up in XIS
+        without storing it, or None when XIS has no record of it. Raises a
+        RequestException when XIS fails"""
+    response = get_request(get_experience_url(exp_hash))
+
+    if not is_success(response):
+        raise HTTPError(f"XIS answered {response.status_code}",
+                        response=response)
+
+    results = response.json()['results']
+
+    if not results:
+        return None
+
+    return metadata_to_target(results[0])
+
+
+def refresh_experience(exp_hash):
+    """This method fetches the metadata of a stored experience again,
+        keeping the stored one when XIS fails"""
+    experience = Experience.objects.filter(pk=exp_hash).first()
+
+    if experience is None:
+        return
+
+    try:
+        fetch_experience(experience)
+    except Exception as err:
+        logger.error("Could not refresh experience %s: %s", exp_hash, err)
+
+
+def _refresh_in_thread(refresh, exp_hashes):
+    try:
+        refresh(*exp_hashes)
+    except Exception as err:
+        logger.error("Could not refresh experiences %s: %s", exp_hashes, err)
+    finally:
+        with _refreshing_lock:
+            _refreshing.difference_update(exp_hashes)
+        # the connection of the thread is not closed by a request cycle
+        connection.close()
+
+
+def _submit_refresh(refresh, exp_hashes):
+    global _executor
+
+    with _refreshing_lock:
+        exp_hashes = [exp_hash for exp_hash in exp_hashes
+                      if exp_hash not in _refreshing]
+
+        if not exp_hashes:
+            return
+
+        _refreshing.update(exp_hashes)
+
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=REFRESH_WORKERS)
+
+    _executor.submit(_refresh_in_thread, refresh, exp_hashes)
+
+
+def refresh_in_background(exp_hash):
+    """This method refreshes the experience in a thread of this process,
+        unless it is already being refreshed"""
+    _submit_refresh(refresh_experience, [exp_hash])
+
+
+def get_experience_metadata(exp_hash):
+    """This method returns the metadata of the experience in the search
+        engine format, or None when XIS has no record of it. Metadata fetched
+        within XIS_EXPERIENCE_TTL seconds is served as stored, older metadata
+        is served while it is refreshed in the background, and only an
+        experience never fetched waits on XIS.
+
+        The endpoint serving it is open, so only the experiences already
+        stored, those of an interest list or a course spotlight, have their
+        metadata stored or refreshed. The others are looked up in XIS
+        without being stored, like by get_experiences_metadata"""
+    experience = Experience.objects.filter(pk=exp_hash).first()
+
+    if experience is None:
+        return lookup_experience(exp_hash)
+
+    if experience.metadata is not None:
+        if not is_fresh(experience):
+            refresh_in_background(exp_hash)
+
+        return experience.metadata
+
+    if not fetch_experience(experience):
+        return None
+
+    return experience.metadata
+
+
+def get_experiences_metadata(exp_hashes):
+    """This method returns the metadata of the experiences in the order of
+        exp_hashes as (hash, status, metadata) tuples, the status being
+        FOUND, NOT_FOUND when XIS has no record of the experience, or
+        UNAVAILABLE when XIS failed to return it. Nothing is written: the
+        stored metadata is served however old it is, and the experiences
+        never fetched are looked up in XIS together without being stored,
+        the sync_experiences command keeping the store up to date"""
+    unique_hashes = list(dict.fromkeys(exp_hashes))
+    found = {}
+
+    for exp_hash, experience in Experience.objects.in_bulk(
+            unique_hashes).items():
+        if experience.metadata is not None:
+            found[exp_hash] = experience.metadata
+
+    missing = [exp_hash for exp_hash in unique_hashes
+               if exp_hash not in found]
+    failed = set()
+
+    if missing:
+        records, failed_hashes = get_records_by_hashes(missing)
+        found.update(get_records_metadata(records))
+        failed = set(failed_hashes)
+
+    results = []
+
+    for exp_hash in exp_hashes:
+        if exp_hash in found:
+            results.append((exp_hash, FOUND, found[exp_hash]))
+        elif exp_hash in failed:
+            results.append((exp_hash, UNAVAILABLE, None))
+        else:
+            results.append((exp_hash, NOT_FOUND, None))
+
+    return results
@@ -0,0 +1,144 @@
+import logging
+import time
+from bisect import bisect_right
+from collections import namedtuple
+
+from django.db import connections
+from django.db.models import Min
+from django.utils import timezone
+
+from core.models import (CourseSpotlight, Experience, ExperienceSync,
+                         InterestList)
+from xds_api.utils.xds_utils import get_records_by_hashes, metadata_to_target
+
+logger = logging.getLogger('dict_config_logger')
+
+# name of the ExperienceSync row of the XIS mirror
+MIRROR_NAME = 'xis'
+
+# fields of the experiences written by the mirror
+MIRROR_FIELDS = ['metadata', 'metadata_fetched_at', 'metadata_etag',
+                 'metadata_version']
+
+SyncReport = namedtuple('SyncReport', [
+    'requested', 'stored', 'failed', 'seconds', 'remaining',
+    'pass_completed', 'unfetched', 'lag_seconds'])
+
+
+def get_referenced_hashes():
+    """This method returns the sorted metadata key hashes of the experiences
+        in interest lists and of the active course spotlights"""
+    listed = InterestList.experiences.through.objects \
+        .values_list('experience_id', flat=True)
+    spotlights = CourseSpotlight.objects.filter(active=True) \
+        .values_list('course_id', flat=True)
+
+    return sorted(set(listed) | set(spotlights))
+
+
+def get_records_metadata(records):
+    """This method returns the metadata of the XIS records in the search
+        engine format, keyed by metadata key hash"""
+    metadata = {}
+
+    for record in records:
+        if isinstance(record, dict) and record.get('metadata_key_hash'):
+            metadata[record['metadata_key_hash']] = metadata_to_target(record)
+
+    return metadata
+
+
+def store_metadata(metadata, fetched_at):
+    """This method stores the metadata keyed by metadata key hash on their
+        experiences with a single bulk upsert, returning the number of
+        experiences stored"""
+    existing = Experience.objects.in_bulk(list(metadata))
+    experiences = []
+
+    for key_hash, record_metadata in metadata.items():
+        experience = existing.get(key_hash) or \
+            Experience(metadata_key_hash=key_hash)
+        # the ETag of a batch does not belong to a single experience
+        experience.set_metadata(record_metadata, fetched_at=fetched_at)
+        experiences.append(experience)
+
+    features = connections[Experience.objects.db].features
+    # MySQL upserts on any unique key and refuses to be told which
+    unique_fields = ['metadata_key_hash'] \
+        if features.supports_update_conflicts_with_target else None
+
+    Experience.objects.bulk_create(experiences, update_conflicts=True,
+                                   update_fields=MIRROR_FIELDS,
+                                   unique_fields=unique_fields)
+
+    return len(experiences)
+
+
+def upsert_experiences(records, fetched_at):
+    """This method stores the metadata of the XIS records on their
+        experiences, returning the number of experiences stored"""
+    return store_metadata(get_records_metadata(records), fetched_at)
+
+
+def get_mirror_lag(key_hashes, now):
+    """This method returns the number of the experiences never fetched and
+        the seconds since the stalest of the others was fetched"""
+    experiences = Experience.objects.filter(pk__in=key_hashes)
+    fetched = experiences.filter(metadata__isnull=False)
+    unfetched = len(key_hashes) - fetched.count()
+    oldest = fetched.aggregate(oldest=Min('metadata_fetched_at'))['oldest']
+
+    return unfetched, (now - oldest).total_seconds() if oldest else None
+
+
+def sync_experiences(limit=None, full=False):
+    """This method mirrors the XIS metadata of up to limit referenced
+        experiences, continuing after the last key hash synced by the
+        previous run so scheduled runs walk every experience in passes of
+        the sorted key hashes. XIS is not asked for the records changed
+        since a run, each pass fetches every experience again. A full run
+        starts a new pass. Returns a SyncReport"""
+    state, _ = ExperienceSync.objects.get_or_create(name=MIRROR_NAME)
+    key_hashes = get_referenced_hashes()
+    start_time = time.perf_counter()
+    now = timezone.now()
+
+    if full:
+        state.last_synced_hash = ''
+
+    start = bisect_right(key_hashes, state.last_synced_hash) \
+        if state.last_synced_hash else 0
+
+    if start == 0:
+        state.pass_started_at = now
+
+    end = len(key_hashes) if limit is None else \
+        min(start + limit, len(key_hashes))
+    batch = key_hashes[start:end]
+
+    records, failed = get_records_by_hashes(batch)
+    stored = upsert_experiences(records, now)
+
+    # the failed experiences are retried by the next pass
+    pass_completed = end == len(key_hashes)
+    if pass_completed:
+        state.last_synced_hash = ''
+        state.last_pass_completed_at = timezone.now()
+    else:
+        state.last_synced_hash = batch[-1]
+
+    seconds = time.perf_counter() - start_time
+    state.last_run_at = timezone.now()
+    state.last_run_records = stored
+    state.last_run_seconds = seconds
+    state.save()
+
+    unfetched, lag_seconds = get_mirror_lag(key_hashes, timezone.now())
+    logger.info("Synced %s of %s experiences from XIS in %.2fs", stored,
+                len(batch), seconds)
+
+    return SyncReport(requested=len(batch), stored=stored,
+                      failed=len(failed), seconds=seconds,
+                      remaining=len(key_hashes) - end,
+                      pass_completed=pass_completed, unfetched=unfetched,
+                      lag_seconds=lag_seconds)
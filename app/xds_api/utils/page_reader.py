@@ -0,0 +1,97 @@
+import json
+import re
+from json.scanner import make_scanner
+
+# scans one JSON value with the C scanner of the json module
+_scan_once = make_scanner(json.JSONDecoder())
+_WHITESPACE = re.compile(r'\s*')
+
+
+class PageReader():
+    """Decodes the JSON object of a page of an XIS listing from the pieces of
+        text it arrives in, the items of its results one at a time. Only the
+        text of the value being decoded is held"""
+
+    def __init__(self, pieces):
+        self.pieces = iter(pieces)
+        self.text = ''
+        self.pos = 0
+        self.done = False
+
+    def read(self):
+        """This helper method appends the next piece to the text, dropping
+            the text already decoded. Returns False at the end of the
+            pieces"""
+        piece = next(self.pieces, None)
+
+        if piece is None:
+            self.done = True
+            return False
+
+        self.text = self.text[self.pos:] + piece
+        self.pos = 0
+
+        return True
+
+    def peek(self):
+        """This helper method skips the whitespace at the position and
+            returns the character following it"""
+        while True:
+            self.pos = _WHITESPACE.match(self.text, self.pos).end()
+
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.read():
+                raise ValueError("Unexpected end of the XIS page")
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Expecting '{char}' at {self.pos} of the XIS "
+                             "page")
+
+        self.pos += 1
+
+    def skip_comma(self):
+        if self.peek() == ',':
+            self.pos += 1
+
+    def value(self):
+        """This helper method decodes the JSON value at the position,
+            reading pieces until it is complete. A value ending with the
+            text, like a number, may go on in the next piece"""
+        self.peek()
+
+        while True:
+            try:
+                value, end = _scan_once(self.text, self.pos)
+            except (StopIteration, ValueError):
+                if not self.read():
+                    raise ValueError(f"Invalid JSON value at {self.pos} of "
+                                     "the XIS page")
+                continue
+
+            if end < len(self.text) or self.done or not self.read():
+                self.pos = end
+                return value
+
+    def iter_results(self, page):
+        """This method yields the items of the results of the page, adding
+            its other members to page"""
+        self.expect('{')
+
+        while self.peek() != '}':
+            name = self.value()
+            self.expect(':')
+
+            if name == 'results' and self.peek() == '[':
+                self.pos += 1
+
+                while self.peek() != ']':
+                    yield self.value()
+                    self.skip_comma()
+
+                self.pos += 1
+            else:
+                page[name] = self.value()
+
+            self.skip_comma()
@@ -0,0 +1,119 @@
+import logging
+import time
+
+from django.core.cache import cache
+from requests.exceptions import HTTPError
+
+from core.models import CourseSpotlight
+from xds_api.utils.xds_utils import (get_spotlight_courses_api_url,
+                                     iter_formatted, iter_json_array,
+                                     iter_pages)
+
+logger = logging.getLogger('dict_config_logger')
+
+# spotlight courses served by the landing page from XIS and by es_api from
+# the XSE index, stored as the JSON bytes of the response
+XIS_SPOTLIGHT_KEY = 'xds_spotlight_snapshot_xis'
+XSE_SPOTLIGHT_KEY = 'xds_spotlight_snapshot_xse'
+SPOTLIGHT_KEYS = (XIS_SPOTLIGHT_KEY, XSE_SPOTLIGHT_KEY)
+
+# bumped when the course spotlights change, the snapshots hold the
+# generation they were built in
+SPOTLIGHT_GENERATION_KEY = 'xds_spotlight_generation'
+
+
+def iter_spotlight_pages():
+    """This method yields the XIS records of the active course spotlights a
+        page at a time, raising a RequestException when XIS cannot be
+        reached or answers with an error"""
+    api_url = get_spotlight_courses_api_url()
+    logger.info(api_url)
+
+    for response, results in iter_pages(api_url):
+        if results is None:
+            raise HTTPError(f"XIS answered {response.status_code}",
+                            response=response)
+
+        yield results
+
+
+def fetch_spotlight_records():
+    """This method returns the XIS records of the active course spotlights,
+        raising a RequestException when XIS cannot be reached or answers
+        with an error"""
+    return [record for page in iter_spotlight_pages() for record in page]
+
+
+def build_xis_spotlight():
+    """This method returns the landing page spotlight courses fetched from
+        XIS in the search engine format as JSON bytes, empty when no course
+        spotlight is active. Each page is formatted and encoded as it
+        arrives, so the records of the other pages are not held"""
+    if not CourseSpotlight.objects.filter(active=True).exists():
+        return b''
+
+    return b''.join(iter_json_array(iter_formatted(iter_spotlight_pages())))
+
+
+def get_generation():
+    """This helper method returns the current generation of the course
+        spotlights"""
+    generation = cache.get(SPOTLIGHT_GENERATION_KEY)
+
+    if generation is None:
+        cache.add(SPOTLIGHT_GENERATION_KEY, time.time_ns(), timeout=None)
+        generation = cache.get(SPOTLIGHT_GENERATION_KEY)
+
+    return generation
+
+
+def store_spotlight_snapshot(key, build, source=None, generation=None):
+    """This method stores the bytes returned by build as the snapshot under
+        key, built from source, and returns them. The generation is read
+        before building when not passed, and the snapshot is only stored
+        when no invalidation ran while it was built"""
+    if generation is None:
+        generation = get_generation()
+
+    snapshot = build()
+
+    if cache.get(SPOTLIGHT_GENERATION_KEY) != generation:
+        logger.info("Course spotlights changed while building %s, not "
+                    "storing it", key)
+        return snapshot
+
+    cache.set(key, (generation, source, snapshot), timeout=None)
+    logger.info("Stored spotlight snapshot %s of %s", key, source)
+
+    return snapshot
+
+
+def get_spotlight_snapshot(key, build, source=None):
+    """This method returns the snapshot stored under key, storing the one
+        returned by build when there is none or it was built from another
+        source or in an earlier generation. The snapshot and the generation
+        are read in a single cache query"""
+    cached = cache.get_many([SPOTLIGHT_GENERATION_KEY, key])
+    generation = cached.get(SPOTLIGHT_GENERATION_KEY)
+    stored = cached.get(key)
+
+    if generation is None:
+        generation = get_generation()
+
+    # a snapshot stored by a build that raced an invalidation holds the
+    # generation before it and is rebuilt
+    if stored is not None and stored[:2] == (generation, source):
+        return stored[2]
+
+    return store_spotlight_snapshot(key, build, source, generation)
+
+
+def invalidate_spotlight_snapshots():
+    """This method bumps the generation and drops the spotlight snapshots so
+        the next request builds them from the current course spotlights"""
+    try:
+        cache.incr(SPOTLIGHT_GENERATION_KEY)
+    except ValueError:
+        cache.add(SPOTLIGHT_GENERATION_KEY, time.time_ns(), timeout=None)
+
+    cache.delete_many(SPOTLIGHT_KEYS)
@@ -1,20 +1,190 @@
+import codecs
 import json
+import logging
+import math
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from urllib.parse import parse_qs, urlencode, urlsplit, urlunsplit
 
-import requests
 from configurations.models import XDSConfiguration
 from core.models import CourseSpotlight, Experience
+from django.conf import settings
+from requests.exceptions import RequestException
 from rest_framework import status
 from rest_framework.response import Response
+from xds_api.utils.page_reader import PageReader
+from xds_api.utils.xis_session import get_session
 
+logger = logging.getLogger('dict_config_logger')
 
-def get_request(request_url):
+# bytes of an XIS listing page decoded at a time
+PAGE_READ_SIZE = 64 * 1024
+
+
+def get_request(request_url, headers=None, stream=False):
     """This method handles a simple HTTP get request to the passe in
-        request_url"""
-    response = requests.get(request_url, timeout=3.0)
+        request_url, sent through the pooled XIS session of the process.
+        With stream the body is read as it is consumed"""
+    response = get_session().get(request_url, headers=headers,
+                                 timeout=settings.XIS_TIMEOUT, stream=stream)
 
     return response
 
 
+def is_success(response):
+    """This helper method returns whether response has a 20x status, the
+        statuses the XIS listings are read from"""
+    return response.status_code // 10 == 20
+
+
+def get_page_urls(next_url, count, page_size):
+    """This method returns the urls of the pages from next_url to the last
+        page of a listing of count results, derived from next_url when it
+        pages by page number or offset, or None when it pages otherwise"""
+    if not isinstance(count, int) or not page_size:
+        return None
+
+    scheme, netloc, path, query_string, fragment = urlsplit(next_url)
+    query = parse_qs(query_string, keep_blank_values=True)
+
+    def page_url(**params):
+        return urlunsplit((scheme, netloc, path,
+                           urlencode({**query, **params}, doseq=True),
+                           fragment))
+
+    try:
+        if 'page' in query:
+            first = int(query['page'][0])
+            last = math.ceil(count / page_size)
+
+            return [page_url(page=page) for page in range(first, last + 1)]
+
+        if 'offset' in query:
+            limit = int(query.get('limit', [page_size])[0])
+
+            return [page_url(offset=offset) for offset in
+                    range(int(query['offset'][0]), count, limit)]
+    except ValueError:
+        return None
+
+    return None
+
+
+def iter_ordered(function, items, workers):
+    """This method yields function(item) for each of the items in order,
+        calling it from up to workers threads. At most workers calls are in
+        flight or waiting to be consumed, bounding the results held"""
+    items = iter(items)
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        pending = deque(executor.submit(function, item)
+                        for item in islice(items, workers))
+
+        try:
+            while pending:
+                result = pending.popleft().result()
+                pending.extend(executor.submit(function, item)
+                               for item in islice(items, 1))
+                yield result
+        finally:
+            # the calls not started when the consumer stops are dropped
+            for future in pending:
+                future.cancel()
+
+
+def read_page(response):
+    """This method returns the page of an XIS listing decoded from the
+        streamed response as its body arrives, so the text of the page is
+        not held alongside its records"""
+    page = {}
+    pieces = codecs.iterdecode(response.iter_content(PAGE_READ_SIZE),
+                               'utf-8')
+    page['results'] = list(PageReader(pieces).iter_results(page))
+
+    return page
+
+
+def fetch_page(request_url):
+    """This method returns the response of the XIS listing page at
+        request_url and the page, None when the request failed"""
+    response = get_request(request_url, stream=True)
+
+    try:
+        if not is_success(response):
+            return response, None
+
+        return response, read_page(response)
+    finally:
+        # hands the connection back to the pool
+        response.close()
+
+
+def iter_pages(request_url, workers=None):
+    """This method yields the response and the results of each page of the
+        XIS listing at request_url in order, the results being None for a
+        page that failed, the last one yielded. Each page is decoded as it
+        is read and, when the listing reports its count, the pages after
+        the first are fetched concurrently by up to workers threads,
+        XIS_PAGE_WORKERS by default. With a single worker they are fetched
+        by the calling thread"""
+    response, page = fetch_page(request_url)
+
+    if page is None:
+        yield response, None
+        return
+
+    next_url = page.get('next')
+    page_urls = None if next_url is None else \
+        get_page_urls(next_url, page.get('count'), len(page['results']))
+
+    yield response, page['results']
+
+    if page_urls is None:
+        # follows the next links one page at a time
+        while next_url is not None:
+            response, page = fetch_page(next_url)
+
+            if page is None:
+                yield response, None
+                return
+
+            next_url = page.get('next')
+
+            yield response, page['results']
+
+        return
+
+    if workers is None:
+        workers = settings.XIS_PAGE_WORKERS
+
+    workers = min(workers, len(page_urls))
+    pages = map(fetch_page, page_urls) if workers <= 1 else \
+        iter_ordered(fetch_page, page_urls, workers)
+
+    for response, page in pages:
+        if page is None:
+            yield response, None
+            return
+
+        yield response, page['results']
+
+
+def get_all_pages(request_url, workers=None):
+    """This method returns the response of the last page of the XIS listing
+        at request_url, or of the first one that failed, and the results of
+        the pages before it in order, fetched by up to workers threads"""
+    results = []
+
+    for response, page_results in iter_pages(request_url, workers):
+        if page_results is None:
+            break
+
+        results += page_results
+
+    return response, results
+
+
 def get_spotlight_courses_api_url():
     """This method gets the list of configured course spotlight IDs, the
         configured XIS api url and generates the query to request records"""
@@ -105,31 +275,94 @@ def handle_unauthenticated_user():
                     status.HTTP_401_UNAUTHORIZED)
 
 
-def interest_list_check(coursesDict, courseQuery):
-    # for each hash key in the courses list, append them to the query
-    for idx, metadata_key_hash in enumerate(coursesDict):
-        if idx == len(coursesDict) - 1:
-            courseQuery += metadata_key_hash
+def chunk_list(items, size):
+    """This helper method splits items into lists of at most size items"""
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+
+def iter_record_chunks(metadata_key_hashes, failed):
+    """This method yields the XIS records of the metadata key hashes in the
+        order of the hashes, a list per chunk of XIS_HASH_CHUNK_SIZE hashes,
+        looking up to XIS_PAGE_WORKERS chunks up at once. The hashes of the
+        chunks that failed are added to failed and their chunks skipped"""
+    if not metadata_key_hashes:
+        return
+
+    base_url = XDSConfiguration.objects.first().target_xis_metadata_api + \
+        '?metadata_key_hash_list='
+    chunks = chunk_list(list(metadata_key_hashes),
+                        settings.XIS_HASH_CHUNK_SIZE)
+
+    def fetch_chunk(chunk):
+        # the pages of a chunk are fetched one after the other, the chunks
+        # already taking up to XIS_PAGE_WORKERS connections at once
+        try:
+            response, records = get_all_pages(base_url + ','.join(chunk),
+                                              workers=1)
+        except RequestException as err:
+            logger.error(err)
+            return None
+
+        if not is_success(response):
+            logger.error("XIS answered %s for %s experiences",
+                         response.status_code, len(chunk))
+            return None
+
+        return records
+
+    # XIS answers each chunk in its own order
+    position = {key_hash: num for num, key_hash in
+                enumerate(metadata_key_hashes)}
+
+    def record_position(record):
+        key_hash = record.get('metadata_key_hash') \
+            if isinstance(record, dict) else None
+        return position.get(key_hash, len(position))
+
+    workers = min(settings.XIS_PAGE_WORKERS, len(chunks))
+
+    for chunk, records in zip(chunks, iter_ordered(fetch_chunk, chunks,
+                                                   workers)):
+        if records is None:
+            failed += chunk
         else:
-            courseQuery += (metadata_key_hash + ",")
-    return coursesDict, courseQuery
+            yield sorted(records, key=record_position)
 
 
-def interest_list_get_search_str(courseQuery):
-    # get search string
-    composite_api_url = XDSConfiguration.objects.first() \
-        .target_xis_metadata_api
-    api_url = composite_api_url + courseQuery
+def get_records_by_hashes(metadata_key_hashes):
+    """This method fetches the XIS records of the metadata key hashes,
+        XIS_HASH_CHUNK_SIZE hashes per request with up to XIS_PAGE_WORKERS
+        requests at once. Returns the records in the order of the hashes and
+        the hashes of the requests that failed"""
+    failed = []
+    records = [record for chunk in
+               iter_record_chunks(metadata_key_hashes, failed)
+               for record in chunk]
 
-    # make API call
-    response = get_request(api_url)
-    responseJSON = []
-    while response.status_code//10 == 20:
-        responseJSON += response.json()['results']
+    return records, failed
 
-        if 'next' in response.json() and\
-                response.json()['next'] is not None:
-            response = get_request(response.json()['next'])
-        else:
-            break
-    return response, responseJSON
+
+def iter_formatted(pages):
+    """This method yields the records of each of the pages of XIS records
+        in the search engine format, a list per page"""
+    for page in pages:
+        yield metadata_to_target(page)
+
+
+def iter_json_array(pages):
+    """This method yields the JSON bytes of an array of the items of the
+        pages, a piece per page, so it is written without holding the whole
+        array"""
+    yield b'['
+    first = True
+
+    for page in pages:
+        if not page:
+            continue
+
+        piece = ','.join(json.dumps(item, separators=(',', ':'),
+                                    ensure_ascii=False) for item in page)
+        yield (piece if first else ',' + piece).encode('utf-8')
+        first = False
+
+    yield b']'
@@ -0,0 +1,98 @@
+import logging
+import os
+import threading
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger('dict_config_logger')
+
+# statuses of an XIS call worth retrying, the server or a proxy in front of
+# it being briefly unavailable
+RETRY_STATUSES = (502, 503, 504)
+
+# (process id, session) of the session of this process
+_session = None
+_session_lock = threading.Lock()
+
+
+def build_session():
+    """This method returns a session keeping up to XIS_MAXSIZE connections
+        alive per host and retrying failed GETs with a backoff. Responses
+        are requested gzip encoded, which requests decodes"""
+    retry = Retry(total=settings.XIS_RETRIES,
+                  backoff_factor=settings.XIS_BACKOFF_FACTOR,
+                  status_forcelist=RETRY_STATUSES,
+                  allowed_methods=frozenset(['GET', 'HEAD']),
+                  raise_on_status=False)
+    adapter = HTTPAdapter(pool_maxsize=settings.XIS_MAXSIZE,
+                          max_retries=retry)
+
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers['Accept-Encoding'] = 'gzip, deflate'
+
+    return session
+
+
+def get_session():
+    """This method returns the session of this process, building a new one
+        in a process forked from the one that built it as sockets are not
+        shared across processes"""
+    global _session
+
+    pid = os.getpid()
+    entry = _session
+
+    if entry is not None and entry[0] == pid:
+        return entry[1]
+
+    with _session_lock:
+        if _session is None or _session[0] != pid:
+            _session = (pid, build_session())
+            logger.info("Built XIS session for process %s", pid)
+
+        return _session[1]
+
+
+def reset_session():
+    """This method closes the session of this process so the next call to
+        get_session builds a new one"""
+    global _session
+
+    with _session_lock:
+        if _session is not None:
+            _session[1].close()
+            _session = None
+
+
+def get_session_stats():
+    """This method returns the connection reuse of the session of this
+        process for every host it reached, keyed by host"""
+    stats = {}
+    entry = _session
+
+    if entry is None or entry[0] != os.getpid():
+        return stats
+
+    for adapter in dict.fromkeys(entry[1].adapters.values()):
+        pools = adapter.poolmanager.pools
+
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            sent = pool.num_requests
+            reused = max(sent - pool.num_connections, 0)
+            stats[f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+                "maxsize": pool.pool.maxsize if pool.pool else 0,
+                "connections_opened": pool.num_connections,
+                "requests": sent,
+                "reused_connections": reused,
+                "reuse_rate": reused / sent if sent else 0,
+            }
+
+    return stats
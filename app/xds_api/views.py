@@ -1,3 +1,4 @@
+import itertools
 import json
 import logging
 from collections import OrderedDict
@@ -5,21 +6,28 @@ from collections import OrderedDict
 import requests
 from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
-from django.http import HttpResponse, HttpResponseServerError, JsonResponse
+from django.http import (HttpResponse, HttpResponseServerError, JsonResponse,
+                         StreamingHttpResponse)
 from requests.exceptions import ConnectionError, HTTPError
 from rest_framework import status
 from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
 from rest_framework.views import APIView
 
 from configurations.models import XDSConfiguration
+from configurations.utils.config_snapshot import get_config_snapshot
 from core.management.utils.xds_internal import bleach_data_to_json
-from core.models import CourseSpotlight, Experience, InterestList, SavedFilter
+from core.models import Experience, InterestList, SavedFilter
 from xds_api.serializers import InterestListSerializer, SavedFilterSerializer
-from xds_api.utils.xds_utils import (get_request,
-                                     get_spotlight_courses_api_url,
-                                     interest_list_check,
-                                     interest_list_get_search_str,
-                                     metadata_to_target, save_experiences)
+from xds_api.utils.experience_store import (FOUND, UNAVAILABLE,
+                                            get_experience_metadata,
+                                            get_experiences_metadata)
+from xds_api.utils.spotlight_snapshot import (XIS_SPOTLIGHT_KEY,
+                                              build_xis_spotlight,
+                                              get_spotlight_snapshot)
+from xds_api.utils.xds_utils import (iter_formatted, iter_json_array,
+                                     iter_record_chunks, save_experiences)
+from xds_api.utils.xis_session import get_session_stats
 from xds_api.xapi import (actor_with_account, actor_with_mbox,
                           filter_allowed_statements,
                           get_or_set_registration_uuid, jwt_account_name)
@@ -41,32 +49,13 @@ class GetSpotlightCoursesView(APIView):
         errorMsgJSON = json.dumps(errorMsg)
 
         try:
-            if CourseSpotlight.objects.filter(active=True).count() > 0:
-                api_url = get_spotlight_courses_api_url()
-                logger.info(api_url)
-                # make API call
-                response = get_request(api_url)
-                responseJSON = []
-                while response.status_code // 10 == 20:
-                    responseJSON += response.json()['results']
-
-                    if 'next' in response.json() and \
-                            response.json()['next'] is not None:
-                        response = get_request(response.json()['next'])
-                    else:
-                        break
-
-                if response.status_code == 200:
-                    formattedResponse = json.dumps(
-                        metadata_to_target(responseJSON))
-
-                    return HttpResponse(formattedResponse,
-                                        content_type="application/json")
-                else:
-                    return HttpResponse(responseJSON,
-                                        content_type="application/json")
-            else:
-                return HttpResponse([])
+            # served as stored, the snapshot is rebuilt when the course
+            # spotlights change and by the refresh_spotlight command
+            snapshot = get_spotlight_snapshot(
+                XIS_SPOTLIGHT_KEY, build_xis_spotlight,
+                source=get_config_snapshot().target_xis_metadata_api)
+
+            return HttpResponse(snapshot, content_type="application/json")
 
         except requests.exceptions.RequestException as e:
             errorMsg = {"message": "error reaching out to configured XIS" +
@@ -90,32 +79,16 @@ class GetExperiencesView(APIView):
         errorMsgJSON = json.dumps(errorMsg)
 
         try:
-            composite_api_url = XDSConfiguration.objects.first() \
-                .target_xis_metadata_api
-            courseQuery = "?metadata_key_hash_list=" + exp_hash
-            api_url = composite_api_url + courseQuery
-            logger.info(api_url)
-            # make API call
-            response = get_request(api_url)
-            logger.info(api_url)
-            responseJSON = []
-            # expected response is a list of 1 element
-            if response.status_code//10 == 20:
-                responseJSON += response.json()['results']
-
-                if not responseJSON:
-                    return Response({"message": "Key not found"},
-                                    status.HTTP_404_NOT_FOUND)
-
-                logger.info(responseJSON)
-                formattedResponse = json.dumps(
-                    metadata_to_target(responseJSON[0]))
-
-                return HttpResponse(formattedResponse,
-                                    content_type="application/json")
-            else:
-                return HttpResponse(response.json()['results'],
-                                    content_type="application/json")
+            # served from the metadata stored on the experience, XIS is
+            # only waited on for an experience never fetched before
+            metadata = get_experience_metadata(exp_hash)
+
+            if metadata is None:
+                return Response({"message": "Key not found"},
+                                status.HTTP_404_NOT_FOUND)
+
+            return HttpResponse(json.dumps(metadata),
+                                content_type="application/json")
 
         except requests.exceptions.RequestException as e:
             errorMsg = {"message": "error reaching out to configured XIS "
@@ -132,10 +105,60 @@ class GetExperiencesView(APIView):
 
         except KeyError as no_element_err:
             logger.error(no_element_err)
-            logger.error(response)
             return Response(errorMsg, status.HTTP_404_NOT_FOUND)
 
 
+class ExperiencesBatchView(APIView):
+    """Gets many Experiences at once"""
+
+    def post(self, request):
+        """This method returns the experiences of the metadata_key_hashes
+            list in the same order, each with the status of its lookup"""
+        errorMsg = {
+            "message": "error fetching courses; please check the XDS logs"
+        }
+        errorMsgJSON = json.dumps(errorMsg)
+        exp_hashes = request.data.get('metadata_key_hashes') \
+            if isinstance(request.data, dict) else None
+
+        if not isinstance(exp_hashes, list) or not exp_hashes or \
+                not all(isinstance(exp_hash, str) and exp_hash
+                        for exp_hash in exp_hashes):
+            return Response({"message": "metadata_key_hashes must be a list "
+                             "of metadata key hashes"},
+                            status.HTTP_400_BAD_REQUEST)
+
+        if len(exp_hashes) > settings.XIS_EXPERIENCE_BATCH_SIZE:
+            return Response({"message": "at most "
+                             f"{settings.XIS_EXPERIENCE_BATCH_SIZE} "
+                             "experiences can be requested at once"},
+                            status.HTTP_400_BAD_REQUEST)
+
+        try:
+            results = []
+
+            for exp_hash, lookup, metadata in \
+                    get_experiences_metadata(exp_hashes):
+                result = {"metadata_key_hash": exp_hash, "status": lookup}
+
+                if lookup == FOUND:
+                    result["metadata"] = metadata
+                elif lookup == UNAVAILABLE:
+                    result["message"] = "error reaching out to configured " \
+                        "XIS API; please check the XIS logs"
+                else:
+                    result["message"] = "Key not found"
+
+                results.append(result)
+
+            return HttpResponse(json.dumps(results),
+                                content_type="application/json")
+        except Exception as err:
+            logger.error(err)
+            return HttpResponseServerError(errorMsgJSON,
+                                           content_type="application/json")
+
+
 class InterestListsView(APIView):
     """Handles HTTP requests for interest lists"""
 
@@ -190,6 +213,50 @@ class InterestListView(APIView):
                    "please check the logs"
     }
 
+    def iter_interest_list(self, interest_list, pages, failed):
+        """This helper method yields the JSON bytes of the interest list,
+            its experiences formatted and written a chunk at a time as XIS
+            returns them, followed by the experiences XIS failed to return
+            or that were not written"""
+        listed = set()
+
+        def iter_listed(pages):
+            for page in pages:
+                yield page
+                # resumed once the page is written
+                listed.update(record.get('metadata_key_hash')
+                              for record in page if isinstance(record, dict))
+
+        yield b'{'
+
+        for num, (key, value) in enumerate(interest_list.items()):
+            yield (',' if num else '').encode('utf-8') + \
+                json.dumps(key).encode('utf-8') + b':'
+
+            if key == 'experiences':
+                try:
+                    yield from iter_json_array(
+                        iter_formatted(iter_listed(pages)))
+                except Exception as err:
+                    # the status is sent, the list ends at the last chunk
+                    # written and the experiences after it are reported as
+                    # unavailable
+                    logger.error(err)
+                    yield b']'
+                    failed += [exp_hash for exp_hash in value
+                               if exp_hash not in listed and
+                               exp_hash not in failed]
+            else:
+                yield json.dumps(value, cls=JSONEncoder,
+                                 ensure_ascii=False).encode('utf-8')
+
+        # the experiences XIS failed to return, the others are still listed
+        if failed:
+            yield b',"unavailable_experiences":' + \
+                json.dumps(failed).encode('utf-8')
+
+        yield b'}'
+
     def get(self, request, list_id):
         """This method gets a single interest list"""
 
@@ -206,26 +273,27 @@ class InterestListView(APIView):
             serializer_class = InterestListSerializer(queryset)
             # fetch actual courses for each id in the courses array
             interestList = serializer_class.data
-            courseQuery = "?metadata_key_hash_list="
-            coursesDict = interestList['experiences']
-
-            # for each hash key in the courses list, append them to the query
-            coursesDict, courseQuery = (
-                interest_list_check(coursesDict, courseQuery))
-
-            if len(coursesDict) > 0:
-                response, responseJSON = (
-                    interest_list_get_search_str(courseQuery))
+            experiences = interestList['experiences']
+
+            if len(experiences) > 0:
+                failed = []
+                chunks = iter_record_chunks(experiences, failed)
+                # looks the chunks up until one succeeds, the list is only
+                # unavailable when every experience failed
+                first_chunk = next(chunks, None)
+
+                if first_chunk is None and len(failed) == len(experiences):
+                    return Response({"message": "error reaching out to "
+                                     "configured XIS API; please check "
+                                     "the XIS logs"},
+                                    status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
-                if response.status_code == 200:
-                    formattedResponse = metadata_to_target(responseJSON)
-                    interestList['experiences'] = formattedResponse
+                pages = chunks if first_chunk is None else \
+                    itertools.chain([first_chunk], chunks)
 
-                    return Response(interestList,
-                                    status=status.HTTP_200_OK)
-                else:
-                    return Response(response.json(),
-                                    status=status.HTTP_503_SERVICE_UNAVAILABLE)
+                return StreamingHttpResponse(
+                    self.iter_interest_list(interestList, pages, failed),
+                    content_type="application/json")
         except HTTPError as http_err:
             logger.error(http_err)
             return Response(self.errorMsg,
@@ -714,3 +782,17 @@ class StatementForwardView(APIView):
                             status.HTTP_502_BAD_GATEWAY)
 
         return JsonResponse(resp.json(), status=resp.status_code, safe=False)
+
+
+class StatsView(APIView):
+    """
+    This method defines an API for reporting the XIS connection reuse of the
+    current worker process
+    """
+
+    def get(self, request):
+        results = {
+            "xis_session": get_session_stats(),
+        }
+
+        return Response(results, status=status.HTTP_200_OK)
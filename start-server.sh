@@ -3,5 +3,10 @@
 if [ -n "$DJANGO_SUPERUSER_USERNAME" ] && [ -n "$DJANGO_SUPERUSER_PASSWORD" ] ; then
     (cd openlxp-xds; python manage.py createsuperuser --no-input)
 fi
-(cd openlxp-xds; gunicorn openlxp_xds_project.wsgi --reload --user www-data --bind unix:/opt/xds.sock --workers 3) &
+if [ "$XSE_ASYNC_VIEWS" = "true" ] ; then
+    # the async search views need the ASGI application to share a worker
+    (cd openlxp-xds; gunicorn openlxp_xds_project.asgi --worker-class uvicorn.workers.UvicornWorker --reload --user www-data --bind unix:/opt/xds.sock --workers 3) &
+else
+    (cd openlxp-xds; gunicorn openlxp_xds_project.wsgi --reload --user www-data --bind unix:/opt/xds.sock --workers 3) &
+fi
 nginx -g "daemon off;"